@@ -3,12 +3,23 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import jwt
+import asyncio
 import random
 import os
-import shutil
 from datetime import datetime, timedelta
-from config import API_SECRET_KEY, JWT_EXPIRE_HOURS, CODE_EXPIRE_MINUTES, CODE_LENGTH, UPLOAD_DIR, MAX_FILE_SIZE
+from config import API_SECRET_KEY, JWT_EXPIRE_HOURS, CODE_EXPIRE_MINUTES, CODE_LENGTH, MAX_FILE_SIZE
+from config import CHAT_PAGE_DEFAULT_LIMIT, CHAT_PAGE_MAX_LIMIT
 import database as db
+from services.blob_store import get_blob_store
+from services.event_hub import get_event_hub
+from services.order_events import set_order_status
+from services.event_relay import chat_message_event
+from query_profiler import get_query_profiler, SORT_KEYS
+from userbot.pool import get_userbot_pool
+from api.routes import (
+    RowModel, OrderResponse, ProductListResponse, CategoryListResponse,
+    NeighborhoodListResponse, ChatMessageListResponse
+)
 
 router = APIRouter(prefix="/api/admin")
 security = HTTPBearer()
@@ -22,7 +33,7 @@ class AdminVerifyCodeModel(BaseModel):
     code: str = Field(..., min_length=CODE_LENGTH, max_length=CODE_LENGTH)
 
 class OrderStatusUpdateModel(BaseModel):
-    status: str = Field(..., regex='^(pending|confirmed|processing|shipped|delivered|cancelled)$')
+    status: str = Field(..., pattern='^(pending|confirmed|processing|shipped|delivered|cancelled)$')
 
 class ProductCreateModel(BaseModel):
     category_id: int
@@ -72,7 +83,7 @@ class NeighborhoodUpdateModel(BaseModel):
 class AdminCreateModel(BaseModel):
     admin_id: int
     username: Optional[str] = None
-    role: str = Field(default='admin', regex='^(admin|super_admin)$')
+    role: str = Field(default='admin', pattern='^(admin|super_admin)$')
 
 class UserbotSettingsModel(BaseModel):
     api_id: int
@@ -87,6 +98,55 @@ class MessageResponse(BaseModel):
     message: str
     success: bool = True
 
+class UserResponse(RowModel):
+    user_id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone: Optional[str] = None
+    language: Optional[str] = None
+    registered_at: Optional[str] = None
+    is_active: Optional[int] = None
+
+class AdminResponse(RowModel):
+    admin_id: int
+    username: Optional[str] = None
+    role: str
+    added_at: Optional[str] = None
+    is_active: Optional[int] = None
+
+class AdminOrderResponse(OrderResponse):
+    user: Optional[UserResponse] = None
+
+class ChatSummaryResponse(UserResponse):
+    unread_count: int
+    last_message_id: Optional[int] = None
+    last_message_text: Optional[str] = None
+    last_sender_type: Optional[str] = None
+    last_message_at: Optional[str] = None
+
+class AdminOrderListResponse(BaseModel):
+    orders: List[AdminOrderResponse]
+    total: int
+    page: int
+    per_page: int
+    success: bool = True
+
+class UserListResponse(BaseModel):
+    users: List[UserResponse]
+    total: int
+    page: int
+    per_page: int
+    success: bool = True
+
+class AdminListResponse(BaseModel):
+    admins: List[AdminResponse]
+    success: bool = True
+
+class ChatListResponse(BaseModel):
+    chats: List[ChatSummaryResponse]
+    success: bool = True
+
 # Helper Functions
 def create_admin_access_token(admin_id: int) -> str:
     """Create JWT access token for admin"""
@@ -182,7 +242,7 @@ async def get_statistics(admin_id: int = Depends(verify_admin_token)):
     return {"statistics": stats, "success": True}
 
 # Orders Management
-@router.get("/orders")
+@router.get("/orders", response_model=AdminOrderListResponse)
 async def get_all_orders(
     status: Optional[str] = None,
     page: int = Query(default=1, ge=1),
@@ -234,13 +294,13 @@ async def update_order_status(
     admin_id: int = Depends(verify_admin_token)
 ):
     """Update order status"""
-    if not db.update_order_status(order_id, data.status):
+    if not set_order_status(order_id, data.status):
         raise HTTPException(status_code=404, detail="Order not found")
     
     return {"message": "Order status updated", "success": True}
 
 # Products Management
-@router.get("/products")
+@router.get("/products", response_model=ProductListResponse)
 async def get_all_products_admin(
     active_only: bool = False,
     category_id: Optional[int] = None,
@@ -331,13 +391,8 @@ async def upload_product_image(
     if file_size > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File too large")
     
-    # Save file
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_name = f"product_{product_id}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save file (content-addressed; the replaced image is collected by upload GC)
+    file_path = get_blob_store().put_file(file.file, file_extension)
     
     # Update product
     db.update_product(product_id, image_path=file_path)
@@ -349,7 +404,7 @@ async def upload_product_image(
     }
 
 # Categories Management
-@router.get("/categories")
+@router.get("/categories", response_model=CategoryListResponse)
 async def get_all_categories_admin(
     active_only: bool = False,
     admin_id: int = Depends(verify_admin_token)
@@ -400,7 +455,7 @@ async def delete_category(category_id: int, admin_id: int = Depends(verify_admin
     return {"message": "Category deleted", "success": True}
 
 # Neighborhoods Management
-@router.get("/neighborhoods")
+@router.get("/neighborhoods", response_model=NeighborhoodListResponse)
 async def get_all_neighborhoods_admin(
     active_only: bool = False,
     admin_id: int = Depends(verify_admin_token)
@@ -453,7 +508,7 @@ async def delete_neighborhood(
     return {"message": "Neighborhood deleted", "success": True}
 
 # Admins Management (Super Admin Only)
-@router.get("/admins")
+@router.get("/admins", response_model=AdminListResponse)
 async def get_all_admins(admin_id: int = Depends(verify_super_admin)):
     """Get all admins (super admin only)"""
     admins = db.get_all_admins()
@@ -486,23 +541,33 @@ async def remove_admin(
     return {"message": "Admin removed", "success": True}
 
 # Userbot Settings
+def _mask_userbot_settings(settings: dict) -> dict:
+    """Hide sensitive data"""
+    settings['api_hash'] = '***'
+    settings['session_string'] = '***' if settings.get('session_string') else None
+    return settings
+
 @router.get("/userbot")
 async def get_userbot_settings(admin_id: int = Depends(verify_admin_token)):
-    """Get userbot settings"""
+    """Get userbot accounts with live state of those connected in this process"""
     settings = db.get_userbot_settings()
     if settings:
-        # Hide sensitive data
-        settings['api_hash'] = '***'
-        settings['session_string'] = '***' if settings.get('session_string') else None
+        _mask_userbot_settings(settings)
     
-    return {"settings": settings, "success": True}
+    live = {account['account_id']: account for account in get_userbot_pool().stats()}
+    accounts = [
+        {**_mask_userbot_settings(account), 'state': live.get(account['id'])}
+        for account in db.get_all_userbot_settings(include_inactive=True)
+    ]
+    
+    return {"settings": settings, "accounts": accounts, "success": True}
 
 @router.put("/userbot")
 async def update_userbot_settings(
     data: UserbotSettingsModel,
     admin_id: int = Depends(verify_admin_token)
 ):
-    """Update userbot settings"""
+    """Add userbot account or update the account with this phone"""
     db.save_userbot_settings(
         api_id=data.api_id,
         api_hash=data.api_hash,
@@ -510,37 +575,82 @@ async def update_userbot_settings(
         session_string=data.session_string
     )
     
+    pool = get_userbot_pool()
+    if pool.is_running:
+        await pool.reload()
+    
     return {"message": "Userbot settings updated", "success": True}
 
+@router.delete("/userbot/{account_id}")
+async def deactivate_userbot_account(
+    account_id: int,
+    admin_id: int = Depends(verify_admin_token)
+):
+    """Take userbot account out of the pool"""
+    if not db.deactivate_userbot_account(account_id):
+        raise HTTPException(status_code=404, detail="Userbot account not found")
+    
+    pool = get_userbot_pool()
+    if pool.is_running:
+        await pool.reload()
+    
+    return {"message": "Userbot account deactivated", "success": True}
+
+# Uploads Maintenance
+@router.post("/uploads/gc")
+async def collect_upload_garbage(
+    include_legacy: bool = False,
+    admin_id: int = Depends(verify_super_admin)
+):
+    """Remove orphaned upload files and report space reclaimed (super admin only)"""
+    result = await asyncio.to_thread(get_blob_store().collect_garbage, include_legacy=include_legacy)
+    return {"result": result, "success": True}
+
+# Database Query Stats
+@router.get("/db/queries")
+async def get_top_queries(
+    limit: int = Query(default=20, ge=1, le=200),
+    sort: str = Query(default='total', pattern=f"^({'|'.join(SORT_KEYS)})$"),
+    admin_id: int = Depends(verify_super_admin)
+):
+    """SQL statements of this process ranked by total (or mean/max) time (super admin only)"""
+    profiler = get_query_profiler()
+    return {
+        "enabled": profiler.enabled,
+        "slow_query_ms": profiler.slow_seconds * 1000,
+        "queries": profiler.top(limit, sort),
+        "success": True
+    }
+
+@router.delete("/db/queries")
+async def reset_query_stats(admin_id: int = Depends(verify_super_admin)):
+    """Start collecting query stats afresh (super admin only)"""
+    get_query_profiler().reset()
+    return {"message": "Query stats reset", "success": True}
+
 # Chat Management
-@router.get("/chats")
+@router.get("/chats", response_model=ChatListResponse)
 async def get_unread_chats(admin_id: int = Depends(verify_admin_token)):
     """Get users with unread messages"""
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT DISTINCT u.*, COUNT(cm.message_id) as unread_count
-        FROM chat_messages cm
-        JOIN users u ON cm.user_id = u.user_id
-        WHERE cm.is_read = 0 AND cm.sender_type = 'user'
-        GROUP BY u.user_id
-        ORDER BY MAX(cm.created_at) DESC
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-    
-    chats = [dict(row) for row in rows]
+    chats = db.get_unread_conversations()
     return {"chats": chats, "success": True}
 
-@router.get("/chats/{user_id}")
-async def get_chat_messages(user_id: int, admin_id: int = Depends(verify_admin_token)):
-    """Get chat messages with specific user"""
-    messages = db.get_user_messages(user_id)
+@router.get("/chats/{user_id}", response_model=ChatMessageListResponse)
+async def get_chat_messages(
+    user_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(default=CHAT_PAGE_DEFAULT_LIMIT, ge=1, le=CHAT_PAGE_MAX_LIMIT),
+    admin_id: int = Depends(verify_admin_token)
+):
+    """Get chat messages with specific user (newest page by default, before_id/after_id to page)"""
+    messages, has_more = db.get_user_messages_page(user_id, limit, before_id, after_id)
     
-    # Mark admin messages as read
-    db.mark_messages_read(user_id, admin_id)
+    # Mark user's messages as read up to the newest one shown
+    if messages and before_id is None:
+        db.mark_messages_read(user_id, admin_id, up_to_id=messages[-1]['message_id'])
     
-    return {"messages": messages, "success": True}
+    return {"messages": messages, "has_more": has_more, "success": True}
 
 @router.post("/chats/{user_id}/reply", response_model=MessageResponse)
 async def reply_to_chat(
@@ -556,6 +666,9 @@ async def reply_to_chat(
     
     message_id = db.create_message(user_id, data.message, 'admin', admin_id)
     
+    # Push reply to the user's open chat connections
+    get_event_hub().publish(('chat', user_id), chat_message_event(db.get_message(message_id)), message_id)
+    
     return {
         "message": "Reply sent",
         "message_id": message_id,
@@ -563,7 +676,7 @@ async def reply_to_chat(
     }
 
 # Users Management
-@router.get("/users")
+@router.get("/users", response_model=UserListResponse)
 async def get_all_users(
     page: int = Query(default=1, ge=1),
     per_page: int = Query(default=50, ge=1, le=100),
@@ -0,0 +1,117 @@
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from threading import Lock
+from typing import Callable, Hashable, Optional, Tuple, Type
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from config import CATALOG_CACHE_MAX_ENTRIES
+import database as db
+
+
+class ResponseCache:
+    """LRU cache of serialized response bodies tagged with the catalog version"""
+
+    def __init__(self, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[int, bytes]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, version: int) -> Optional[bytes]:
+        """Get cached body if it was rendered for the given version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, version: int, body: bytes):
+        """Store rendered body for the given version"""
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached bodies"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global response cache instance
+response_cache = ResponseCache()
+
+
+def _parse_db_timestamp(value: Optional[str]) -> datetime:
+    """Parse SQLite CURRENT_TIMESTAMP (UTC) value"""
+    if not value:
+        return datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check If-None-Match header against etag (weak comparison)"""
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in candidates)
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate conditional request headers (If-None-Match takes precedence)"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def catalog_response(request: Request, key: tuple, build: Callable[[], dict],
+                     response_model: Type[BaseModel], user: Optional[dict] = None) -> Response:
+    """
+    Serve catalog payload with ETag/Last-Modified validation
+    The ETag is weak: CompressionMiddleware sends the same payload as br,
+    gzip or identity bytes, which are equivalent but not byte-identical.
+    The 304 check only uses the in-memory catalog version (and the already
+    loaded user row), so unchanged catalogs are answered without any query.
+    Pass user for payloads containing per-user data (favorites).
+    Bodies are rendered through response_model and cached per key and version.
+    """
+    version, updated_at = db.get_catalog_version()
+    last_modified = _parse_db_timestamp(updated_at)
+
+    if user is not None:
+        key = key + ('user', user['user_id'], user.get('favorites_version') or 0)
+        last_modified = max(last_modified, _parse_db_timestamp(user.get('favorites_updated_at')))
+
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    etag = f'W/"c{version}-{digest}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': format_datetime(last_modified.replace(microsecond=0), usegmt=True),
+        'Cache-Control': 'private, no-cache' if user is not None else 'no-cache'
+    }
+
+    if _is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key, version)
+    if body is None:
+        body = response_model.model_validate(build()).model_dump_json(exclude_unset=True).encode()
+        response_cache.set(key, version, body)
+
+    return Response(content=body, media_type='application/json', headers=headers)
@@ -0,0 +1,164 @@
+import zlib
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, GZip is always available
+    brotli = None
+
+# Content types that are already compressed (uploaded product images, chat attachments)
+INCOMPRESSIBLE_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif',
+                        'video/', 'audio/', 'application/zip', 'application/gzip')
+
+
+class _GZipCompressor:
+    """Incremental gzip compressor"""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    """Incremental Brotli compressor"""
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress responses with Brotli or GZip based on Accept-Encoding"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _select(self, accept_encoding: str) -> Optional[tuple]:
+        """Pick encoding and compressor factory supported by the client"""
+        accepted = {token.split(';')[0].strip() for token in accept_encoding.lower().split(',')}
+        if brotli is not None and 'br' in accepted:
+            return 'br', lambda: _BrotliCompressor(self.brotli_quality)
+        if 'gzip' in accepted:
+            return 'gzip', lambda: _GZipCompressor(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            selected = self._select(Headers(scope=scope).get("Accept-Encoding", ""))
+            if selected:
+                encoding, factory = selected
+                responder = _CompressionResponder(self.app, self.minimum_size, encoding, factory)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    """Per-request responder (same flow as starlette's GZipResponder)"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str,
+                 compressor_factory: Callable):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.compressor_factory = compressor_factory
+        self.compressor = None
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _set_headers(self, content_length: Optional[int]):
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        # The compressed bytes differ from the identity ones: a strong validator must not cover both
+        etag = headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        headers.add_vary_header("Accept-Encoding")
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the start message until we know whether the body is compressed
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith(INCOMPRESSIBLE_TYPES)
+            )
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if not self.started:
+            self.started = True
+            if len(body) < self.minimum_size and not more_body:
+                # Small responses are cheaper to send as-is
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            self.compressor = self.compressor_factory()
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                self._set_headers(len(body))
+            else:
+                body = self.compressor.compress(body) + self.compressor.flush()
+                self._set_headers(None)
+            message["body"] = body
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        # Remaining chunks of a streaming response
+        data = self.compressor.compress(body)
+        data += self.compressor.flush() if more_body else self.compressor.finish()
+        message["body"] = data
+        await self.send(message)
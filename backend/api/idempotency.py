@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import time
+from typing import Dict, Optional
+
+import jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import API_SECRET_KEY, IDEMPOTENCY_KEY_TTL, IDEMPOTENCY_PENDING_TTL, IDEMPOTENCY_WAIT_TIMEOUT
+import database as db
+
+IDEMPOTENT_PATHS = ('/api/orders/create', '/api/cart/add')
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+
+
+def _digest(data: bytes) -> bytes:
+    """Compact 16-byte hash used as stored key and request fingerprint"""
+    return hashlib.sha256(data).digest()[:16]
+
+
+def _token_user(headers: Headers) -> Optional[int]:
+    """User id from bearer token (authentication itself is left to the route)"""
+    scheme, _, token = headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return jwt.decode(token, API_SECRET_KEY, algorithms=['HS256']).get('user_id')
+    except jwt.InvalidTokenError:
+        return None
+
+
+class IdempotencyMiddleware:
+    """
+    Replay stored responses for retried POSTs carrying an Idempotency-Key header
+    Keys are scoped to the user and path and stored hashed with the 2xx response
+    for ttl seconds, so a retry costs one primary-key lookup. Duplicates arriving
+    while the first request is in flight wait for its response: in this worker on
+    a shared future, from other workers by polling the claimed row. Reusing a key
+    with a different body is rejected with 422; failed requests release their key.
+    """
+
+    def __init__(self, app: ASGIApp, paths=IDEMPOTENT_PATHS, ttl: float = IDEMPOTENCY_KEY_TTL,
+                 pending_ttl: float = IDEMPOTENCY_PENDING_TTL, wait_timeout: float = IDEMPOTENCY_WAIT_TIMEOUT):
+        self.app = app
+        self.paths = set(paths)
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get('idempotency-key')
+        user_id = _token_user(headers) if idempotency_key else None
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await JSONResponse({'detail': 'Idempotency-Key is too long'}, status_code=400)(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        key = _digest(f"{user_id}\0{scope['path']}\0{idempotency_key}".encode())
+        fingerprint = _digest(body)
+
+        while True:
+            future = self._inflight.get(key)
+            if future is not None:
+                # Same worker: wait for the first request instead of hitting the table
+                stored = await asyncio.shield(future)
+            else:
+                stored = await self._lead(key, fingerprint, scope, body, receive, send)
+                if stored is None:
+                    return
+            if stored is not False:
+                await self._replay(stored, fingerprint, scope, receive, send)
+                return
+            # The first request failed and released the key: run this one
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _lead(self, key: bytes, fingerprint: bytes, scope: Scope, body: bytes,
+                    receive: Receive, send: Send):
+        """
+        Claim key and run the request, returns None when the response was sent,
+        a stored row to replay, or False if the key was released before completion
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        outcome = False
+        try:
+            row = await asyncio.to_thread(db.claim_idempotency_key, key, fingerprint, self.pending_ttl)
+            if row is not None:
+                if row['status'] is None:
+                    row = await self._wait_elsewhere(key)
+                    if row is None:
+                        await JSONResponse(
+                            {'detail': 'A request with this Idempotency-Key is still in progress'},
+                            status_code=409, headers={'Retry-After': '1'}
+                        )(scope, receive, send)
+                        return None
+                outcome = row or False
+                return outcome
+
+            outcome = await self._run(key, fingerprint, scope, body, receive, send)
+            return None
+        finally:
+            del self._inflight[key]
+            future.set_result(outcome)
+
+    async def _wait_elsewhere(self, key: bytes) -> Optional[dict]:
+        """Poll key claimed by another worker, returns row once stored, {} if released, None on timeout"""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            row = await asyncio.to_thread(db.get_idempotency_key, key)
+            if row is None:
+                return {}
+            if row['status'] is not None:
+                return row
+        return None
+
+    async def _run(self, key: bytes, fingerprint: bytes, scope: Scope, body: bytes,
+                   receive: Receive, send: Send):
+        """Run request, store a 2xx response, returns stored row or False"""
+        response = {'status': None, 'content_type': None, 'chunks': []}
+        delivered = False
+
+        async def replay_receive() -> Message:
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        async def capture_send(message: Message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['content_type'] = Headers(raw=message['headers']).get('content-type')
+            elif message['type'] == 'http.response.body':
+                response['chunks'].append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await asyncio.shield(asyncio.to_thread(db.release_idempotency_key, key))
+            raise
+
+        if response['status'] is None or not 200 <= response['status'] < 300:
+            await asyncio.to_thread(db.release_idempotency_key, key)
+            return False
+        stored = {
+            'fingerprint': fingerprint,
+            'status': response['status'],
+            'content_type': response['content_type'],
+            'body': b''.join(response['chunks']),
+        }
+        await asyncio.to_thread(db.complete_idempotency_key, key, stored['status'],
+                                stored['content_type'], stored['body'], self.ttl)
+        return stored
+
+    @staticmethod
+    async def _replay(stored: dict, fingerprint: bytes, scope: Scope, receive: Receive, send: Send):
+        """Send stored response (422 if the key was used for a different request)"""
+        if stored['fingerprint'] != fingerprint:
+            await JSONResponse(
+                {'detail': 'Idempotency-Key was already used with a different request'},
+                status_code=422
+            )(scope, receive, send)
+            return
+        headers = [(b'content-length', str(len(stored['body'])).encode()), (b'idempotent-replayed', b'true')]
+        if stored['content_type']:
+            headers.append((b'content-type', stored['content_type'].encode()))
+        await send({'type': 'http.response.start', 'status': stored['status'], 'headers': headers})
+        await send({'type': 'http.response.body', 'body': stored['body']})
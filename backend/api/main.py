@@ -1,16 +1,35 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 import os
-from config import UPLOAD_DIR
+from config import UPLOAD_DIR, MULTIPROCESS
+from api.compression import CompressionMiddleware
+from api.idempotency import IdempotencyMiddleware
+from api.metrics import MetricsMiddleware, router as metrics_router
+from api.request_id import RequestIdMiddleware
 from api.routes import router as user_router
 from api.admin_routes import router as admin_router
+from services.event_relay import run_event_relay
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start cross-process event relay when running as one of several workers"""
+    relay = asyncio.create_task(run_event_relay(), name="event_relay") if MULTIPROCESS else None
+    yield
+    if relay:
+        relay.cancel()
 
 # Create FastAPI app
 app = FastAPI(
     title="ZarbdorUn E-commerce API",
     description="REST API for ZarbdorUn e-commerce platform",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -22,6 +41,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Replay stored responses for retried order/cart POSTs with an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
+# Compress responses above COMPRESSION_MIN_SIZE (Brotli if installed, otherwise GZip)
+app.add_middleware(CompressionMiddleware)
+
+# Outermost: time every request by route template for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Request id for correlating log records (and X-Request-ID in responses)
+app.add_middleware(RequestIdMiddleware)
+
 # Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -31,6 +62,7 @@ app.mount(f"/{UPLOAD_DIR}", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 # Include routers
 app.include_router(user_router, tags=["User API"])
 app.include_router(admin_router, tags=["Admin API"])
+app.include_router(metrics_router)
 
 # Health check endpoint
 @app.get("/")
@@ -56,4 +88,4 @@ if __name__ == "__main__":
     init_db()
     
     # Run server
-    uvicorn.run(app, host=API_HOST, port=API_PORT)
+    uvicorn.run(app, host=API_HOST, port=API_PORT, ws_per_message_deflate=False)
@@ -0,0 +1,94 @@
+"""
+Prometheus metrics for the HTTP API
+MetricsMiddleware records latency per route template (/api/products/{product_id},
+not the raw path, so label cardinality stays bounded) and requests in flight.
+The /metrics route renders the process-wide registry, which also holds the
+database, bot and queue metrics. It is served to scrapers presenting
+METRICS_TOKEN as a bearer token, or to loopback clients when no token is set.
+"""
+import secrets
+import time
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+from config import METRICS_TOKEN
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED = 'unmatched'
+LOOPBACK_HOSTS = ('127.0.0.1', '::1', 'localhost')
+
+router = APIRouter()
+
+
+def verify_metrics_access(request: Request):
+    """Bearer METRICS_TOKEN, or a loopback client when no token is configured"""
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Invalid metrics token",
+                                headers={'WWW-Authenticate': 'Bearer'})
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Metrics are only served locally without METRICS_TOKEN")
+
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_metrics_access)])
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.get_registry().render(), media_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Time every HTTP request and label it with the matched route template"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._templates: Dict[object, str] = {}
+
+    def _route_template(self, scope: Scope) -> str:
+        """Path template of the route the router matched (it stores the endpoint in scope)"""
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return UNMATCHED
+        template = self._templates.get(endpoint)
+        if template is None:
+            self._templates = self._build_templates(scope.get('app'))
+            template = self._templates.get(endpoint, UNMATCHED)
+        return template
+
+    @staticmethod
+    def _build_templates(app: Optional[ASGIApp]) -> Dict[object, str]:
+        templates = {}
+        for route in getattr(app, 'routes', ()):
+            endpoint = getattr(route, 'endpoint', None)
+            if endpoint is not None:
+                templates[endpoint] = route.path
+            elif getattr(route, 'app', None) is not None:
+                # Mounted apps (uploads) report themselves as the endpoint
+                templates[route.app] = f"{route.path}/{{path}}"
+        return templates
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        metrics.http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.http_in_flight.dec()
+            metrics.http_requests.observe(scope['method'], self._route_template(scope), str(status),
+                                          value=time.perf_counter() - start)
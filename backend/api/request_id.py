@@ -0,0 +1,42 @@
+"""
+Request correlation ids
+Every HTTP request gets an id (the client's X-Request-ID if it sent a sane
+one), echoed in the X-Request-ID response header and attached to every log
+record written while the request is handled, uvicorn's access log line
+included.
+"""
+import re
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from logging_setup import request_id, new_request_id
+
+HEADER = 'x-request-id'
+_VALID_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIdMiddleware:
+    """Bind a request id to the request's context and response"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        received = dict(scope['headers']).get(HEADER.encode(), b'').decode('latin-1')
+        current = received if _VALID_ID.match(received) else new_request_id()
+
+        async def send_with_id(message: Message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append(HEADER, current)
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -1,17 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query, status
+from fastapi import (
+    APIRouter, HTTPException, Depends, UploadFile, File, Query, Request, WebSocket,
+    WebSocketDisconnect, status
+)
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Union, Callable
 import jwt
+import json
+import base64
+import asyncio
 import random
 import os
-import shutil
+import logging
 from datetime import datetime, timedelta
-from config import API_SECRET_KEY, JWT_EXPIRE_HOURS, CODE_EXPIRE_MINUTES, CODE_LENGTH, UPLOAD_DIR, MAX_FILE_SIZE
+from config import API_SECRET_KEY, JWT_EXPIRE_HOURS, CODE_EXPIRE_MINUTES, CODE_LENGTH, MAX_FILE_SIZE
+from config import PRODUCTS_PAGE_DEFAULT_LIMIT, PRODUCTS_PAGE_MAX_LIMIT, CHAT_PAGE_DEFAULT_LIMIT, CHAT_PAGE_MAX_LIMIT
+from config import ORDER_EVENTS_MAX_WAIT
 import database as db
+from services.blob_store import get_blob_store
+from services.event_hub import get_event_hub
+from services.order_events import order_event_message
+from api.cache import catalog_response
 
 router = APIRouter()
 security = HTTPBearer()
+logger = logging.getLogger(__name__)
 
 # Pydantic Models
 class RequestCodeModel(BaseModel):
@@ -39,6 +52,8 @@ class OrderCreateModel(BaseModel):
     neighborhood_id: Optional[int] = None
     payment_method: str = Field(default='cash')
     notes: Optional[str] = None
+    # False: refuse with 409 if a price changed since the item was added to the cart
+    accept_price_changes: bool = True
 
 class ChatMessageModel(BaseModel):
     message: str = Field(..., min_length=1, max_length=4000)
@@ -53,30 +68,173 @@ class MessageResponse(BaseModel):
     message: str
     success: bool = True
 
-class ProductResponse(BaseModel):
+class RowModel(BaseModel):
+    """Base for database rows: known columns are typed, other columns pass through"""
+    model_config = ConfigDict(extra='allow')
+
+class CategoryResponse(RowModel):
+    category_id: int
+    name_uz: str
+    name_ru: str
+    description_uz: Optional[str] = None
+    description_ru: Optional[str] = None
+    created_at: Optional[str] = None
+    is_active: Optional[int] = None
+
+class ProductResponse(RowModel):
     product_id: int
     category_id: int
     name_uz: str
     name_ru: str
-    description_uz: Optional[str]
-    description_ru: Optional[str]
+    description_uz: Optional[str] = None
+    description_ru: Optional[str] = None
+    price: float
+    discount_price: Optional[float] = None
+    stock_quantity: Optional[int] = None
+    image_path: Optional[str] = None
+    created_at: Optional[str] = None
+    is_active: Optional[int] = None
+    effective_price: Optional[float] = None
+    sold_count: Optional[int] = None
+    # Changes with every checkout hold without a catalog version bump: kept out of cached bodies
+    reserved_quantity: Optional[int] = Field(default=None, exclude=True)
+
+class CartItemResponse(ProductResponse):
+    cart_id: int
+    user_id: int
+    quantity: int
+    added_at: Optional[str] = None
+
+class NeighborhoodResponse(RowModel):
+    neighborhood_id: int
+    name_uz: str
+    name_ru: str
+    delivery_price: Optional[float] = None
+    is_active: Optional[int] = None
+
+class OrderItemResponse(RowModel):
+    order_item_id: int
+    order_id: int
+    product_id: int
+    quantity: int
     price: float
-    discount_price: Optional[float]
-    stock_quantity: int
-    image_path: Optional[str]
-    is_favorite: bool = False
+    name_uz: Optional[str] = None
+    name_ru: Optional[str] = None
+    image_path: Optional[str] = None
 
-class OrderResponse(BaseModel):
+class OrderResponse(RowModel):
     order_id: int
+    user_id: int
+    neighborhood_id: Optional[int] = None
     full_name: str
     phone: str
     address: str
     total_amount: float
-    delivery_price: float
-    payment_method: str
+    delivery_price: Optional[float] = None
+    payment_method: Optional[str] = None
     status: str
-    created_at: str
-    items: List[dict]
+    notes: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    items: List[OrderItemResponse]
+
+class ChatMessageResponse(RowModel):
+    message_id: int
+    user_id: int
+    admin_id: Optional[int] = None
+    message_text: str
+    sender_type: str
+    created_at: Optional[str] = None
+    is_read: Optional[int] = None
+    file_path: Optional[str] = None
+
+class CategoryListResponse(BaseModel):
+    categories: List[CategoryResponse]
+    success: bool = True
+
+class ProductListResponse(BaseModel):
+    products: List[ProductResponse]
+    success: bool = True
+
+class ProjectedProductResponse(RowModel):
+    product_id: int
+    category_id: Optional[int] = None
+    name_uz: Optional[str] = None
+    name_ru: Optional[str] = None
+    description_uz: Optional[str] = None
+    description_ru: Optional[str] = None
+    price: Optional[float] = None
+    discount_price: Optional[float] = None
+    stock_quantity: Optional[int] = None
+    image_path: Optional[str] = None
+    created_at: Optional[str] = None
+    is_active: Optional[int] = None
+    effective_price: Optional[float] = None
+    sold_count: Optional[int] = None
+    version: Optional[int] = None
+    updated_at: Optional[str] = None
+    is_favorite: Optional[bool] = None
+
+class ProductPageResponse(BaseModel):
+    products: List[ProjectedProductResponse]
+    next_cursor: Optional[str] = None
+    success: bool = True
+
+class ProductDetailResponse(BaseModel):
+    product: ProductResponse
+    success: bool = True
+
+class CartResponse(BaseModel):
+    cart_items: List[CartItemResponse]
+    total: float
+    count: int
+    success: bool = True
+
+class FavoriteListResponse(BaseModel):
+    favorites: List[ProductResponse]
+    count: int
+    success: bool = True
+
+class NeighborhoodListResponse(BaseModel):
+    neighborhoods: List[NeighborhoodResponse]
+    success: bool = True
+
+class OrderListResponse(BaseModel):
+    orders: List[OrderResponse]
+    success: bool = True
+
+class ChatMessageListResponse(BaseModel):
+    messages: List[ChatMessageResponse]
+    has_more: bool = False
+    success: bool = True
+
+class OrderEventResponse(RowModel):
+    type: str = 'order_status'
+    event_id: int
+    order_id: int
+    user_id: int
+    status: str
+    previous_status: Optional[str] = None
+    created_at: Optional[str] = None
+
+class OrderEventListResponse(BaseModel):
+    events: List[OrderEventResponse]
+    last_event_id: int
+    success: bool = True
+
+class CatalogDeletedResponse(BaseModel):
+    categories: List[int]
+    products: List[int]
+    neighborhoods: List[int]
+
+class CatalogSyncResponse(BaseModel):
+    version: int
+    full: bool
+    categories: List[CategoryResponse]
+    products: List[ProductResponse]
+    neighborhoods: List[NeighborhoodResponse]
+    deleted: CatalogDeletedResponse
+    success: bool = True
 
 # Helper Functions
 def create_access_token(user_id: int) -> str:
@@ -89,10 +247,14 @@ def create_access_token(user_id: int) -> str:
     token = jwt.encode(payload, API_SECRET_KEY, algorithm='HS256')
     return token
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    """Verify JWT token and return user_id"""
+def verify_token_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Verify JWT token and return user record"""
+    return get_token_user(credentials.credentials)
+
+def get_token_user(token: str) -> dict:
+    """Decode JWT token and return active user record"""
     try:
-        payload = jwt.decode(credentials.credentials, API_SECRET_KEY, algorithms=['HS256'])
+        payload = jwt.decode(token, API_SECRET_KEY, algorithms=['HS256'])
         user_id = payload.get('user_id')
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -102,12 +264,16 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
         if not user or not user.get('is_active'):
             raise HTTPException(status_code=401, detail="User not found or inactive")
         
-        return user_id
+        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def verify_token(user: dict = Depends(verify_token_user)) -> int:
+    """Verify JWT token and return user_id"""
+    return user['user_id']
+
 def generate_verification_code() -> str:
     """Generate random verification code"""
     return ''.join([str(random.randint(0, 9)) for _ in range(CODE_LENGTH)])
@@ -173,53 +339,154 @@ async def get_current_user(user_id: int = Depends(verify_token)):
     return user
 
 # Category Endpoints
-@router.get("/api/categories")
-async def get_categories(language: str = Query(default='uz', regex='^(uz|ru)$')):
+@router.get("/api/categories", response_model=CategoryListResponse)
+async def get_categories(request: Request, language: str = Query(default='uz', pattern='^(uz|ru)$')):
     """Get all active categories"""
-    categories = db.get_all_categories(active_only=True)
-    return {"categories": categories, "success": True}
+    def build():
+        categories = db.get_all_categories(active_only=True)
+        return {"categories": categories, "success": True}
+    
+    return catalog_response(request, ('categories', language), build, CategoryListResponse)
 
 # Product Endpoints
-@router.get("/api/products")
+def encode_product_cursor(sort: str, position: tuple) -> str:
+    """Encode (sort value, product_id) listing position as opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps([sort, *position]).encode()).decode().rstrip('=')
+
+def decode_product_cursor(cursor: str, sort: str) -> tuple:
+    """Decode cursor produced by encode_product_cursor for the same sort"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, product_id = json.loads(raw)
+        value_type = str if sort == 'newest' else (int, float)
+        if (cursor_sort != sort or not isinstance(value, value_type)
+                or isinstance(value, bool) or not isinstance(product_id, int)):
+            raise ValueError
+        return value, product_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def resolve_product_fields(fields: Optional[str], language: Optional[str]) -> List[str]:
+    """
+    Map fields/language query params to product columns
+    'name' and 'description' expand to the language columns (both if no language).
+    """
+    languages = [language] if language else ['uz', 'ru']
+    if fields:
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+    else:
+        requested = list(db.PRODUCT_COLUMNS)
+    
+    columns = ['product_id']
+    for field in requested:
+        if field in ('name', 'description'):
+            expanded = [f'{field}_{lang}' for lang in languages]
+        elif field.startswith(('name_', 'description_')) and language and not field.endswith(f'_{language}'):
+            expanded = []
+        elif field in db.PRODUCT_COLUMNS:
+            expanded = [field]
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+        columns.extend(column for column in expanded if column not in columns)
+    return columns
+
+@router.get("/api/products", response_model=Union[ProductListResponse, ProductPageResponse])
 async def get_products(
+    request: Request,
     category_id: Optional[int] = None,
     search: Optional[str] = None,
-    language: str = Query(default='uz', regex='^(uz|ru)$'),
-    user_id: Optional[int] = Depends(verify_token)
+    language: Optional[str] = Query(default=None, pattern='^(uz|ru)$'),
+    limit: Optional[int] = Query(default=None, ge=1, le=PRODUCTS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    min_price: Optional[float] = Query(default=None, ge=0),
+    max_price: Optional[float] = Query(default=None, ge=0),
+    in_stock: bool = False,
+    on_sale: bool = False,
+    sort: str = Query(default='newest', pattern='^(newest|price_asc|price_desc|popular)$'),
+    user: Optional[dict] = Depends(verify_token_user)
 ):
-    """Get products with optional filters"""
-    if search:
-        products = db.search_products(search, language)
-    elif category_id:
-        products = db.get_products_by_category(category_id)
-    else:
-        products = db.get_all_products(active_only=True)
+    """
+    Get products with optional filters
+    Without limit/cursor/fields the full product list is returned. Otherwise
+    products are paged and only the requested columns are selected. language
+    is the search language (default uz); in paged mode it also narrows
+    name/description to that language.
+    Price filters and sorting use the discounted (effective) price.
+    """
+    filters = (min_price, max_price, in_stock, on_sale, sort)
+    
+    def product_query() -> db.ProductQuery:
+        return (db.ProductQuery()
+                .category(category_id)
+                .search(search, language or 'uz')
+                .price_range(min_price, max_price)
+                .in_stock(in_stock)
+                .on_sale(on_sale)
+                .sort(sort))
     
-    # Add favorite status if user is authenticated
-    if user_id:
-        for product in products:
-            product['is_favorite'] = db.is_favorite(user_id, product['product_id'])
+    def add_favorites(products: List[dict]):
+        if user:
+            favorite_ids = db.get_user_favorite_ids(user['user_id'])
+            for product in products:
+                product['is_favorite'] = product['product_id'] in favorite_ids
+    
+    if limit or cursor or fields:
+        columns = resolve_product_fields(fields, language)
+        after = decode_product_cursor(cursor, sort) if cursor else None
+        page_size = limit or PRODUCTS_PAGE_DEFAULT_LIMIT
+        
+        def build_page():
+            products, next_after = product_query().after(after).fetch(columns, limit=page_size)
+            add_favorites(products)
+            return {
+                "products": products,
+                "next_cursor": encode_product_cursor(sort, next_after) if next_after else None,
+                "success": True
+            }
+        
+        key = ('products_page', category_id, search, language, filters, tuple(columns), page_size, after)
+        return catalog_response(request, key, build_page, ProductPageResponse, user=user)
+    
+    def build():
+        if filters != (None, None, False, False, 'newest'):
+            products, _ = product_query().fetch()
+        elif search:
+            products = db.search_products(search, language or 'uz')
+        elif category_id:
+            products = db.get_products_by_category(category_id)
+        else:
+            products = db.get_all_products(active_only=True)
+        
+        # Add favorite status if user is authenticated
+        add_favorites(products)
+        return {"products": products, "success": True}
     
-    return {"products": products, "success": True}
+    key = ('products', category_id, search, language, filters)
+    return catalog_response(request, key, build, ProductListResponse, user=user)
 
-@router.get("/api/products/{product_id}")
+@router.get("/api/products/{product_id}", response_model=ProductDetailResponse)
 async def get_product(
+    request: Request,
     product_id: int,
-    user_id: Optional[int] = Depends(verify_token)
+    user: Optional[dict] = Depends(verify_token_user)
 ):
     """Get single product by ID"""
-    product = db.get_product(product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Add favorite status
-    if user_id:
-        product['is_favorite'] = db.is_favorite(user_id, product['product_id'])
+    def build():
+        product = db.get_product(product_id)
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        # Add favorite status
+        if user:
+            product['is_favorite'] = db.is_favorite(user['user_id'], product['product_id'])
+        
+        return {"product": product, "success": True}
     
-    return {"product": product, "success": True}
+    return catalog_response(request, ('product', product_id), build, ProductDetailResponse, user=user)
 
 # Cart Endpoints
-@router.get("/api/cart")
+@router.get("/api/cart", response_model=CartResponse)
 async def get_cart(user_id: int = Depends(verify_token)):
     """Get user's cart items"""
     cart_items = db.get_cart_items(user_id)
@@ -242,8 +509,8 @@ async def add_to_cart(data: CartAddModel, user_id: int = Depends(verify_token)):
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Check stock
-    if product['stock_quantity'] < data.quantity:
+    # Check stock (not counting units held by checkouts in progress)
+    if product['stock_quantity'] - product['reserved_quantity'] < data.quantity:
         raise HTTPException(status_code=400, detail="Insufficient stock")
     
     db.add_to_cart(user_id, data.product_id, data.quantity)
@@ -270,7 +537,7 @@ async def clear_cart(user_id: int = Depends(verify_token)):
     return {"message": "Cart cleared", "success": True}
 
 # Favorites Endpoints
-@router.get("/api/favorites")
+@router.get("/api/favorites", response_model=FavoriteListResponse)
 async def get_favorites(user_id: int = Depends(verify_token)):
     """Get user's favorite products"""
     favorites = db.get_user_favorites(user_id)
@@ -297,23 +564,57 @@ async def remove_from_favorites(product_id: int, user_id: int = Depends(verify_t
     return {"message": "Product removed from favorites", "success": True}
 
 # Neighborhoods Endpoints
-@router.get("/api/neighborhoods")
-async def get_neighborhoods():
+@router.get("/api/neighborhoods", response_model=NeighborhoodListResponse)
+async def get_neighborhoods(request: Request):
     """Get all active neighborhoods"""
-    neighborhoods = db.get_all_neighborhoods(active_only=True)
-    return {"neighborhoods": neighborhoods, "success": True}
+    def build():
+        neighborhoods = db.get_all_neighborhoods(active_only=True)
+        return {"neighborhoods": neighborhoods, "success": True}
+    
+    return catalog_response(request, ('neighborhoods',), build, NeighborhoodListResponse)
+
+# Sync Endpoints
+@router.get("/api/sync/catalog", response_model=CatalogSyncResponse)
+async def sync_catalog(
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    user_id: int = Depends(verify_token)
+):
+    """
+    Get catalog changes since a previously returned version
+    Clients store the returned version and send it as since on the next launch.
+    When full is true the local copy must be replaced instead of patched.
+    """
+    def build():
+        return {**db.get_catalog_changes(since), "success": True}
+    
+    return catalog_response(request, ('sync_catalog', since), build, CatalogSyncResponse)
 
 # Order Endpoints
 @router.post("/api/orders/create")
 async def create_order(data: OrderCreateModel, user_id: int = Depends(verify_token)):
     """Create new order from cart"""
-    # Get cart items
-    cart_items = db.get_cart_items(user_id)
-    if not cart_items:
+    # Validate stock and current prices of the whole cart in one query
+    cart_lines = db.validate_cart(user_id)
+    if not cart_lines:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
+    unavailable = [line['product_id'] for line in cart_lines if not line['available']]
+    if unavailable:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Some products are not available", "product_ids": unavailable}
+        )
+    
+    price_changed = [line['product_id'] for line in cart_lines if line['price_changed']]
+    if price_changed and not data.accept_price_changes:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Prices have changed", "product_ids": price_changed}
+        )
+    
     # Calculate total
-    total_amount = sum(item['quantity'] * (item['discount_price'] or item['price']) for item in cart_items)
+    total_amount = sum(line['quantity'] * line['effective_price'] for line in cart_lines)
     
     # Get delivery price
     delivery_price = 0
@@ -322,9 +623,11 @@ async def create_order(data: OrderCreateModel, user_id: int = Depends(verify_tok
         if neighborhood:
             delivery_price = neighborhood['delivery_price']
     
-    # Create order
-    order_id = db.create_order(
+    # Take items out of stock, create the order and clear the cart in one transaction
+    # (a concurrent checkout may have taken the stock since validation)
+    order_id = db.place_order(
         user_id=user_id,
+        items=[(line['product_id'], line['quantity'], line['effective_price']) for line in cart_lines],
         full_name=data.full_name,
         phone=data.phone,
         address=data.address,
@@ -334,30 +637,25 @@ async def create_order(data: OrderCreateModel, user_id: int = Depends(verify_tok
         payment_method=data.payment_method,
         notes=data.notes
     )
-    
-    # Add order items
-    for item in cart_items:
-        db.add_order_item(
-            order_id=order_id,
-            product_id=item['product_id'],
-            quantity=item['quantity'],
-            price=item['discount_price'] or item['price']
+    if order_id is None:
+        unavailable = [line['product_id'] for line in db.validate_cart(user_id) if not line['available']]
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Some products are not available", "product_ids": unavailable}
         )
     
-    # Clear cart
-    db.clear_cart(user_id)
-    
     # Get order details
     order = db.get_order(order_id)
     items = db.get_order_items(order_id)
     
     return {
         "order": {**order, "items": items},
+        "price_changed": price_changed,
         "message": "Order created successfully",
         "success": True
     }
 
-@router.get("/api/orders")
+@router.get("/api/orders", response_model=OrderListResponse)
 async def get_user_orders(user_id: int = Depends(verify_token)):
     """Get user's orders"""
     orders = db.get_user_orders(user_id)
@@ -368,6 +666,38 @@ async def get_user_orders(user_id: int = Depends(verify_token)):
     
     return {"orders": orders, "success": True}
 
+@router.get("/api/orders/events", response_model=OrderEventListResponse)
+async def wait_order_events(
+    since: Optional[int] = Query(default=None, ge=0),
+    timeout: int = Query(default=25, ge=0, le=ORDER_EVENTS_MAX_WAIT),
+    user_id: int = Depends(verify_token)
+):
+    """
+    Long-poll for order status changes (fallback for /ws/orders)
+    Returns events after since immediately, otherwise holds the request up to
+    timeout seconds until one arrives. Pass last_event_id as since next time;
+    without since the wait starts from the latest event.
+    """
+    if since is None:
+        since = db.get_last_order_event_id(user_id)
+    
+    hub = get_event_hub()
+    # Subscribe before querying so a change between the query and the wait is not missed
+    subscription = hub.subscribe(('orders', user_id))
+    try:
+        events = db.get_order_events(user_id, since)
+        if not events and timeout:
+            if await subscription.get(timeout) is not None:
+                events = db.get_order_events(user_id, since)
+    finally:
+        hub.unsubscribe(subscription)
+    
+    return {
+        "events": [order_event_message(event) for event in events],
+        "last_event_id": events[-1]['event_id'] if events else since,
+        "success": True
+    }
+
 @router.get("/api/orders/{order_id}")
 async def get_order_details(order_id: int, user_id: int = Depends(verify_token)):
     """Get order details"""
@@ -385,12 +715,23 @@ async def get_order_details(order_id: int, user_id: int = Depends(verify_token))
     return {"order": order, "success": True}
 
 # Chat Endpoints
-@router.get("/api/chat/messages")
-async def get_chat_messages(user_id: int = Depends(verify_token)):
-    """Get chat messages for user"""
-    messages = db.get_user_messages(user_id)
-    db.mark_messages_read(user_id)
-    return {"messages": messages, "success": True}
+@router.get("/api/chat/messages", response_model=ChatMessageListResponse)
+async def get_chat_messages(
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(default=CHAT_PAGE_DEFAULT_LIMIT, ge=1, le=CHAT_PAGE_MAX_LIMIT),
+    user_id: int = Depends(verify_token)
+):
+    """
+    Get chat messages for user (newest page by default)
+    Use before_id=<oldest id> to load older messages and after_id=<newest id> for new ones.
+    """
+    messages, has_more = db.get_user_messages_page(user_id, limit, before_id, after_id)
+    
+    # Older pages (before_id) never contain unseen messages
+    if messages and before_id is None:
+        db.mark_messages_read(user_id, up_to_id=messages[-1]['message_id'])
+    return {"messages": messages, "has_more": has_more, "success": True}
 
 @router.post("/api/chat/send", response_model=MessageResponse)
 async def send_chat_message(data: ChatMessageModel, user_id: int = Depends(verify_token)):
@@ -412,20 +753,99 @@ async def upload_chat_file(
     if file_size > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File too large")
     
-    # Save file
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # Save file (content-addressed, duplicates share one blob)
     file_extension = os.path.splitext(file.filename)[1]
-    file_name = f"chat_{user_id}_{datetime.now().timestamp()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    file_path = get_blob_store().put_file(file.file, file_extension)
     
     # Create message with file reference
-    db.create_message(user_id, f"[File: {file.filename}]", 'user')
+    db.create_message(user_id, f"[File: {file.filename}]", 'user', file_path=file_path)
     
     return {
         "message": "File uploaded",
         "file_path": file_path,
         "success": True
     }
+
+# WebSocket Endpoints
+# Browsers cannot set headers on a WebSocket handshake: the JWT travels as the
+# subprotocol after this one (new WebSocket(url, ['bearer', jwt])), which keeps
+# it out of URLs and access logs. ?token= is still accepted for older clients.
+WS_AUTH_SUBPROTOCOL = 'bearer'
+
+def websocket_credentials(websocket: WebSocket, token: Optional[str]) -> tuple:
+    """(JWT, subprotocol to accept with) of a WebSocket handshake"""
+    offered = websocket.scope.get('subprotocols') or []
+    if WS_AUTH_SUBPROTOCOL in offered:
+        index = offered.index(WS_AUTH_SUBPROTOCOL)
+        if index + 1 < len(offered):
+            return offered[index + 1], WS_AUTH_SUBPROTOCOL
+    return token, None
+
+async def stream_events(websocket: WebSocket, key: tuple, replay: Callable[[], List[dict]] = None):
+    """
+    Push hub events for key to websocket until the client disconnects
+    replay returns missed events to send first; events carrying an event_id
+    already replayed are not sent twice.
+    Incoming client frames are only used for liveness ({"type": "ping"} gets a pong).
+    """
+    hub = get_event_hub()
+    subscription = hub.subscribe(key)
+    
+    sent_up_to = 0
+    for event in (replay() if replay else []):
+        await websocket.send_json(event)
+        sent_up_to = max(sent_up_to, event.get('event_id', 0))
+    
+    async def pump():
+        while True:
+            event = await subscription.get()
+            if event.get('event_id', 0) and event['event_id'] <= sent_up_to:
+                continue
+            await websocket.send_json(event)
+    
+    sender = asyncio.create_task(pump())
+    try:
+        while True:
+            data = await websocket.receive_json()
+            if isinstance(data, dict) and data.get('type') == 'ping':
+                await websocket.send_json({'type': 'pong'})
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        sender.cancel()
+        hub.unsubscribe(subscription)
+        # Wait for the pump so a failed send is logged rather than lost with the task
+        for result in await asyncio.gather(sender, return_exceptions=True):
+            if isinstance(result, Exception) and not isinstance(result, WebSocketDisconnect):
+                logger.error(f"WebSocket push to {key} failed: {result!r}")
+
+@router.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, token: Optional[str] = None):
+    """Push new admin replies to the user's chat in real time (JWT as subprotocol, or ?token=<JWT>)"""
+    token, subprotocol = websocket_credentials(websocket, token)
+    try:
+        user = get_token_user(token or '')
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept(subprotocol=subprotocol)
+    await stream_events(websocket, ('chat', user['user_id']))
+
+@router.websocket("/ws/orders")
+async def orders_websocket(websocket: WebSocket, token: Optional[str] = None, since: Optional[int] = None):
+    """Push the user's order status changes in real time (JWT as subprotocol, or ?token=<JWT>; ?since=<last event id>)"""
+    token, subprotocol = websocket_credentials(websocket, token)
+    try:
+        user = get_token_user(token or '')
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    def replay():
+        if since is None:
+            return []
+        return [order_event_message(event) for event in db.get_order_events(user['user_id'], since)]
+    
+    await websocket.accept(subprotocol=subprotocol)
+    await stream_events(websocket, ('orders', user['user_id']), replay)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+API throughput vs. uvicorn worker count
+
+Starts `main.py --mode api --workers N` on a scratch database for each N,
+drives it with several load generator processes (keep-alive HTTP clients
+mixing a cached catalog page and a per-user cart read) and reports
+requests per second. Load generators share the machine with the server, so
+run it on a host with more cores than the largest worker count.
+
+Usage (from backend/):
+    python -m benchmarks.bench_api_workers --workers 1 2 4 --clients 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+import config
+
+# Server and load generators must share the JWT secret
+config.API_SECRET_KEY = secrets.token_urlsafe(32)
+
+import database as db
+from api.routes import create_access_token
+
+USERS = 200
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def populate(products: int):
+    """Fill scratch database with catalog, users and carts"""
+    rng = random.Random(42)
+    category_ids = [db.create_category(f"Kategoriya {i}", f"Категория {i}") for i in range(10)]
+    product_ids = [
+        db.create_product(
+            category_id=rng.choice(category_ids), name_uz=f"Mahsulot {i}", name_ru=f"Товар {i}",
+            description_uz="Mahsulot tavsifi", description_ru="Описание товара",
+            price=rng.randint(5, 500) * 1000, stock_quantity=rng.randint(1, 100)
+        )
+        for i in range(products)
+    ]
+    for user_id in range(1, USERS + 1):
+        db.create_user(user_id, phone=f"+99890{user_id:07d}")
+        for product_id in rng.sample(product_ids, 3):
+            db.add_to_cart(user_id, product_id, rng.randint(1, 3))
+
+
+def wait_for_server(base_url: str):
+    for _ in range(200):
+        try:
+            httpx.get(f'{base_url}/health')
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError('API server did not start')
+
+
+async def generate_load(base_url: str, concurrency: int, deadline: float, seed: int) -> int:
+    """Issue requests until deadline, returns number of successful responses"""
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        async def worker() -> int:
+            done = 0
+            while time.perf_counter() < deadline:
+                headers = {'Authorization': f'Bearer {create_access_token(rng.randint(1, USERS))}'}
+                path = '/api/cart' if rng.random() < 0.5 else '/api/products?limit=20'
+                response = await client.get(path, headers=headers)
+                if response.status_code == 200:
+                    done += 1
+            return done
+
+        return sum(await asyncio.gather(*[worker() for _ in range(concurrency)]))
+
+
+def client_process(base_url: str, concurrency: int, deadline: float, seed: int, results):
+    results.put(asyncio.run(generate_load(base_url, concurrency, deadline, seed)))
+
+
+def measure(workdir: str, workers: int, args) -> float:
+    """Run the API with the given worker count and return requests per second"""
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'main.py'), '--mode', 'api',
+         '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, 'API_SECRET_KEY': config.API_SECRET_KEY, 'PYTHONPATH': BACKEND_DIR}
+    )
+    try:
+        wait_for_server(base_url)
+        time.sleep(1)  # let every worker finish startup
+
+        results = multiprocessing.Queue()
+        deadline = time.perf_counter() + args.duration
+        clients = [
+            multiprocessing.Process(target=client_process,
+                                    args=(base_url, args.concurrency, deadline, seed, results))
+            for seed in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        total = sum(results.get() for _ in clients)
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return total / args.duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=4, help="load generator processes")
+    parser.add_argument('--concurrency', type=int, default=16, help="connections per load generator")
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--products', type=int, default=2000)
+    args = parser.parse_args()
+
+    # main.py resolves the database and uploads relative to its working directory
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    db.DB_NAME = os.path.join(workdir, config.DB_NAME)
+    db.init_db()
+    populate(args.products)
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} load generators x {args.concurrency} connections, "
+          f"{args.duration:.0f}s per run")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        rate = measure(workdir, workers, args)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Bot handler latency and cost per update
+
+Feeds synthetic updates through the real Dispatcher (setup_handlers() with
+the production SQLiteStorage) on a scratch database, without a live bot.
+Virtual users run scripted sessions:
+    browse    catalog, category, product, add to cart, cart
+    checkout  add to cart and the whole order FSM up to confirmation
+    admin     /admin, order list, order details, confirm order
+Bot API calls go to a local fake session (benchmarks.fake_telegram) that
+answers after --api-latency seconds and can answer a share of calls with
+RetryAfter (--retry-after-rate) to show how handlers cope with rate limits.
+
+Reports updates/sec and, per handler, p50/p99 latency, SQL statements and
+Bot API calls per update and failed updates.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bot_handlers --sessions 300 --concurrency 16 --api-latency 0.03
+"""
+import argparse
+import asyncio
+import contextvars
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher
+
+import database as db
+from config import SUPER_ADMIN_ID
+from bot.fsm_storage import SQLiteStorage
+from bot.handlers import setup_handlers
+from benchmarks.fake_telegram import FakeSession, message_update, callback_update
+
+DEFAULT_WEIGHTS = {'browse': 60, 'checkout': 30, 'admin': 10}
+
+
+class UpdateStats:
+    """Cost of handling one update"""
+    __slots__ = ('handler', 'handler_ms', 'queries', 'api_calls', 'done')
+
+    def __init__(self):
+        self.handler = '(unhandled)'
+        self.handler_ms = 0.0
+        self.queries = 0
+        self.api_calls = 0
+        self.done = False
+
+
+# Stats of the update being handled in the current task
+current = contextvars.ContextVar('update_stats', default=None)
+
+
+def count_query(statement: str):
+    stats = current.get()
+    # Background tasks started while handling an update (FSM flusher) inherit its context
+    if stats is not None and not stats.done and not statement.lstrip().upper().startswith(('BEGIN', 'COMMIT')):
+        stats.queries += 1
+
+
+def count_api_call(method: str):
+    stats = current.get()
+    if stats is not None and not stats.done:
+        stats.api_calls += 1
+
+
+def instrument_database():
+    get_connection = db.get_connection
+
+    def traced():
+        conn = get_connection()
+        conn.set_trace_callback(count_query)
+        return conn
+
+    db.get_connection = traced
+
+
+async def time_handler(handler, event, data):
+    """Inner middleware: name and time the handler that matched"""
+    stats = current.get()
+    if stats is None:
+        return await handler(event, data)
+    callback = data['handler'].callback
+    stats.handler = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+    start = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        stats.handler_ms = (time.perf_counter() - start) * 1000
+
+
+def populate(users: int, products: int) -> dict:
+    """Catalog, neighborhoods, customers and pending orders for the admin to handle"""
+    rng = random.Random(42)
+    category_ids = [db.create_category(f"Kategoriya {i}", f"Категория {i}") for i in range(10)]
+    product_ids = [
+        db.create_product(category_id=rng.choice(category_ids), name_uz=f"Mahsulot {i}", name_ru=f"Товар {i}",
+                          price=rng.randint(5, 500) * 1000, stock_quantity=1_000_000)
+        for i in range(products)
+    ]
+    neighborhood_ids = [db.create_neighborhood(f"Mahalla {i}", f"Махалля {i}", 10000) for i in range(5)]
+    for user_id in range(1, users + 1):
+        db.create_user(user_id, first_name=f"User {user_id}", phone=f"+99890{user_id:07d}", language='uz')
+    db.create_user(SUPER_ADMIN_ID, first_name='Admin', language='uz')
+    order_ids = [
+        db.create_order(rng.randint(1, users), 'Ali Valiyev', '+998901234567', 'Toshkent', 50000)
+        for _ in range(200)
+    ]
+    return {'categories': category_ids, 'products': product_ids,
+            'neighborhoods': neighborhood_ids, 'orders': order_ids}
+
+
+def browse(rng: random.Random, ids: dict) -> list:
+    product_id = rng.choice(ids['products'])
+    return [('message', '🛍 Katalog'), ('callback', f"cat_{rng.choice(ids['categories'])}"),
+            ('callback', f"prod_{product_id}"), ('callback', f"add_cart_{product_id}"),
+            ('message', '🛒 Savatcha')]
+
+
+def checkout(rng: random.Random, ids: dict) -> list:
+    return [('callback', f"add_cart_{rng.choice(ids['products'])}"), ('callback', 'checkout'),
+            ('message', 'Ali Valiyev'), ('message', '+998901234567'),
+            ('callback', f"neigh_{rng.choice(ids['neighborhoods'])}"), ('message', 'Toshkent, Chilonzor 1'),
+            ('callback', 'payment_cash'), ('message', 'Eshik oldida'), ('callback', 'confirm_order')]
+
+
+def admin(rng: random.Random, ids: dict) -> list:
+    order_id = rng.choice(ids['orders'])
+    return [('message', '/admin'), ('message', '🛍 Buyurtmalar'),
+            ('callback', f"order_{order_id}"), ('callback', f"ord_confirm_{order_id}")]
+
+
+SCRIPTS = {'browse': browse, 'checkout': checkout, 'admin': admin}
+
+
+async def run(args, ids: dict) -> dict:
+    """Play all sessions, returns per-update stats and session counters"""
+    session = FakeSession(args.api_latency, args.retry_after_rate, on_call=count_api_call)
+    bot = Bot('123456:BENCH', session=session)
+    storage = SQLiteStorage()
+    dp = Dispatcher(storage=storage)
+    dp.message.middleware(time_handler)
+    dp.callback_query.middleware(time_handler)
+    dp.include_router(setup_handlers())
+
+    rng = random.Random(args.seed)
+    names, weights = list(args.weights), list(args.weights.values())
+    sessions = [rng.choices(names, weights)[0] for _ in range(args.sessions)]
+    update_ids = iter(range(1, 10**9))
+    results, failures = [], Counter()
+
+    async def feed(user_id: int, kind: str, payload: str):
+        update_id = next(update_ids)
+        update = (message_update if kind == 'message' else callback_update)(update_id, user_id, payload)
+        stats = UpdateStats()
+        token = current.set(stats)
+        start = time.perf_counter()
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            failures[(stats.handler, type(e).__name__)] += 1
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            stats.done = True
+            current.reset(token)
+        results.append((stats, elapsed))
+
+    async def virtual_user(worker: int):
+        # Each worker owns its users, so one user's updates arrive in order as from Telegram
+        for index in range(worker, len(sessions), args.concurrency):
+            name = sessions[index]
+            user_id = SUPER_ADMIN_ID if name == 'admin' else 1 + index % args.users
+            for kind, payload in SCRIPTS[name](rng, ids):
+                await feed(user_id, kind, payload)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[virtual_user(worker) for worker in range(min(args.concurrency, len(sessions)))])
+    elapsed = time.perf_counter() - start
+    await storage.close()
+    return {'results': results, 'failures': failures, 'elapsed': elapsed, 'session': session,
+            'sessions': Counter(sessions)}
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(run_result: dict):
+    results = run_result['results']
+    latencies = sorted(elapsed for _, elapsed in results)
+    session = run_result['session']
+    print(f"{len(results)} updates in {run_result['elapsed']:.1f}s: {len(results) / run_result['elapsed']:.0f} updates/s, "
+          f"p50 {statistics.median(latencies):.1f} ms, p99 {percentile(latencies, 0.99):.1f} ms "
+          f"(sessions: {dict(run_result['sessions'])})")
+    print(f"Bot API: {session.calls} calls, {session.rate_limited} answered with RetryAfter")
+
+    by_handler = defaultdict(list)
+    for stats, _ in results:
+        by_handler[stats.handler].append(stats)
+    failed = Counter()
+    for (handler, _), count in run_result['failures'].items():
+        failed[handler] += count
+
+    print(f"\n{'handler':<34} {'updates':>8} {'p50 ms':>8} {'p99 ms':>8} {'SQL/upd':>8} {'API/upd':>8} {'failed':>7}")
+    for handler, rows in sorted(by_handler.items()):
+        times = sorted(stats.handler_ms for stats in rows)
+        print(f"{handler:<34} {len(rows):>8} {statistics.median(times):>8.2f} {percentile(times, 0.99):>8.2f} "
+              f"{statistics.mean(stats.queries for stats in rows):>8.1f} "
+              f"{statistics.mean(stats.api_calls for stats in rows):>8.1f} {failed[handler]:>7}")
+
+    print(f"\n{'Bot API method':<34} {'calls':>8}")
+    for method, count in session.methods.most_common():
+        print(f"{method:<34} {count:>8}")
+    if run_result['failures']:
+        print(f"\n{'failed handler':<34} {'error':<24} {'count':>6}")
+        for (handler, error), count in run_result['failures'].most_common():
+            print(f"{handler:<34} {error:<24} {count:>6}")
+
+
+def parse_weights(values: list) -> dict:
+    weights = dict(DEFAULT_WEIGHTS)
+    for value in values or []:
+        name, _, weight = value.partition('=')
+        if name not in SCRIPTS or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"expected script=weight with script in {list(SCRIPTS)}")
+        weights[name] = int(weight)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sessions', type=int, default=300, help="scripted sessions to play")
+    parser.add_argument('--concurrency', type=int, default=16, help="sessions played at the same time")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--api-latency', type=float, default=0.03, help="seconds per fake Bot API call")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0,
+                        help="share of Bot API calls answered with RetryAfter")
+    parser.add_argument('--weights', nargs='*', metavar='SCRIPT=WEIGHT',
+                        help=f"session mix (default {' '.join(f'{k}={v}' for k, v in DEFAULT_WEIGHTS.items())})")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    try:
+        args.weights = parse_weights(args.weights)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    db.DB_NAME = os.path.join(workdir, 'bench.db')
+    db.init_db()
+    ids = populate(args.users, args.products)
+    instrument_database()
+
+    report(asyncio.run(run(args, ids)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for database.py functions
+
+Runs every public function of database.py against synthetic datasets of
+several sizes (benchmarks.dataset at each --scales factor) and reports, per
+call: median time, SQL statements issued and rows materialized (rows fetched
+through the connection's row factory). Connections opened by get_connection
+are instrumented; the long-lived monitor connection is not.
+
+From the smallest to the largest dataset the growth exponent of time, queries
+and rows is estimated (log-log slope; 0 = constant, 1 = linear in table
+size). Functions with an exponent of LINEAR_SLOPE or more are flagged
+"linear". Public functions without a benchmark case are listed so new ones
+get one.
+
+--json writes stable, sorted JSON for committing next to a change; --baseline
+compares a run with such a file and exits with status 1 when a function
+issues more queries, materializes more rows, becomes linear or gets slower
+than --tolerance percent.
+
+Usage (from backend/):
+    python -m benchmarks.bench_database --scales 0.001 0.01 0.1 --json db_bench.json
+    python -m benchmarks.bench_database --baseline db_bench.json --functions get_cart_items get_all_orders
+"""
+import argparse
+import inspect
+import itertools
+import json
+import math
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+from benchmarks.dataset import SIZES, generate
+
+LINEAR_SLOPE = 0.8
+# Infrastructure, not per-request work
+NOT_BENCHMARKED = {'get_connection', 'init_db'}
+
+
+class Counters:
+    """Statements and rows seen by instrumented connections"""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def trace(self, statement: str):
+        if not statement.lstrip().upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK')):
+            self.queries += 1
+
+    def row_factory(self, cursor, row):
+        self.rows += 1
+        return sqlite3.Row(cursor, row)
+
+
+def instrument(counters: Counters):
+    """Make db.get_connection return connections that report to counters"""
+    get_connection = db.get_connection
+
+    def instrumented():
+        conn = get_connection()
+        conn.set_trace_callback(counters.trace)
+        conn.row_factory = counters.row_factory
+        return conn
+
+    db.get_connection = instrumented
+    return get_connection
+
+
+class Fixture:
+    """
+    Ids of existing rows used as arguments, plus counters for rows benchmarks create
+    Destructive cases get rows of their own, so the cases after them still
+    hit the dataset's first category, product and cart.
+    """
+
+    def __init__(self, users: int):
+        # Dataset users 1..users/5 have chats and every tenth user an open cart
+        self.user_id = 1
+        self.phone = '+998900000001'
+        self.product_id = 1
+        self.category_id = 1
+        self.order_id = 1
+        self.neighborhood_id = 1
+        self.message_id = 1
+        self.admin_id = 1
+        self.new_ids = itertools.count(users + 1)
+
+        db.create_verification_code(self.phone, '123456')
+        db.create_session('bench-session', self.user_id)
+        db.add_to_favorites(self.user_id, self.product_id)
+        db.register_blob('uploads/bench.jpg', 'ab' * 32, 1024)
+        db.save_fsm_states([('bench', 'OrderStates:waiting_for_address', '{}', time.time())], [])
+        db.claim_idempotency_key(b'bench', b'fingerprint', 60)
+        db.create_admin(self.admin_id, 'bench')
+        self.cart_id = db.get_cart_items(self.user_id)[0]['cart_id']
+
+        # Soft-deleted over and over by delete_category/delete_product
+        self.doomed_category_id = db.create_category('Bench doomed', 'Бенч удаляемая')
+        self.doomed_product_id = db.create_product(self.doomed_category_id, 'Bench doomed', 'Бенч удаляемый', 10000)
+        # Stock taken by commit_stock/place_order (place_order also clears the buyer's cart)
+        self.stock_product_id = db.create_product(self.category_id, 'Bench stock', 'Бенч склад', 10000,
+                                                  stock_quantity=10 ** 9)
+        self.buyer_id = self.new_id()
+        db.create_user(self.buyer_id, first_name='Bench buyer')
+
+        db.save_userbot_settings(12345, 'hash', '+998900000011', 'bench-session')
+        db.save_userbot_settings(12345, 'hash', '+998900000012', 'bench-session')
+        self.userbot_account_id, self.spare_userbot_account_id = [
+            row['id'] for row in db.get_all_userbot_settings()[-2:]
+        ]
+        db.save_userbot_peers(self.userbot_account_id, [(self.phone, 900000001, 1)])
+
+    def new_id(self) -> int:
+        return next(self.new_ids)
+
+
+def cases(f: Fixture) -> dict:
+    """Function name -> zero-argument call"""
+    return {
+        'get_data_version': lambda: db.get_data_version(),
+        'get_catalog_version': lambda: db.get_catalog_version(),
+        'get_catalog_changes': lambda: db.get_catalog_changes(0),
+        'create_user': lambda: db.create_user(f.new_id(), first_name='Bench'),
+        'get_user': lambda: db.get_user(f.user_id),
+        'update_user': lambda: db.update_user(f.user_id, language='uz'),
+        'get_user_by_phone': lambda: db.get_user_by_phone(f.phone),
+        'get_all_users': lambda: db.get_all_users(),
+        'create_category': lambda: db.create_category('Bench', 'Бенч'),
+        'get_category': lambda: db.get_category(f.category_id),
+        'get_all_categories': lambda: db.get_all_categories(),
+        'update_category': lambda: db.update_category(f.category_id, name_uz='Kategoriya 1'),
+        'delete_category': lambda: db.delete_category(f.doomed_category_id),
+        'create_product': lambda: db.create_product(f.category_id, 'Bench', 'Бенч', 10000, stock_quantity=10),
+        'get_product': lambda: db.get_product(f.product_id),
+        'get_products_by_ids': lambda: db.get_products_by_ids(list(range(1, 21))),
+        'get_products_by_category': lambda: db.get_products_by_category(f.category_id),
+        'get_all_products': lambda: db.get_all_products(),
+        'update_product': lambda: db.update_product(f.product_id, stock_quantity=1_000_000),
+        'delete_product': lambda: db.delete_product(f.doomed_product_id),
+        'search_products': lambda: db.search_products('olma'),
+        'add_to_cart': lambda: db.add_to_cart(f.user_id, f.product_id),
+        'get_cart_items': lambda: db.get_cart_items(f.user_id),
+        'validate_cart': lambda: db.validate_cart(f.user_id),
+        'update_cart_quantity': lambda: db.update_cart_quantity(f.cart_id, 2),
+        'remove_from_cart': lambda: db.remove_from_cart(0),
+        'clear_cart': lambda: db.clear_cart(f.new_id()),
+        'get_available_stock': lambda: db.get_available_stock(f.product_id),
+        'reserve_stock': lambda: db.reserve_stock(f.user_id, [(f.product_id, 1), (2, 1)], 60),
+        'release_stock': lambda: db.release_stock(f.user_id),
+        'commit_stock': lambda: db.commit_stock(f.user_id, [(f.stock_product_id, 1)]),
+        'release_expired_reservations': lambda: db.release_expired_reservations(),
+        'create_neighborhood': lambda: db.create_neighborhood('Bench', 'Бенч'),
+        'get_neighborhood': lambda: db.get_neighborhood(f.neighborhood_id),
+        'get_all_neighborhoods': lambda: db.get_all_neighborhoods(),
+        'update_neighborhood': lambda: db.update_neighborhood(f.neighborhood_id, delivery_price=10000),
+        'create_order': lambda: db.create_order(f.user_id, 'Bench', f.phone, 'Toshkent', 10000),
+        'add_order_item': lambda: db.add_order_item(f.order_id, f.product_id, 1, 10000),
+        'place_order': lambda: db.place_order(f.buyer_id, [(f.stock_product_id, 1, 10000), (f.product_id, 1, 10000)],
+                                              'Bench', f.phone, 'Toshkent', 20000),
+        'refresh_product_popularity': lambda: db.refresh_product_popularity(),
+        'get_order': lambda: db.get_order(f.order_id),
+        'get_order_items': lambda: db.get_order_items(f.order_id),
+        'get_user_orders': lambda: db.get_user_orders(f.user_id),
+        'get_all_orders': lambda: db.get_all_orders('pending'),
+        'update_order_status': lambda: db.update_order_status(f.order_id, 'confirmed'),
+        'change_order_status': lambda: db.change_order_status(f.order_id, 'confirmed'),
+        'get_order_events': lambda: db.get_order_events(f.user_id),
+        'get_last_order_event_id': lambda: db.get_last_order_event_id(f.user_id),
+        'get_order_events_after': lambda: db.get_order_events_after(0),
+        'create_admin': lambda: db.create_admin(f.new_id()),
+        'get_admin': lambda: db.get_admin(f.admin_id),
+        'get_all_admins': lambda: db.get_all_admins(),
+        'is_admin': lambda: db.is_admin(f.admin_id),
+        'is_super_admin': lambda: db.is_super_admin(f.admin_id),
+        'remove_admin': lambda: db.remove_admin(0),
+        'create_verification_code': lambda: db.create_verification_code(f.phone, '654321'),
+        'verify_code': lambda: db.verify_code(f.phone, '000000'),
+        'create_message': lambda: db.create_message(f.user_id, 'Bench', 'user'),
+        'get_message': lambda: db.get_message(f.message_id),
+        'get_last_message_id': lambda: db.get_last_message_id(),
+        'get_messages_after': lambda: db.get_messages_after(db.get_last_message_id() - 100, 'user'),
+        'get_user_messages': lambda: db.get_user_messages(f.user_id),
+        'get_user_messages_page': lambda: db.get_user_messages_page(f.user_id, 50),
+        'mark_messages_read': lambda: db.mark_messages_read(f.user_id, f.admin_id),
+        'get_conversation': lambda: db.get_conversation(f.user_id),
+        'get_unread_conversations': lambda: db.get_unread_conversations(),
+        'add_to_favorites': lambda: db.add_to_favorites(f.user_id, 2),
+        'remove_from_favorites': lambda: db.remove_from_favorites(f.user_id, 2),
+        'get_user_favorites': lambda: db.get_user_favorites(f.user_id),
+        'get_user_favorite_ids': lambda: db.get_user_favorite_ids(f.user_id),
+        'is_favorite': lambda: db.is_favorite(f.user_id, f.product_id),
+        'create_session': lambda: db.create_session(f'bench-{f.new_id()}', f.user_id),
+        'get_session': lambda: db.get_session('bench-session'),
+        'delete_session': lambda: db.delete_session('missing'),
+        'save_userbot_settings': lambda: db.save_userbot_settings(12345, 'hash', f.phone),
+        'get_userbot_settings': lambda: db.get_userbot_settings(),
+        'get_all_userbot_settings': lambda: db.get_all_userbot_settings(),
+        'deactivate_userbot_account': lambda: db.deactivate_userbot_account(f.spare_userbot_account_id),
+        'get_userbot_peer': lambda: db.get_userbot_peer(f.userbot_account_id, f.phone),
+        'save_userbot_peers': lambda: db.save_userbot_peers(
+            f.userbot_account_id, [(f'+998{f.new_id():09d}', f.new_id(), 1) for _ in range(10)]
+        ),
+        'delete_userbot_peer': lambda: db.delete_userbot_peer(f.userbot_account_id, 'missing'),
+        'register_blob': lambda: db.register_blob(f'uploads/{f.new_id()}.jpg', 'cd' * 32, 1024),
+        'get_blob': lambda: db.get_blob('uploads/bench.jpg'),
+        'refresh_blob_refcounts': lambda: db.refresh_blob_refcounts(),
+        'get_orphan_blobs': lambda: db.get_orphan_blobs(),
+        'delete_blob': lambda: db.delete_blob('uploads/missing.jpg'),
+        'get_referenced_upload_paths': lambda: db.get_referenced_upload_paths(),
+        'get_fsm_state': lambda: db.get_fsm_state('bench'),
+        'save_fsm_states': lambda: db.save_fsm_states([('bench', None, '{"step":1}', time.time())], []),
+        'delete_expired_fsm_states': lambda: db.delete_expired_fsm_states(0),
+        'claim_idempotency_key': lambda: db.claim_idempotency_key(b'bench', b'fingerprint', 60),
+        'get_idempotency_key': lambda: db.get_idempotency_key(b'bench'),
+        'complete_idempotency_key': lambda: db.complete_idempotency_key(b'bench', 200, 'application/json', b'{}', 60),
+        'release_idempotency_key': lambda: db.release_idempotency_key(b'missing'),
+        'delete_expired_idempotency_keys': lambda: db.delete_expired_idempotency_keys(),
+        'acquire_lease': lambda: db.acquire_lease('bench', 'bench', 60),
+        'release_lease': lambda: db.release_lease('missing', 'bench'),
+        'get_statistics': lambda: db.get_statistics(),
+    }
+
+
+def public_functions() -> set:
+    return {name for name, fn in inspect.getmembers(db, inspect.isfunction)
+            if fn.__module__ == db.__name__ and not name.startswith('_')}
+
+
+def measure(call, counters: Counters, min_time: float, max_calls: int) -> dict:
+    """Median time per call and counters of one call"""
+    call()  # warm-up (page cache, catalog state)
+    counters.queries = counters.rows = 0
+    call()
+    queries, rows = counters.queries, counters.rows
+
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < 3 or (time.perf_counter() < deadline and len(timings) < max_calls):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return {'us_per_call': round(statistics.median(timings) * 1e6, 1), 'queries': queries, 'rows': rows}
+
+
+def slope(values: list, scales: list) -> float:
+    """Log-log growth exponent between smallest and largest dataset"""
+    first, last = max(values[0], 1e-9), max(values[-1], 1e-9)
+    return round(math.log(last / first) / math.log(scales[-1] / scales[0]), 2)
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    counters = Counters()
+    results, datasets, benchmarked = {}, {}, set()
+    try:
+        for scale in args.scales:
+            sizes = {name: max(1, int(count * scale)) for name, count in SIZES.items()}
+            path = os.path.join(workdir, f'bench_{scale}.db')
+            datasets[str(scale)] = generate(path, seed=args.seed, **sizes)
+            fixture = Fixture(sizes['users'])
+            calls = cases(fixture)
+            benchmarked.update(calls)
+            original = instrument(counters)
+            try:
+                for name, call in calls.items():
+                    if args.functions and name not in args.functions:
+                        continue
+                    results.setdefault(name, {})[str(scale)] = measure(call, counters, args.min_time, args.max_calls)
+                    print(f"  {scale:<8} {name:<32} {results[name][str(scale)]['us_per_call']:>10.1f} us",
+                          file=sys.stderr)
+            finally:
+                db.get_connection = original
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    functions = {}
+    for name, by_scale in results.items():
+        series = [by_scale[str(scale)] for scale in args.scales]
+        entry = {'results': by_scale}
+        if len(args.scales) > 1:
+            entry['slope'] = {metric: slope([row[metric] for row in series], args.scales)
+                              for metric in ('us_per_call', 'queries', 'rows')}
+            entry['growth'] = 'linear' if max(entry['slope'].values()) >= LINEAR_SLOPE else 'sublinear'
+        functions[name] = entry
+
+    return {
+        'scales': args.scales,
+        'datasets': datasets,
+        'functions': functions,
+        'not_benchmarked': sorted(public_functions() - benchmarked - NOT_BENCHMARKED),
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of report against baseline"""
+    regressions = []
+    for name, entry in report['functions'].items():
+        previous = baseline['functions'].get(name)
+        if previous is None:
+            continue
+        if entry.get('growth') == 'linear' and previous.get('growth') != 'linear':
+            regressions.append(f"{name}: now grows linearly with table size")
+        for scale, row in entry['results'].items():
+            before = previous['results'].get(scale)
+            if before is None:
+                continue
+            for metric in ('queries', 'rows'):
+                if row[metric] > before[metric]:
+                    regressions.append(f"{name} @ {scale}: {metric} {before[metric]} -> {row[metric]}")
+            if row['us_per_call'] > before['us_per_call'] * (1 + tolerance / 100):
+                regressions.append(f"{name} @ {scale}: {before['us_per_call']} -> {row['us_per_call']} us/call")
+    return regressions
+
+
+def print_table(report: dict):
+    scales = report['scales']
+    header = f"{'function':<32}" + ''.join(f" {'us @ ' + str(scale):>14}" for scale in scales)
+    print(header + f" {'queries':>8} {'rows':>10}  growth")
+    for name, entry in sorted(report['functions'].items()):
+        largest = entry['results'][str(scales[-1])]
+        times = ''.join(f" {entry['results'][str(scale)]['us_per_call']:>14.1f}" for scale in scales)
+        flag = entry.get('growth', '')
+        print(f"{name:<32}{times} {largest['queries']:>8} {largest['rows']:>10}  "
+              f"{'LINEAR' if flag == 'linear' else flag}")
+    if report['not_benchmarked']:
+        print(f"Not benchmarked: {', '.join(report['not_benchmarked'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.001, 0.01, 0.1],
+                        help="dataset sizes as fractions of the benchmarks.dataset defaults")
+    parser.add_argument('--functions', nargs='*', help="only these functions")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds spent timing each function")
+    parser.add_argument('--max-calls', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', metavar='FILE', help="write results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare with JSON written earlier")
+    parser.add_argument('--tolerance', type=float, default=50, help="allowed slowdown in percent")
+    args = parser.parse_args()
+    args.scales = sorted(args.scales)
+
+    report = run(args)
+    print_table(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Log-heavy handlers: synchronous handlers vs the queued logging pipeline
+
+Runs concurrent async "handlers" that log like NotificationService and
+UserbotClient do (several f-string INFO lines per update), first with the
+old setup (basicConfig-style StreamHandler + FileHandler writing on the
+caller's thread), then with logging_setup.setup_logging() (QueueHandler,
+listener thread, rotating JSON file). --disk-latency adds a sleep to every
+file write to model a slow or contended disk; that is where the old setup
+stalls the event loop.
+
+Reports updates/sec, per-update p50/p99 latency, event loop lag (how late a
+1 ms ticker wakes up) and, for the queued pipeline, the time to drain the
+queue at shutdown and records dropped because the queue was full.
+
+Usage (from backend/):
+    python -m benchmarks.bench_logging --updates 5000 --concurrency 32 --disk-latency 0.0005
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_setup
+from logging_setup import TEXT_FORMAT, setup_logging, shutdown_logging, update_id
+
+logger = logging.getLogger('benchmarks.handler')
+
+
+def slow_down(handler: logging.Handler, latency: float):
+    """Make every write of handler take latency seconds longer"""
+    if not latency:
+        return
+    emit = handler.emit
+
+    def slow_emit(record):
+        time.sleep(latency)
+        emit(record)
+
+    handler.emit = slow_emit
+
+
+def setup_sync(log_file: str, devnull, latency: float) -> list:
+    """The previous main.py setup: handlers called on the logging thread itself"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    file_handler = logging.FileHandler(log_file)
+    slow_down(file_handler, latency)
+    handlers = [logging.StreamHandler(devnull), file_handler]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    return handlers
+
+
+def setup_queued(log_file: str, devnull, latency: float):
+    listener = setup_logging(log_file, 'INFO', 'text')
+    for handler in listener.handlers:
+        if isinstance(handler, logging.FileHandler):
+            slow_down(handler, latency)
+        else:
+            handler.setStream(devnull)
+    return listener
+
+
+async def handle_update(number: int, lines: int) -> float:
+    """One update's worth of logging around a little async work"""
+    start = time.perf_counter()
+    token = update_id.set(number)
+    try:
+        user_id = 100000 + number % 5000
+        for line in range(lines):
+            logger.info(f"Sending notification {line} to user {user_id}: order #{number} status confirmed")
+            await asyncio.sleep(0)
+    finally:
+        update_id.reset(token)
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(updates: int, concurrency: int, lines: int) -> dict:
+    latencies, lags = [], []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append((time.perf_counter() - expected) * 1000)
+
+    async def worker(offset: int):
+        for number in range(offset, updates, concurrency):
+            latencies.append(await handle_update(number, lines))
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(offset) for offset in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return {'elapsed': elapsed, 'latencies': sorted(latencies), 'lags': sorted(lags)}
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(name: str, result: dict, updates: int, extra: str = ''):
+    latencies, lags = result['latencies'], result['lags']
+    print(f"{name:<8} {updates / result['elapsed']:>10.0f} {statistics.median(latencies):>9.2f} "
+          f"{percentile(latencies, 0.99):>9.2f} {percentile(lags, 0.99):>9.2f} {lags[-1]:>9.2f}  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32, help="updates handled at the same time")
+    parser.add_argument('--lines', type=int, default=5, help="log lines per update")
+    parser.add_argument('--disk-latency', type=float, default=0.0005, help="extra seconds per file write")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    devnull = open(os.devnull, 'w')
+    print(f"{args.updates} updates x {args.lines} log lines, concurrency {args.concurrency}, "
+          f"{args.disk_latency * 1000:.2f} ms per file write\n")
+    print(f"{'setup':<8} {'updates/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'lag p99':>9} {'lag max':>9}")
+
+    handlers = setup_sync(os.path.join(workdir, 'sync.log'), devnull, args.disk_latency)
+    result = asyncio.run(run(args.updates, args.concurrency, args.lines))
+    for handler in handlers:
+        logging.getLogger().removeHandler(handler)
+        handler.close()
+    report('sync', result, args.updates)
+
+    setup_queued(os.path.join(workdir, 'queued.log'), devnull, args.disk_latency)
+    result = asyncio.run(run(args.updates, args.concurrency, args.lines))
+    start = time.perf_counter()
+    shutdown_logging()
+    drain = time.perf_counter() - start
+    dropped = logging_setup.dropped_records.value()
+    report('queued', result, args.updates, f"(drained in {drain:.2f}s after the run, {dropped:.0f} records dropped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Product filter/sort benchmark
+
+Compares listing queries that compute the effective price on the fly
+(SELECT *, COALESCE/SUM subquery in WHERE/ORDER BY, no usable index) with ProductQuery,
+which filters and sorts on the stored effective_price/sold_count columns
+through the composite indexes. Reports p50/p99 latency per query.
+
+Usage (from backend/):
+    python -m benchmarks.bench_product_filters --products 100000 --requests 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+PRICE = 'COALESCE(NULLIF(discount_price, 0), price)'
+SOLD = '(SELECT COALESCE(SUM(quantity), 0) FROM order_items oi WHERE oi.product_id = products.product_id)'
+
+
+def populate(products: int, categories: int):
+    """Bulk insert synthetic catalog"""
+    rng = random.Random(42)
+    category_ids = [db.create_category(f"Kategoriya {i}", f"Категория {i}") for i in range(categories)]
+    rows = []
+    for i in range(products):
+        price = rng.randint(5, 500) * 1000
+        rows.append((
+            rng.choice(category_ids), f"Mahsulot {i}", f"Товар {i}",
+            "Mahsulot tavsifi. " * rng.randint(5, 20), "Описание товара. " * rng.randint(5, 20),
+            price, rng.choice([None, None, None, price * 0.8]), rng.choice([0, rng.randint(1, 100)]),
+            rng.randint(0, 500), f"2024-01-01 00:00:{i % 60:02d}"
+        ))
+    conn = db.get_connection()
+    conn.executemany('''
+        INSERT INTO products (category_id, name_uz, name_ru, description_uz, description_ru,
+                              price, discount_price, stock_quantity, sold_count, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    return category_ids
+
+
+def baseline(where: str, params: tuple, order: str, limit: int = 20):
+    """Query as it would be written without the stored column"""
+    conn = db.get_connection()
+    rows = conn.execute(
+        f'SELECT * FROM products WHERE is_active = 1 {where} ORDER BY {order} LIMIT ?',
+        params + (limit,)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def measure(fn, requests: int) -> dict:
+    """Run fn repeatedly and collect latency"""
+    fn()  # warm-up
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings),
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    db.DB_NAME = os.path.join(workdir, 'bench.db')
+    db.init_db()
+    category_id = populate(args.products, args.categories)[0]
+    columns = ['product_id', 'name_uz', 'price', 'discount_price', 'image_path']
+
+    cases = [
+        ('price_asc',
+         lambda: baseline('', (), f'{PRICE} ASC, product_id ASC'),
+         lambda: db.ProductQuery().sort('price_asc').fetch(columns, limit=20)),
+        ('popular',
+         lambda: baseline('', (), f'{SOLD} DESC, product_id DESC'),
+         lambda: db.ProductQuery().sort('popular').fetch(columns, limit=20)),
+        ('price range',
+         lambda: baseline(f'AND {PRICE} BETWEEN ? AND ?', (100000, 120000), f'{PRICE} ASC, product_id ASC'),
+         lambda: db.ProductQuery().price_range(100000, 120000).sort('price_asc').fetch(columns, limit=20)),
+        ('cat+stock+sale',
+         lambda: baseline(f'AND category_id = ? AND stock_quantity > 0 AND {PRICE} < price',
+                          (category_id,), f'{PRICE} DESC, product_id DESC'),
+         lambda: db.ProductQuery().category(category_id).in_stock().on_sale()
+                   .sort('price_desc').fetch(columns, limit=20)),
+        ('newest',
+         lambda: baseline('', (), 'created_at DESC, product_id DESC'),
+         lambda: db.ProductQuery().fetch(columns, limit=20)),
+    ]
+
+    print(f"{args.products} products, {args.requests} requests per case, page size 20")
+    print(f"{'query':<16} {'variant':<8} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, before, after in cases:
+        for label, fn in (('before', before), ('after', after)):
+            result = measure(fn, args.requests)
+            print(f"{name:<16} {label:<8} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for list endpoints
+
+Compares the old response path (FastAPI default JSONResponse through
+jsonable_encoder, no compression) with the current one (ORJSONResponse,
+typed response models, Brotli/GZip compression) on the admin product and
+order listings. Reports wire payload size and p50/p99 latency.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --products 5000 --orders 500 --requests 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Query
+from fastapi.testclient import TestClient
+
+import database as db
+
+
+def populate(products: int, orders: int):
+    """Fill scratch database with synthetic catalog and orders"""
+    rng = random.Random(42)
+    category_ids = [db.create_category(f"Kategoriya {i}", f"Категория {i}") for i in range(20)]
+    product_ids = []
+    for i in range(products):
+        product_ids.append(db.create_product(
+            category_id=rng.choice(category_ids),
+            name_uz=f"Mahsulot {i}",
+            name_ru=f"Товар {i}",
+            description_uz="Mahsulot tavsifi. " * rng.randint(5, 20),
+            description_ru="Описание товара. " * rng.randint(5, 20),
+            price=rng.randint(5, 500) * 1000,
+            discount_price=rng.choice([None, rng.randint(5, 400) * 1000]),
+            stock_quantity=rng.randint(0, 100),
+            image_path=f"uploads/blobs/ab/{i:064x}.jpg"
+        ))
+    for user_id in range(1, 101):
+        db.create_user(user_id, first_name=f"User {user_id}", phone=f"+99890{user_id:07d}")
+    for i in range(orders):
+        order_id = db.create_order(
+            user_id=rng.randint(1, 100), full_name="Ali Valiyev", phone="+998901234567",
+            address="Toshkent, Chilonzor 1", total_amount=rng.randint(10, 900) * 1000
+        )
+        for product_id in rng.sample(product_ids, 3):
+            db.add_order_item(order_id, product_id, rng.randint(1, 3), 10000)
+
+
+def build_baseline_app() -> FastAPI:
+    """Replica of the list handlers before typed models/orjson/compression"""
+    app = FastAPI()
+
+    @app.get("/api/admin/products")
+    async def products(active_only: bool = False):
+        return {"products": db.get_all_products(active_only=active_only), "success": True}
+
+    @app.get("/api/admin/orders")
+    async def orders(page: int = Query(default=1, ge=1), per_page: int = Query(default=20, ge=1, le=100)):
+        orders = db.get_all_orders()
+        for order in orders:
+            order['items'] = db.get_order_items(order['order_id'])
+            order['user'] = db.get_user(order['user_id'])
+        start = (page - 1) * per_page
+        return {"orders": orders[start:start + per_page], "total": len(orders),
+                "page": page, "per_page": per_page, "success": True}
+
+    return app
+
+
+def measure(client: TestClient, path: str, headers: dict, requests: int) -> dict:
+    """Run requests and collect latency and wire size"""
+    client.get(path, headers=headers)  # warm-up
+    timings = []
+    size = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+        size = int(response.headers.get('content-length', len(response.content)))
+    timings.sort()
+    return {
+        'bytes': size,
+        'p50_ms': statistics.median(timings),
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    db.DB_NAME = os.path.join(workdir, 'bench.db')
+    db.init_db()
+    populate(args.products, args.orders)
+
+    from api.main import app
+    from api.admin_routes import create_admin_access_token
+    from config import SUPER_ADMIN_ID
+
+    auth = {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+    before = TestClient(build_baseline_app())
+    after = TestClient(app)
+
+    cases = [
+        ('products', '/api/admin/products'),
+        ('orders', '/api/admin/orders?per_page=100'),
+    ]
+    variants = [
+        ('before', before, 'identity'),
+        ('after', after, 'identity'),
+        ('after', after, 'gzip'),
+        ('after', after, 'br'),
+    ]
+
+    print(f"{args.products} products, {args.orders} orders, {args.requests} requests per case")
+    print(f"{'endpoint':<10} {'variant':<8} {'encoding':<9} {'bytes':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, path in cases:
+        for label, client, encoding in variants:
+            result = measure(client, path, {**auth, 'Accept-Encoding': encoding}, args.requests)
+            print(f"{name:<10} {label:<8} {encoding:<9} {result['bytes']:>10} "
+                  f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup time of the bot process up to its first handled update
+
+Starts fresh interpreters that do what `python main.py --mode bot` does
+before polling: import main, init_db(), init_bot(). Each then feeds one
+/start update through the dispatcher, with the Bot API answered locally by
+benchmarks.fake_telegram. Per phase it reports the median over --runs
+starts:
+    interpreter   process spawn until the benchmark's own code runs
+    import        import main (aiogram, handlers, database, services)
+    init_db       schema check (DDL only on the first run or a new schema)
+    bot           Bot, Dispatcher, FSM storage and handler setup
+    first update  /start handled
+The first run creates the database, later runs restart on it. --eager
+reproduces the previous startup: Telethon, FastAPI, uvicorn and Pillow
+imported up front and the DDL re-run on every start. The run fails (exit
+status 1) when the median time to first update exceeds --target seconds.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 5 --target 4
+    python -m benchmarks.bench_startup --runs 5 --eager
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ('interpreter', 'import', 'init_db', 'bot', 'first update')
+LAZY_MODULES = ('telethon', 'fastapi', 'uvicorn', 'PIL')
+
+
+def child(eager: bool):
+    """One startup, timestamps printed as JSON on the last stdout line"""
+    marks = [time.time()]
+    sys.path.insert(0, BACKEND)
+    if eager:
+        import telethon, fastapi, uvicorn, PIL.Image  # noqa: F401
+    import main
+    marks.append(time.time())
+
+    if eager:
+        conn = main.init_db.__globals__['get_connection']()
+        conn.execute('PRAGMA user_version = 0')
+        conn.close()
+    main.init_db()
+    marks.append(time.time())
+
+    from benchmarks.fake_telegram import FakeSession, message_update
+
+    async def first_update():
+        bot, dp = await main.init_bot()
+        bot.session = FakeSession(latency=0)
+        marks.append(time.time())
+        await dp.feed_raw_update(bot, message_update(1, 1001, '/start'))
+        marks.append(time.time())
+        await dp.storage.close()
+
+    asyncio.run(first_update())
+    loaded = [name for name in LAZY_MODULES if name in sys.modules]
+    print(json.dumps({'marks': marks, 'loaded': loaded}))
+
+
+def start(workdir: str, eager: bool) -> dict:
+    """Spawn one startup, returns seconds per phase"""
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    spawned = time.time()
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--child'] + (['--eager'] if eager else []),
+        cwd=workdir, env=dict(env, PYTHONPATH=BACKEND), capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    marks = [spawned] + result['marks']
+    return {'phases': dict(zip(PHASES, (b - a for a, b in zip(marks, marks[1:])))),
+            'total': marks[-1] - spawned, 'loaded': result['loaded']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5, help="process starts (the first creates the database)")
+    parser.add_argument('--target', type=float, default=4.0,
+                        help="seconds allowed from spawn to first handled update (median of restarts)")
+    parser.add_argument('--eager', action='store_true', help="previous startup: eager imports, DDL every start")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.eager)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    runs = [start(workdir, args.eager) for _ in range(max(2, args.runs))]
+    restarts = runs[1:]
+
+    print(f"{'phase':<14} {'first run':>10} {'restarts':>10}   ({len(restarts)} restarts, median seconds)")
+    for phase in PHASES:
+        print(f"{phase:<14} {runs[0]['phases'][phase]:>10.3f} "
+              f"{statistics.median(run['phases'][phase] for run in restarts):>10.3f}")
+    total = statistics.median(run['total'] for run in restarts)
+    print(f"{'total':<14} {runs[0]['total']:>10.3f} {total:>10.3f}")
+    print(f"\nHeavy modules loaded by the first update: {', '.join(runs[-1]['loaded']) or 'none'}")
+
+    if total > args.target:
+        print(f"Time to first update {total:.2f}s exceeds target {args.target:.2f}s")
+        sys.exit(1)
+    print(f"Time to first update {total:.2f}s within target {args.target:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Webhook update throughput and handler latency
+
+Replays Telegram updates into the webhook route (in-process ASGI, real bot
+handlers on a scratch database) for several worker counts and reports
+updates/sec, p50/p99 handler time and p99 latency from webhook receipt to
+handler completion.
+Bot API calls go to a fake session answering after --api-latency seconds, as
+the real API would over the network. Updates refused with 503 are
+redelivered after a pause, like Telegram does.
+
+Updates come from --updates (JSONL, one raw update per line, e.g. recorded
+from production) or are synthesized: /start, catalog, category, product,
+add-to-cart and cart views from --users users.
+
+Usage (from backend/):
+    python -m benchmarks.bench_webhook --updates 2000 --concurrency 1 4 8 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from aiogram import Bot, Dispatcher
+from fastapi import FastAPI
+
+import database as db
+from bot.handlers import setup_handlers
+from bot.webhook import UpdateQueue, create_webhook_router, SECRET_TOKEN_HEADER
+from benchmarks.fake_telegram import FakeSession, message_update, callback_update
+
+PATH = '/telegram/webhook/bench'
+SECRET_TOKEN = 'bench-secret'
+
+
+class TimedUpdateQueue(UpdateQueue):
+    """Update queue recording handler time and receipt-to-completion latency"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.handler_times = []
+        self.latencies = []
+
+    async def process(self, update, enqueued_at):
+        started = time.perf_counter()
+        await super().process(update, enqueued_at)
+        finished = time.perf_counter()
+        self.handler_times.append((finished - started) * 1000)
+        self.latencies.append((finished - enqueued_at) * 1000)
+
+
+def populate(users: int, products: int) -> tuple:
+    """Fill scratch database, returns category and product ids"""
+    rng = random.Random(42)
+    category_ids = [db.create_category(f"Kategoriya {i}", f"Категория {i}") for i in range(10)]
+    product_ids = [
+        db.create_product(category_id=rng.choice(category_ids), name_uz=f"Mahsulot {i}", name_ru=f"Товар {i}",
+                          price=rng.randint(5, 500) * 1000, stock_quantity=100)
+        for i in range(products)
+    ]
+    for user_id in range(1, users + 1):
+        db.create_user(user_id, first_name=f"User {user_id}", phone=f"+99890{user_id:07d}",
+                       language=rng.choice(['uz', 'ru']))
+    return category_ids, product_ids
+
+
+def synthesize_updates(count: int, users: int, category_ids: list, product_ids: list) -> list:
+    """Typical browsing session traffic"""
+    rng = random.Random(7)
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = rng.randint(1, users)
+        if rng.random() < 0.3:
+            updates.append(message_update(update_id, user_id, rng.choice(['/start', '🛍 Katalog', '🛒 Savatcha'])))
+        else:
+            updates.append(callback_update(update_id, user_id, rng.choice([
+                f"cat_{rng.choice(category_ids)}",
+                f"prod_{rng.choice(product_ids)}",
+                f"add_cart_{rng.choice(product_ids)}",
+            ])))
+    return updates
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def replay(dp: Dispatcher, updates: list, args, concurrency: int) -> dict:
+    """Post all updates to the webhook and wait until they are handled"""
+    bot = Bot('123456:BENCH', session=FakeSession(args.api_latency))
+    queue = TimedUpdateQueue(bot, dp, maxsize=args.queue_size, concurrency=concurrency)
+    app = FastAPI()
+    app.include_router(create_webhook_router(queue, PATH, SECRET_TOKEN))
+
+    # Telegram opens up to max_connections parallel webhook requests
+    connections = asyncio.Semaphore(args.max_connections)
+    redelivered = 0
+
+    async def deliver(client: httpx.AsyncClient, update: dict):
+        nonlocal redelivered
+        async with connections:
+            while True:
+                response = await client.post(PATH, json=update, headers={SECRET_TOKEN_HEADER: SECRET_TOKEN})
+                if response.status_code != 503:
+                    response.raise_for_status()
+                    return
+                redelivered += 1
+                await asyncio.sleep(0.05)
+
+    await queue.start()
+    start = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench') as client:
+        await asyncio.gather(*[deliver(client, update) for update in updates])
+    await queue.join()
+    elapsed = time.perf_counter() - start
+    await queue.stop()
+
+    handler_times = sorted(queue.handler_times)
+    latencies = sorted(queue.latencies)
+    return {
+        'rate': len(updates) / elapsed,
+        'handler_p50': statistics.median(handler_times),
+        'handler_p99': percentile(handler_times, 0.99),
+        'p99': percentile(latencies, 0.99),
+        'redelivered': redelivered,
+        'failed': queue.failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--updates', default='2000', help="number of synthetic updates or JSONL file of recorded ones")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--queue-size', type=int, default=1000)
+    parser.add_argument('--max-connections', type=int, default=40)
+    parser.add_argument('--api-latency', type=float, default=0.03, help="seconds per fake Bot API call")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    db.DB_NAME = os.path.join(workdir, 'bench.db')
+    db.init_db()
+    category_ids, product_ids = populate(args.users, args.products)
+
+    if args.updates.isdigit():
+        updates = synthesize_updates(int(args.updates), args.users, category_ids, product_ids)
+    else:
+        with open(args.updates) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+
+    # Handler routers attach to a single dispatcher, shared by all runs
+    dp = Dispatcher()
+    dp.include_router(setup_handlers())
+
+    print(f"{len(updates)} updates, Bot API latency {args.api_latency * 1000:.0f} ms, "
+          f"queue {args.queue_size}, {args.max_connections} webhook connections")
+    print(f"{'workers':>8} {'updates/s':>10} {'handler p50':>12} {'handler p99':>12} "
+          f"{'receipt p99':>12} {'503s':>6} {'failed':>7}")
+    for concurrency in args.concurrency:
+        result = asyncio.run(replay(dp, updates, args, concurrency))
+        print(f"{concurrency:>8} {result['rate']:>10.0f} {result['handler_p50']:>9.1f} ms "
+              f"{result['handler_p99']:>9.1f} ms {result['p99']:>9.0f} ms "
+              f"{result['redelivered']:>6} {result['failed']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator
+
+Fills a SQLite file (schema from database.init_db) with a production-shaped
+dataset: users, categories, products, neighborhoods, orders with 1-4 items,
+support chats and a few open carts. Rows are bulk inserted in batches inside
+one transaction, so the full default size (100k users, 20k products, 1M
+orders, 5M chat messages) takes a few minutes; --scale shrinks every count
+for quick runs. Generation is deterministic for a given --seed.
+
+Usage (from backend/):
+    python -m benchmarks.dataset --output /tmp/zarbdor_load.db --scale 0.1
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+SIZES = {'users': 100_000, 'products': 20_000, 'orders': 1_000_000, 'messages': 5_000_000}
+CATEGORIES = 20
+NEIGHBORHOODS = 30
+BATCH_SIZE = 50_000
+STATUSES = ['completed'] * 80 + ['cancelled'] * 8 + ['pending'] * 5 + ['confirmed'] * 4 + ['delivering'] * 3
+WORDS = ['olma', 'nok', 'uzum', 'non', 'sut', 'guruch', 'go\'sht', 'choy', 'shakar', 'yog\'', 'tuxum', 'sabzi']
+START = datetime(2024, 1, 1)
+PERIOD = timedelta(days=365).total_seconds()
+
+
+def _timestamp(rng: random.Random) -> str:
+    return (START + timedelta(seconds=rng.random() * PERIOD)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _insert(conn, sql: str, rows):
+    """executemany in batches so generators are never fully materialized"""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        conn.executemany(sql, batch)
+
+
+def _users(rng: random.Random, count: int):
+    for user_id in range(1, count + 1):
+        yield (user_id, f"user{user_id}", f"User {user_id}", f"+99890{user_id:07d}",
+               rng.choice(['uz', 'uz', 'ru']), _timestamp(rng))
+
+
+def _products(rng: random.Random, count: int):
+    for i in range(count):
+        price = rng.randint(5, 500) * 1000
+        name = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i}"
+        yield (rng.randint(1, CATEGORIES), name, f"Товар {i}",
+               f"{name} tavsifi. " * rng.randint(2, 10), f"Описание товара {i}. " * rng.randint(2, 10),
+               price, price * 0.8 if rng.random() < 0.15 else None,
+               rng.randint(1_000, 100_000), _timestamp(rng))
+
+
+def _orders(rng: random.Random, count: int, users: int, prices: list, sold: list, items: list):
+    """Yield order rows, appending their items to items and counting sold units"""
+    products = len(prices)
+    for order_id in range(1, count + 1):
+        user_id = rng.randint(1, users)
+        total = 0
+        for product_id in rng.sample(range(1, products + 1), min(products, rng.randint(1, 4))):
+            quantity = rng.randint(1, 3)
+            price = prices[product_id - 1]
+            items.append((order_id, product_id, quantity, price))
+            sold[product_id - 1] += quantity
+            total += price * quantity
+        created_at = _timestamp(rng)
+        yield (order_id, user_id, rng.randint(1, NEIGHBORHOODS), f"User {user_id}", f"+99890{user_id:07d}",
+               f"Toshkent, {rng.randint(1, 200)}-uy", total, 10000, rng.choice(STATUSES), created_at, created_at)
+
+
+def _messages(rng: random.Random, count: int, users: int):
+    # About a fifth of customers ever talk to support, in short back-and-forth threads
+    chatting = max(1, users // 5)
+    for _ in range(count):
+        user_id = rng.randint(1, chatting)
+        sender = 'user' if rng.random() < 0.6 else 'admin'
+        yield (user_id, None if sender == 'user' else 1, f"Xabar {rng.choice(WORDS)} {rng.randint(1, 10**6)}",
+               sender, _timestamp(rng), 1)
+
+
+def generate(path: str, users: int, products: int, orders: int, messages: int, seed: int = 42) -> dict:
+    """Create database at path filled with synthetic data, returns row counts"""
+    rng = random.Random(seed)
+    db.DB_NAME = path
+    db.init_db()
+
+    conn = db.get_connection()
+    conn.execute('PRAGMA synchronous=OFF')
+
+    _insert(conn, 'INSERT INTO categories (name_uz, name_ru) VALUES (?, ?)',
+            ((f"Kategoriya {i}", f"Категория {i}") for i in range(1, CATEGORIES + 1)))
+    _insert(conn, 'INSERT INTO neighborhoods (name_uz, name_ru, delivery_price) VALUES (?, ?, ?)',
+            ((f"Mahalla {i}", f"Махалля {i}", 10000) for i in range(1, NEIGHBORHOODS + 1)))
+    _insert(conn, '''
+        INSERT INTO users (user_id, username, first_name, phone, language, registered_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', _users(rng, users))
+    _insert(conn, '''
+        INSERT INTO products (category_id, name_uz, name_ru, description_uz, description_ru,
+                              price, discount_price, stock_quantity, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', _products(rng, products))
+    prices = [row[0] for row in conn.execute('SELECT effective_price FROM products ORDER BY product_id')]
+
+    sold = [0] * products
+    items = []
+    order_rows = _orders(rng, orders, users, prices, sold, items)
+    while True:
+        batch = list(itertools.islice(order_rows, BATCH_SIZE))
+        if not batch:
+            break
+        conn.executemany('''
+            INSERT INTO orders (order_id, user_id, neighborhood_id, full_name, phone, address,
+                                total_amount, delivery_price, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.executemany('INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)',
+                         items)
+        items.clear()
+    conn.executemany('UPDATE products SET sold_count = ? WHERE product_id = ?',
+                     [(count, product_id) for product_id, count in enumerate(sold, start=1) if count])
+
+    _insert(conn, '''
+        INSERT INTO chat_messages (user_id, admin_id, message_text, sender_type, created_at, is_read)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', _messages(rng, messages, users))
+    conn.execute('''
+        INSERT INTO chat_conversations (user_id, last_message_id, last_message_text, last_sender_type,
+                                        last_message_at, admin_read_message_id, user_read_message_id)
+        SELECT m.user_id, m.message_id, m.message_text, m.sender_type, m.created_at, m.message_id, m.message_id
+        FROM chat_messages m
+        JOIN (SELECT MAX(message_id) AS message_id FROM chat_messages GROUP BY user_id) last
+            ON last.message_id = m.message_id
+    ''')
+
+    _insert(conn, 'INSERT INTO cart_items (user_id, product_id, quantity, added_price) VALUES (?, ?, ?, ?)',
+            ((user_id, product_id, rng.randint(1, 3), prices[product_id - 1])
+             for user_id in range(1, users + 1, 10)
+             for product_id in rng.sample(range(1, products + 1), min(products, 2))))
+
+    conn.commit()
+    conn.execute('ANALYZE')
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('users', 'products', 'orders', 'order_items', 'chat_messages', 'cart_items')}
+    conn.close()
+    return counts
+
+
+def add_size_arguments(parser: argparse.ArgumentParser):
+    """Dataset size options shared with the load test"""
+    for name, default in SIZES.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every row count")
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def scaled_sizes(args) -> dict:
+    return {name: max(1, int(getattr(args, name) * args.scale)) for name in SIZES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--output', required=True, help="SQLite file to create (must not exist)")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    start = time.perf_counter()
+    counts = generate(args.output, seed=args.seed, **scaled_sizes(args))
+    print(f"Generated {args.output} in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(args.output) / 2**20:.0f} MiB)")
+    for table, count in counts.items():
+        print(f"  {table:<14} {count:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Local stand-in for the Telegram Bot API used by the bot benchmarks
+
+FakeSession answers every Bot API method in-process after a fixed delay,
+records how often each method was called and can answer a share of calls
+with 429 (TelegramRetryAfter) like a rate-limited bot would see.
+"""
+import asyncio
+import random
+import typing
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Optional
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Chat, Message
+
+
+class FakeSession(BaseSession):
+    """Bot API session answering every method locally after a fixed delay"""
+
+    def __init__(self, latency: float, retry_after_rate: float = 0.0, retry_after: int = 1,
+                 on_call: Optional[Callable[[str], None]] = None, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.on_call = on_call
+        self.calls = 0
+        self.methods = Counter()
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        name = type(method).__name__
+        self.methods[name] += 1
+        if self.on_call is not None:
+            self.on_call(name)
+        await asyncio.sleep(self.latency)
+        if self.retry_after_rate and self._rng.random() < self.retry_after_rate:
+            self.rate_limited += 1
+            raise TelegramRetryAfter(method=method, message=f"Too Many Requests: retry after {self.retry_after}",
+                                     retry_after=self.retry_after)
+
+        returning = method.__returning__
+        options = typing.get_args(returning) or (returning,)
+        if Message in options:
+            chat_id = getattr(method, 'chat_id', None) or 0
+            return Message(message_id=self.calls, date=datetime.now(),
+                           chat=Chat(id=int(chat_id), type='private'))
+        if bool in options:
+            return True
+        return None
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    """Raw update of a private text message"""
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 1700000000, 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+    }}
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    """Raw update of an inline button tap"""
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': str(user_id), 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+        'message': {'message_id': 1, 'date': 1700000000, 'text': 'menu',
+                    'chat': {'id': user_id, 'type': 'private'}},
+    }}
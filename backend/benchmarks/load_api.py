@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+HTTP load test over weighted user scenarios
+
+Starts the API (`main.py --mode api`) on a synthetic dataset (generated with
+benchmarks.dataset, or a copy of --dataset) and drives it with an asyncio
+load generator: --concurrency virtual users run scenarios picked by weight
+until --duration elapses. Reports throughput and p50/p95/p99 latency per
+route. --save-baseline writes the results as JSON; --baseline compares a run
+against such a file and exits with status 1 if any route's p95 latency or
+throughput regressed by more than --tolerance.
+
+Scenarios:
+    browse    categories, category page, product details
+    search    product search, product details
+    cart      add to cart, view cart
+    checkout  add to cart, create order (with Idempotency-Key), order history
+    admin     admin order listing, admin user listing
+
+Usage (from backend/):
+    python -m benchmarks.dataset --output /tmp/zarbdor_load.db --scale 0.1
+    python -m benchmarks.load_api --dataset /tmp/zarbdor_load.db --duration 30 --save-baseline baseline.json
+    python -m benchmarks.load_api --dataset /tmp/zarbdor_load.db --duration 30 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+import config
+
+# Server and load generator must share the JWT secret
+config.API_SECRET_KEY = secrets.token_urlsafe(32)
+
+import database as db
+from api.routes import create_access_token
+from api.admin_routes import create_admin_access_token
+from benchmarks.dataset import CATEGORIES, WORDS, add_size_arguments, generate, scaled_sizes
+
+DEFAULT_WEIGHTS = {'browse': 50, 'search': 20, 'cart': 15, 'checkout': 10, 'admin': 5}
+ORDER = {'full_name': 'Load Test', 'phone': '+998901234567', 'address': 'Toshkent, 1-uy'}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(base_url: str):
+    for _ in range(300):
+        try:
+            httpx.get(f'{base_url}/health')
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError('API server did not start')
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Session:
+    """HTTP client of one virtual user, recording latency per route"""
+
+    def __init__(self, client: httpx.AsyncClient, stats: dict, errors: dict, user_id: int):
+        self.client = client
+        self.stats = stats
+        self.errors = errors
+        self.headers = {'Authorization': f'Bearer {create_access_token(user_id)}'}
+
+    async def request(self, method: str, route: str, url: str, headers: dict = None, **kwargs):
+        """Send request, route is the label results are grouped by"""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers={**self.headers, **(headers or {})}, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return None
+        self.stats[route].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+            return None
+        return response.json()
+
+
+async def browse(session: Session, rng: random.Random, products: int, admin_headers: dict):
+    await session.request('GET', 'GET /api/categories', '/api/categories')
+    page = await session.request('GET', 'GET /api/products?category_id', '/api/products',
+                                 params={'category_id': rng.randint(1, CATEGORIES), 'limit': 20})
+    if page and page['products']:
+        product_id = rng.choice(page['products'])['product_id']
+        await session.request('GET', 'GET /api/products/{id}', f'/api/products/{product_id}')
+
+
+async def search(session: Session, rng: random.Random, products: int, admin_headers: dict):
+    page = await session.request('GET', 'GET /api/products?search', '/api/products',
+                                 params={'search': rng.choice(WORDS), 'limit': 20})
+    if page and page['products']:
+        product_id = rng.choice(page['products'])['product_id']
+        await session.request('GET', 'GET /api/products/{id}', f'/api/products/{product_id}')
+
+
+async def cart(session: Session, rng: random.Random, products: int, admin_headers: dict):
+    await session.request('POST', 'POST /api/cart/add', '/api/cart/add',
+                          json={'product_id': rng.randint(1, products), 'quantity': 1})
+    await session.request('GET', 'GET /api/cart', '/api/cart')
+
+
+async def checkout(session: Session, rng: random.Random, products: int, admin_headers: dict):
+    await session.request('POST', 'POST /api/cart/add', '/api/cart/add',
+                          json={'product_id': rng.randint(1, products), 'quantity': 1})
+    await session.request('POST', 'POST /api/orders/create', '/api/orders/create', json=ORDER,
+                          headers={'Idempotency-Key': str(uuid.UUID(int=rng.getrandbits(128)))})
+    await session.request('GET', 'GET /api/orders', '/api/orders')
+
+
+async def admin(session: Session, rng: random.Random, products: int, admin_headers: dict):
+    await session.request('GET', 'GET /api/admin/orders', '/api/admin/orders', headers=admin_headers,
+                          params={'status': 'pending', 'page': rng.randint(1, 5)})
+    await session.request('GET', 'GET /api/admin/users', '/api/admin/users', headers=admin_headers,
+                          params={'page': rng.randint(1, 5)})
+
+
+SCENARIOS = {'browse': browse, 'search': search, 'cart': cart, 'checkout': checkout, 'admin': admin}
+
+
+async def generate_load(base_url: str, args, sizes: dict, weights: dict) -> dict:
+    """Run virtual users until the deadline, returns latencies and errors per route"""
+    stats, errors = defaultdict(list), defaultdict(int)
+    admin_headers = {'Authorization': f'Bearer {create_admin_access_token(config.SUPER_ADMIN_ID)}'}
+    names, scenario_weights = list(weights), list(weights.values())
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    deadline = time.perf_counter() + args.duration
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        async def virtual_user(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                session = Session(client, stats, errors, rng.randint(1, sizes['users']))
+                scenario = SCENARIOS[rng.choices(names, scenario_weights)[0]]
+                await scenario(session, rng, sizes['products'], admin_headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[virtual_user(seed) for seed in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+
+    results = {}
+    for route in sorted(set(stats) | set(errors)):
+        timings = sorted(stats[route])
+        results[route] = {
+            'requests': len(timings),
+            'errors': errors[route],
+            'rate': len(timings) / elapsed,
+            'p50': percentile(timings, 0.50) if timings else None,
+            'p95': percentile(timings, 0.95) if timings else None,
+            'p99': percentile(timings, 0.99) if timings else None,
+        }
+    return {'elapsed': elapsed, 'routes': results}
+
+
+def parse_weights(values: list) -> dict:
+    weights = dict(DEFAULT_WEIGHTS)
+    for value in values or []:
+        name, _, weight = value.partition('=')
+        if name not in SCENARIOS or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"expected scenario=weight with scenario in {list(SCENARIOS)}")
+        weights[name] = int(weight)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def change(current, previous):
+    """Relative change in percent, None if either side is missing"""
+    if not current or not previous:
+        return None
+    return (current - previous) / previous * 100
+
+
+def report(results: dict, baseline: dict = None, tolerance: float = 10) -> bool:
+    """Print per-route table, returns False if any route regressed beyond tolerance"""
+    ok = True
+    header = f"{'route':<30} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    print(header + (f" {'Δreq/s':>8} {'Δp95':>8}" if baseline else ''))
+    for route, row in results['routes'].items():
+        cells = [f"{row[p]:>8.1f}" if row[p] is not None else f"{'-':>8}" for p in ('p50', 'p95', 'p99')]
+        line = f"{route:<30} {row['requests']:>9} {row['errors']:>7} {row['rate']:>8.1f} " + ' '.join(cells)
+        previous = (baseline or {}).get('routes', {}).get(route)
+        if previous:
+            rate_change = change(row['rate'], previous['rate'])
+            p95_change = change(row['p95'], previous['p95'])
+            regressed = ((rate_change is not None and rate_change < -tolerance)
+                         or (p95_change is not None and p95_change > tolerance))
+            ok = ok and not regressed
+            line += ''.join(f" {value:>+7.0f}%" if value is not None else f"{'-':>9}"
+                            for value in (rate_change, p95_change))
+            line += '  REGRESSION' if regressed else ''
+        print(line)
+
+    total = sum(row['requests'] for row in results['routes'].values())
+    errors = sum(row['errors'] for row in results['routes'].values())
+    print(f"{'total':<30} {total:>9} {errors:>7} {total / results['elapsed']:>8.1f}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--dataset', help="database from benchmarks.dataset (copied, never modified)")
+    add_size_arguments(parser)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=32, help="virtual users")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn workers")
+    parser.add_argument('--timeout', type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument('--weights', nargs='*', metavar='SCENARIO=WEIGHT',
+                        help=f"scenario weights (default {' '.join(f'{k}={v}' for k, v in DEFAULT_WEIGHTS.items())})")
+    parser.add_argument('--save-baseline', metavar='FILE', help="write results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare with results saved earlier")
+    parser.add_argument('--tolerance', type=float, default=10, help="allowed regression in percent")
+    args = parser.parse_args()
+    try:
+        weights = parse_weights(args.weights)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    # main.py resolves the database relative to its working directory
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    path = os.path.join(workdir, config.DB_NAME)
+    if args.dataset:
+        shutil.copyfile(args.dataset, path)
+        db.DB_NAME = path
+        conn = db.get_connection()
+        sizes = {
+            'users': conn.execute('SELECT MAX(user_id) FROM users').fetchone()[0],
+            'products': conn.execute('SELECT MAX(product_id) FROM products').fetchone()[0],
+        }
+        conn.close()
+    else:
+        sizes = scaled_sizes(args)
+        print(f"Generating dataset: {sizes}")
+        generate(path, seed=args.seed, **sizes)
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'main.py'), '--mode', 'api',
+         '--workers', str(args.workers), '--host', '127.0.0.1', '--port', str(port)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, 'API_SECRET_KEY': config.API_SECRET_KEY, 'PYTHONPATH': BACKEND_DIR}
+    )
+    try:
+        wait_for_server(base_url)
+        print(f"{sizes['users']} users, {sizes['products']} products, {args.concurrency} virtual users, "
+              f"{args.workers} worker(s), {args.duration:.0f}s, weights {weights}")
+        results = asyncio.run(generate_load(base_url, args, sizes, weights))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    ok = report(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        results['config'] = {'concurrency': args.concurrency, 'workers': args.workers,
+                             'duration': args.duration, 'weights': weights, **sizes}
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
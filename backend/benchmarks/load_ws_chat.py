@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+WebSocket chat push load test
+
+Starts the API in a subprocess on a scratch database, opens thousands of idle
+/ws/chat connections, then sends admin replies through the REST endpoint and
+measures push latency. Reports server RSS per idle connection and p50/p99
+reply-to-delivery latency.
+
+Usage (from backend/):
+    python -m benchmarks.load_ws_chat --connections 5000 --replies 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+import websockets
+
+import config
+
+# Server and load generator must share the JWT secret
+config.API_SECRET_KEY = secrets.token_urlsafe(32)
+
+import database as db
+from api.routes import create_access_token
+from api.admin_routes import create_admin_access_token
+
+SERVER = '''
+import sys
+import config
+import database
+config.API_SECRET_KEY = sys.argv[1]
+database.DB_NAME = sys.argv[2]
+import uvicorn
+from api.main import app
+uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[3]), log_level="warning",
+            ws_ping_interval=None, ws_per_message_deflate=False)
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb(pid: int) -> int:
+    """Resident set size of process from /proc"""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+async def wait_for_server(base_url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f'{base_url}/health')
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError('API server did not start')
+
+
+async def run(args, workdir: str):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, '-c', SERVER, config.API_SECRET_KEY, db.DB_NAME, str(port)],
+        cwd=workdir, env={**os.environ, 'PYTHONPATH': BACKEND_DIR}
+    )
+    try:
+        await wait_for_server(base_url)
+        baseline_rss = rss_kb(server.pid)
+
+        # Open idle connections (one per user) in batches
+        connections = {}
+        start = time.perf_counter()
+        user_ids = list(range(1, args.connections + 1))
+        for i in range(0, len(user_ids), args.batch):
+            batch = user_ids[i:i + args.batch]
+            sockets = await asyncio.gather(*[
+                websockets.connect(f'ws://127.0.0.1:{port}/ws/chat',
+                                   subprotocols=['bearer', create_access_token(uid)],
+                                   ping_interval=None, max_queue=4)
+                for uid in batch
+            ])
+            connections.update(zip(batch, sockets))
+        connect_seconds = time.perf_counter() - start
+        await asyncio.sleep(1)
+        idle_rss = rss_kb(server.pid)
+
+        # Push replies to random users and time delivery
+        headers = {'Authorization': f'Bearer {create_admin_access_token(config.SUPER_ADMIN_ID)}'}
+        rng = random.Random(42)
+        timings = []
+        async with httpx.AsyncClient(base_url=base_url, headers=headers) as client:
+            for n in range(args.replies):
+                user_id = rng.choice(user_ids)
+                sent = time.perf_counter()
+                receive = asyncio.create_task(connections[user_id].recv())
+                response = await client.post(f'/api/admin/chats/{user_id}/reply', json={'message': f'reply {n}'})
+                response.raise_for_status()
+                await asyncio.wait_for(receive, 5)
+                timings.append((time.perf_counter() - sent) * 1000)
+
+        await asyncio.gather(*[ws.close() for ws in connections.values()])
+    finally:
+        server.terminate()
+        server.wait()
+
+    timings.sort()
+    per_connection = (idle_rss - baseline_rss) / max(args.connections, 1)
+    print(f"{args.connections} idle connections opened in {connect_seconds:.1f}s")
+    print(f"server RSS: {baseline_rss / 1024:.1f} MB -> {idle_rss / 1024:.1f} MB "
+          f"({per_connection:.1f} KB per connection)")
+    print(f"{args.replies} replies pushed: p50 {statistics.median(timings):.2f} ms, "
+          f"p99 {timings[min(len(timings) - 1, int(len(timings) * 0.99))]:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--replies', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=200)
+    args = parser.parse_args()
+
+    # Each connection needs a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if args.connections * 2 + 100 > hard:
+        parser.error(f"--connections too high for open file limit {hard}")
+
+    workdir = tempfile.mkdtemp(prefix='zarbdor_bench_')
+    db.DB_NAME = os.path.join(workdir, 'bench.db')
+    db.init_db()
+    conn = db.get_connection()
+    conn.executemany('INSERT INTO users (user_id, phone) VALUES (?, ?)',
+                     [(uid, f'+99890{uid:07d}') for uid in range(1, args.connections + 1)])
+    conn.commit()
+    conn.close()
+
+    asyncio.run(run(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
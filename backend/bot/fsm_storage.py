@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import database as db
+from config import FSM_STATE_TTL, FSM_CACHE_MAX_ENTRIES, FSM_FLUSH_INTERVAL, FSM_SWEEP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+def encode_data(data: Dict[str, Any]) -> str:
+    """Compact JSON encoding of FSM data"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_data(raw: Optional[str]) -> Dict[str, Any]:
+    """Decode stored FSM data"""
+    return json.loads(raw) if raw else {}
+
+
+class _Entry:
+    """Cached FSM state of one storage key"""
+    __slots__ = ('state', 'data', 'touched')
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], touched: float):
+        self.state = state
+        self.data = data
+        self.touched = touched
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage persisted in the fsm_states table with a write-back cache
+    Reads are served from an LRU cache after the first load; changes are
+    written in one batch every flush_interval seconds (and on close), so a
+    multi-step flow costs one row write per interval instead of one per
+    step. States untouched for ttl seconds count as abandoned: they read back
+    empty and are deleted from the table by a periodic sweep.
+    """
+
+    def __init__(self, ttl: float = FSM_STATE_TTL, max_entries: int = FSM_CACHE_MAX_ENTRIES,
+                 flush_interval: float = FSM_FLUSH_INTERVAL, sweep_interval: float = FSM_SWEEP_INTERVAL):
+        """Initialize storage (background flusher starts on first write)"""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_sweep = time.time()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        """Row key of a storage key"""
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _expired(self, touched: float) -> bool:
+        return touched < time.time() - self.ttl
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        """Get cached entry, loading it from the table on a miss"""
+        name = self._key(key)
+        entry = self._cache.get(name)
+        if entry is None:
+            row = await asyncio.to_thread(db.get_fsm_state, name)
+            if row and not self._expired(row['updated_at']):
+                loaded = _Entry(row['state'], decode_data(row['data']), row['updated_at'])
+            else:
+                loaded = _Entry(None, {}, time.time())
+            # Another coroutine may have loaded the key meanwhile
+            entry = self._cache.setdefault(name, loaded)
+        elif self._expired(entry.touched):
+            entry.state, entry.data = None, {}
+            self._dirty.add(name)
+        self._cache.move_to_end(name)
+        self._evict()
+        return entry
+
+    def _evict(self):
+        """Drop least recently used clean entries above max_entries (never the most recent one)"""
+        excess = len(self._cache) - self.max_entries
+        if excess <= 0:
+            return
+        for name in list(self._cache)[:-1]:
+            if excess <= 0:
+                break
+            if name not in self._dirty:
+                del self._cache[name]
+                excess -= 1
+
+    def _changed(self, key: StorageKey, entry: _Entry):
+        """Mark entry for write-back"""
+        entry.touched = time.time()
+        self._dirty.add(self._key(key))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run_flusher(), name="fsm_flusher")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._changed(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = dict(data)
+        self._changed(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._entry(key)).data)
+
+    async def flush(self):
+        """Write all changed entries to the table"""
+        if not self._dirty:
+            return
+        snapshot = {name: self._cache[name].touched for name in self._dirty}
+        upserts, deletes = [], []
+        for name in snapshot:
+            entry = self._cache[name]
+            if entry.is_empty():
+                deletes.append(name)
+            else:
+                upserts.append((name, entry.state, encode_data(entry.data), entry.touched))
+        await asyncio.to_thread(db.save_fsm_states, upserts, deletes)
+        
+        # Entries changed during the write stay dirty for the next flush
+        for name, touched in snapshot.items():
+            if self._cache[name].touched == touched:
+                self._dirty.discard(name)
+
+    async def sweep(self) -> int:
+        """Forget abandoned states, returns number of rows deleted"""
+        for name in [name for name, entry in self._cache.items()
+                     if name not in self._dirty and self._expired(entry.touched)]:
+            del self._cache[name]
+        return await asyncio.to_thread(db.delete_expired_fsm_states, time.time() - self.ttl)
+
+    async def _run_flusher(self):
+        """Background write-back loop"""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+                if time.time() - self._last_sweep >= self.sweep_interval:
+                    self._last_sweep = time.time()
+                    deleted = await self.sweep()
+                    if deleted:
+                        logger.info(f"Expired {deleted} abandoned FSM states")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"FSM flush error: {e}")
+
+    async def close(self) -> None:
+        """Stop flusher and write remaining changes"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
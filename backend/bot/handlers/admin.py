@@ -23,6 +23,7 @@ from bot.utils import (
     get_order_status_text
 )
 from config import SUPER_ADMIN_ID
+from services.order_events import set_order_status
 
 router = Router()
 
@@ -133,7 +134,7 @@ async def confirm_order_admin(callback: CallbackQuery):
     language = user.get('language', 'uz')
     
     order_id = int(callback.data.split('_')[2])
-    db.update_order_status(order_id, 'confirmed')
+    set_order_status(order_id, 'confirmed')
     
     # Notify customer
     order = db.get_order(order_id)
@@ -172,7 +173,7 @@ async def set_order_delivering(callback: CallbackQuery):
     language = user.get('language', 'uz')
     
     order_id = int(callback.data.split('_')[2])
-    db.update_order_status(order_id, 'delivering')
+    set_order_status(order_id, 'delivering')
     
     # Notify customer
     order = db.get_order(order_id)
@@ -211,7 +212,7 @@ async def complete_order(callback: CallbackQuery):
     language = user.get('language', 'uz')
     
     order_id = int(callback.data.split('_')[2])
-    db.update_order_status(order_id, 'completed')
+    set_order_status(order_id, 'completed')
     
     # Notify customer
     order = db.get_order(order_id)
@@ -259,7 +260,7 @@ async def cancel_order_admin(callback: CallbackQuery):
             new_stock = product.get('stock_quantity', 0) + item['quantity']
             db.update_product(item['product_id'], stock_quantity=new_stock)
     
-    db.update_order_status(order_id, 'cancelled')
+    set_order_status(order_id, 'cancelled')
     
     # Notify customer
     order = db.get_order(order_id)
@@ -548,7 +549,7 @@ async def save_product_image(message: Message, state: FSMContext):
     )
     
     await message.answer(
-        f"✅ {'Mahsulot qo\'shildi!' if language == 'uz' else 'Товар добавлен!'}\n\n🆔 #{product_id}",
+        "✅ " + ("Mahsulot qo'shildi!" if language == 'uz' else "Товар добавлен!") + f"\n\n🆔 #{product_id}",
         reply_markup=get_admin_menu_keyboard(language)
     )
     await state.clear()
@@ -575,7 +576,7 @@ async def skip_product_image(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.edit_reply_markup(reply_markup=None)
     await callback.message.answer(
-        f"✅ {'Mahsulot qo\'shildi!' if language == 'uz' else 'Товар добавлен!'}\n\n🆔 #{product_id}",
+        "✅ " + ("Mahsulot qo'shildi!" if language == 'uz' else "Товар добавлен!") + f"\n\n🆔 #{product_id}",
         reply_markup=get_admin_menu_keyboard(language)
     )
     await state.clear()
@@ -667,7 +668,7 @@ async def enter_category_name_ru(message: Message, state: FSMContext):
     )
     
     await message.answer(
-        f"✅ {'Kategoriya qo\'shildi!' if language == 'uz' else 'Категория добавлена!'}\n\n🆔 #{category_id}",
+        "✅ " + ("Kategoriya qo'shildi!" if language == 'uz' else "Категория добавлена!") + f"\n\n🆔 #{category_id}",
         reply_markup=get_admin_menu_keyboard(language)
     )
     await state.clear()
@@ -779,7 +780,7 @@ async def enter_delivery_price(message: Message, state: FSMContext):
     )
     
     await message.answer(
-        f"✅ {'Mahalla qo\'shildi!' if language == 'uz' else 'Район добавлен!'}\n\n🆔 #{neighborhood_id}",
+        "✅ " + ("Mahalla qo'shildi!" if language == 'uz' else "Район добавлен!") + f"\n\n🆔 #{neighborhood_id}",
         reply_markup=get_admin_menu_keyboard(language)
     )
     await state.clear()
@@ -864,7 +865,7 @@ async def enter_admin_id(message: Message, state: FSMContext):
     
     if success:
         await message.answer(
-            f"✅ {'Admin qo\'shildi!' if language == 'uz' else 'Админ добавлен!'}\n\n🆔 {admin_id}",
+            "✅ " + ("Admin qo'shildi!" if language == 'uz' else "Админ добавлен!") + f"\n\n🆔 {admin_id}",
             reply_markup=get_admin_menu_keyboard(language)
         )
     else:
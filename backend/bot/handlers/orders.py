@@ -4,6 +4,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 import database as db
+from config import STOCK_RESERVATION_TTL
 from bot.states import OrderStates
 from bot.keyboards import (
     get_main_menu_keyboard, get_neighborhoods_keyboard, get_payment_keyboard,
@@ -11,12 +12,16 @@ from bot.keyboards import (
     get_back_keyboard
 )
 from bot.utils import (
-    get_text, format_phone, validate_phone, calculate_cart_total,
+    get_text, format_phone, validate_phone,
     format_order_details, format_price, get_order_status_text
 )
 
 router = Router()
 
+def pack_cart_items(cart_lines: list) -> list:
+    """Compact checkout lines kept in FSM state: [product_id, quantity, unit price]"""
+    return [[line['product_id'], line['quantity'], line['effective_price']] for line in cart_lines]
+
 # Checkout callback
 @router.callback_query(F.data == "checkout")
 async def start_checkout(callback: CallbackQuery, state: FSMContext):
@@ -24,28 +29,34 @@ async def start_checkout(callback: CallbackQuery, state: FSMContext):
     user = db.get_user(callback.from_user.id)
     language = user.get('language', 'uz')
     
-    cart_items = db.get_cart_items(callback.from_user.id)
+    # Check stock and current prices of all items in one query
+    cart_lines = db.validate_cart(callback.from_user.id)
     
-    if not cart_items:
+    if not cart_lines:
         await callback.answer(get_text('cart_empty', language), show_alert=True)
         return
     
-    # Check stock for all items
-    for item in cart_items:
-        product = db.get_product(item['product_id'])
-        if not product or product.get('stock_quantity', 0) < item['quantity']:
-            await callback.answer(
-                "Ba'zi mahsulotlar omborda yetarli emas!" if language == 'uz' 
-                else "Некоторых товаров недостаточно на складе!",
-                show_alert=True
-            )
-            return
+    # Hold the stock while name, phone, address etc. are collected
+    lines = [(line['product_id'], line['quantity']) for line in cart_lines]
+    if not all(line['available'] for line in cart_lines) or \
+            not db.reserve_stock(callback.from_user.id, lines, STOCK_RESERVATION_TTL):
+        await callback.answer(
+            "Ba'zi mahsulotlar omborda yetarli emas!" if language == 'uz' 
+            else "Некоторых товаров недостаточно на складе!",
+            show_alert=True
+        )
+        return
     
     # Calculate total
-    total = calculate_cart_total(cart_items)
-    await state.update_data(cart_items=cart_items, subtotal=total)
+    total = sum(line['effective_price'] * line['quantity'] for line in cart_lines)
+    await state.update_data(cart_items=pack_cart_items(cart_lines), subtotal=total)
     
     await callback.message.delete()
+    if any(line['price_changed'] for line in cart_lines):
+        await callback.message.answer(
+            "ℹ️ Ba'zi mahsulotlar narxi o'zgardi, yangi narxlar hisobga olindi." if language == 'uz'
+            else "ℹ️ Цены некоторых товаров изменились, учтены новые цены."
+        )
     await callback.message.answer(
         get_text('enter_name', language),
         reply_markup=get_cancel_keyboard(language)
@@ -63,6 +74,7 @@ async def enter_full_name(message: Message, state: FSMContext):
     # Check for cancel
     if message.text in ['❌ Bekor qilish', '❌ Отмена']:
         await state.clear()
+        db.release_stock(message.from_user.id)
         await message.answer(
             get_text('cancelled', language),
             reply_markup=get_main_menu_keyboard(language)
@@ -102,6 +114,7 @@ async def enter_phone(message: Message, state: FSMContext):
     # Check for cancel
     if message.text in ['❌ Bekor qilish', '❌ Отмена']:
         await state.clear()
+        db.release_stock(message.from_user.id)
         await message.answer(
             get_text('cancelled', language),
             reply_markup=get_main_menu_keyboard(language)
@@ -170,6 +183,7 @@ async def enter_address(message: Message, state: FSMContext):
     # Check for cancel
     if message.text in ['❌ Bekor qilish', '❌ Отмена']:
         await state.clear()
+        db.release_stock(message.from_user.id)
         await message.answer(
             get_text('cancelled', language),
             reply_markup=get_main_menu_keyboard(language)
@@ -229,6 +243,7 @@ async def enter_notes(message: Message, state: FSMContext):
     # Check for cancel
     if message.text in ['❌ Bekor qilish', '❌ Отмена']:
         await state.clear()
+        db.release_stock(message.from_user.id)
         await message.answer(
             get_text('cancelled', language),
             reply_markup=get_main_menu_keyboard(language)
@@ -245,10 +260,10 @@ async def enter_notes(message: Message, state: FSMContext):
     lines = [get_text('confirm_order', language), ""]
     
     # Items
-    for item in data['cart_items']:
-        name = item.get(f'name_{language}', item.get('name_uz', ''))
-        price = item.get('discount_price') or item.get('price', 0)
-        quantity = item['quantity']
+    products = db.get_products_by_ids([product_id for product_id, _, _ in data['cart_items']])
+    for product_id, quantity, price in data['cart_items']:
+        product = products.get(product_id, {})
+        name = product.get(f'name_{language}', product.get('name_uz', ''))
         subtotal = price * quantity
         
         lines.append(f"• {name}")
@@ -293,9 +308,11 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
     # Calculate total
     total = data['subtotal'] + data.get('delivery_price', 0)
     
-    # Create order
-    order_id = db.create_order(
+    # Take items out of stock (converts the checkout's holds), create the order
+    # with its items and clear the cart in one transaction
+    order_id = db.place_order(
         user_id=callback.from_user.id,
+        items=data['cart_items'],
         full_name=data['full_name'],
         phone=data['phone'],
         address=data['address'],
@@ -305,25 +322,13 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
         payment_method=data['payment_method'],
         notes=data.get('notes')
     )
-    
-    # Add order items
-    for item in data['cart_items']:
-        price = item.get('discount_price') or item.get('price', 0)
-        db.add_order_item(
-            order_id=order_id,
-            product_id=item['product_id'],
-            quantity=item['quantity'],
-            price=price
+    if order_id is None:
+        await callback.answer(
+            "Ba'zi mahsulotlar omborda yetarli emas!" if language == 'uz' 
+            else "Некоторых товаров недостаточно на складе!",
+            show_alert=True
         )
-        
-        # Update stock
-        product = db.get_product(item['product_id'])
-        if product:
-            new_stock = product.get('stock_quantity', 0) - item['quantity']
-            db.update_product(item['product_id'], stock_quantity=new_stock)
-    
-    # Clear cart
-    db.clear_cart(callback.from_user.id)
+        return
     
     await callback.message.edit_text(
         f"{get_text('order_placed', language)}\n\n🆔 #{order_id}"
@@ -367,6 +372,7 @@ async def cancel_order(callback: CallbackQuery, state: FSMContext):
     language = user.get('language', 'uz')
     
     await state.clear()
+    db.release_stock(callback.from_user.id)
     await callback.message.edit_text(get_text('cancelled', language))
     await callback.message.answer(
         get_text('main_menu', language),
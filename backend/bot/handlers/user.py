@@ -10,7 +10,7 @@ from bot.keyboards import (
     get_main_menu_keyboard, get_language_keyboard, get_phone_keyboard,
     get_categories_keyboard, get_products_keyboard, get_product_detail_keyboard,
     get_cart_keyboard, get_cart_item_keyboard, get_back_keyboard,
-    get_cancel_keyboard
+    get_cancel_keyboard, PRODUCT_SORTS
 )
 from bot.utils import (
     get_text, format_phone, validate_phone, format_product_details,
@@ -119,25 +119,47 @@ async def show_catalog(message: Message):
         reply_markup=get_categories_keyboard(categories, language)
     )
 
-# Category selection callback
-@router.callback_query(F.data.startswith("cat_"))
-async def show_category_products(callback: CallbackQuery):
-    """Show products in selected category"""
+async def send_category_products(callback: CallbackQuery, category_id: int, sort: str = 'newest',
+                                  filters: str = '', page: int = 0):
+    """Show sorted/filtered products of a category"""
     user = db.get_user(callback.from_user.id)
     language = user.get('language', 'uz')
     
-    category_id = int(callback.data.split('_')[1])
-    products = db.get_products_by_category(category_id)
+    products, _ = (db.ProductQuery()
+                   .category(category_id)
+                   .in_stock('s' in filters)
+                   .on_sale('d' in filters)
+                   .sort(sort)
+                   .fetch(['product_id', f'name_{language}', 'price', 'discount_price']))
     
     if not products:
         await callback.answer(get_text('no_products', language), show_alert=True)
-        return
+        if not filters:
+            return
     
     await callback.message.edit_text(
         get_text('catalog', language),
-        reply_markup=get_products_keyboard(products, language)
+        reply_markup=get_products_keyboard(products, language, page, category_id, sort, filters)
+    )
+    if products:
+        await callback.answer()
+
+# Category selection callback
+@router.callback_query(F.data.startswith("cat_"))
+async def show_category_products(callback: CallbackQuery):
+    """Show products in selected category"""
+    category_id = int(callback.data.split('_')[1])
+    await send_category_products(callback, category_id)
+
+# Category sort/filter/page callback
+@router.callback_query(F.data.startswith("catf_"))
+async def show_filtered_category_products(callback: CallbackQuery):
+    """Show products in category with selected sort, filters and page"""
+    _, category_id, sort_index, filters, page = callback.data.split('_')
+    await send_category_products(
+        callback, int(category_id), PRODUCT_SORTS[int(sort_index)],
+        filters.strip('-'), int(page)
     )
-    await callback.answer()
 
 # Product detail callback
 @router.callback_query(F.data.startswith("prod_"))
@@ -186,14 +208,14 @@ async def add_to_cart(callback: CallbackQuery):
     language = user.get('language', 'uz')
     
     product_id = int(callback.data.split('_')[2])
-    product = db.get_product(product_id)
+    available = db.get_available_stock(product_id)
     
-    if not product:
+    if available is None:
         await callback.answer(get_text('error', language), show_alert=True)
         return
     
-    # Check stock
-    if product.get('stock_quantity', 0) <= 0:
+    # Check stock (not counting units held by other checkouts)
+    if available <= 0:
         await callback.answer(
             "Omborda yo'q!" if language == 'uz' else "Нет в наличии!",
             show_alert=True
@@ -314,7 +336,7 @@ async def increase_cart_item(callback: CallbackQuery):
         
         # Check stock
         product = db.get_product(current_item['product_id'])
-        if product and new_quantity <= product.get('stock_quantity', 0):
+        if product and new_quantity <= product.get('stock_quantity', 0) - product.get('reserved_quantity', 0):
             db.update_cart_quantity(cart_id, new_quantity)
             await callback.answer("✅")
         else:
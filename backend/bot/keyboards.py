@@ -114,9 +114,21 @@ def get_categories_keyboard(categories: List[Dict], language: str = 'uz') -> Inl
     builder.adjust(2)
     return builder.as_markup()
 
+# Product sorts offered in the catalog (index is used in callback data)
+PRODUCT_SORTS = ['newest', 'price_asc', 'price_desc', 'popular']
+
+def get_catalog_callback(category_id: int, sort: str = 'newest', filters: str = '', page: int = 0) -> str:
+    """Build callback data for a filtered category listing (parsed by catf_ handler)"""
+    return f"catf_{category_id}_{PRODUCT_SORTS.index(sort)}_{filters or '-'}_{page}"
+
 # Products keyboard
-def get_products_keyboard(products: List[Dict], language: str = 'uz', page: int = 0) -> InlineKeyboardMarkup:
-    """Get products inline keyboard"""
+def get_products_keyboard(products: List[Dict], language: str = 'uz', page: int = 0,
+                          category_id: int = None, sort: str = 'newest',
+                          filters: str = '') -> InlineKeyboardMarkup:
+    """
+    Get products inline keyboard
+    With category_id a sort/filter row is added (filters: 's' in stock, 'd' on sale).
+    """
     builder = InlineKeyboardBuilder()
     
     # Products per page
@@ -130,26 +142,57 @@ def get_products_keyboard(products: List[Dict], language: str = 'uz', page: int
         price = product['discount_price'] if product['discount_price'] else product['price']
         builder.button(text=f"{name} - {price:,.0f} so'm", callback_data=f"prod_{product['product_id']}")
     
+    def page_callback(target: int) -> str:
+        if category_id is None:
+            return f"page_{target}"
+        return get_catalog_callback(category_id, sort, filters, target)
+    
     # Pagination buttons
     nav_buttons = []
     if page > 0:
         texts = {'uz': '⬅️ Orqaga', 'ru': '⬅️ Назад'}
         nav_buttons.append(InlineKeyboardButton(text=texts.get(language, texts['uz']), 
-                                               callback_data=f"page_{page-1}"))
+                                               callback_data=page_callback(page - 1)))
     
     if end < len(products):
         texts = {'uz': 'Keyingi ➡️', 'ru': 'Далее ➡️'}
         nav_buttons.append(InlineKeyboardButton(text=texts.get(language, texts['uz']), 
-                                               callback_data=f"page_{page+1}"))
+                                               callback_data=page_callback(page + 1)))
     
     builder.adjust(1)
+    markup = builder.as_markup()
     
     if nav_buttons:
-        markup = builder.as_markup()
         markup.inline_keyboard.append(nav_buttons)
-        return markup
     
-    return builder.as_markup()
+    # Sort and filter buttons
+    if category_id is not None:
+        texts = {
+            'uz': {
+                'newest': '🔃 Yangilari', 'price_asc': '🔃 Arzonroq', 'price_desc': '🔃 Qimmatroq',
+                'popular': '🔃 Ommabop', 'in_stock': 'Mavjud', 'on_sale': 'Chegirma'
+            },
+            'ru': {
+                'newest': '🔃 Новые', 'price_asc': '🔃 Дешевле', 'price_desc': '🔃 Дороже',
+                'popular': '🔃 Популярные', 'in_stock': 'В наличии', 'on_sale': 'Скидки'
+            }
+        }
+        t = texts.get(language, texts['uz'])
+        
+        def toggle(flag: str) -> str:
+            return filters.replace(flag, '') if flag in filters else filters + flag
+        
+        next_sort = PRODUCT_SORTS[(PRODUCT_SORTS.index(sort) + 1) % len(PRODUCT_SORTS)]
+        markup.inline_keyboard.append([
+            InlineKeyboardButton(text=t[sort],
+                                 callback_data=get_catalog_callback(category_id, next_sort, filters)),
+            InlineKeyboardButton(text=f"{'✅' if 's' in filters else '📦'} {t['in_stock']}",
+                                 callback_data=get_catalog_callback(category_id, sort, toggle('s'))),
+            InlineKeyboardButton(text=f"{'✅' if 'd' in filters else '🏷'} {t['on_sale']}",
+                                 callback_data=get_catalog_callback(category_id, sort, toggle('d')))
+        ])
+    
+    return markup
 
 # Product detail keyboard
 def get_product_detail_keyboard(product_id: int, language: str = 'uz', is_favorite: bool = False) -> InlineKeyboardMarkup:
@@ -0,0 +1,28 @@
+"""
+Update correlation ids
+Every log record written while the dispatcher handles an update carries its
+update_id (see logging_setup), in polling and webhook mode alike.
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from logging_setup import update_id
+
+
+class UpdateContextMiddleware(BaseMiddleware):
+    """Outer update middleware binding update_id for the handler's logs"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> Any:
+        token = update_id.set(event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            update_id.reset(token)
+
+
+def setup_update_logging(dispatcher: Dispatcher):
+    """Tag the dispatcher's log records with the update being handled"""
+    dispatcher.update.outer_middleware(UpdateContextMiddleware())
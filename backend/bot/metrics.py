@@ -0,0 +1,66 @@
+"""
+Prometheus metrics for the Telegram bot
+HandlerMetricsMiddleware times every message and callback handler and counts
+the ones that raise; TelegramMetricsMiddleware does the same for outgoing
+Bot API calls, labelled by method.
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+
+import metrics
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Module-qualified name of the handler that matched, e.g. user.show_catalog"""
+    handler = data.get('handler')
+    callback = getattr(handler, 'callback', None)
+    if callback is None:
+        return 'unknown'
+    return f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware recording handler latency and errors"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        name = handler_name(data)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            metrics.bot_handler_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.bot_updates.observe(name, value=time.perf_counter() - start)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Session middleware recording Bot API call latency and errors"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.telegram_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.telegram_requests.observe(name, value=time.perf_counter() - start)
+
+
+def setup_bot_metrics(bot: Bot, dispatcher: Dispatcher = None):
+    """Instrument bot's API calls and, if given, the dispatcher's handlers"""
+    bot.session.middleware(TelegramMetricsMiddleware())
+    if dispatcher is not None:
+        # Inner middlewares run once a handler matched, in every nested router
+        dispatcher.message.middleware(HandlerMetricsMiddleware())
+        dispatcher.callback_query.middleware(HandlerMetricsMiddleware())
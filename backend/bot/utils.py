@@ -3,9 +3,9 @@ import string
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List
 import os
-from PIL import Image
 import io
-from config import CODE_LENGTH, TIMEZONE_OFFSET, UPLOAD_DIR, MAX_FILE_SIZE
+from config import CODE_LENGTH, TIMEZONE_OFFSET, MAX_FILE_SIZE
+from services.blob_store import get_blob_store
 
 # Text translations
 TEXTS = {
@@ -251,20 +251,17 @@ def format_product_details(product: Dict, language: str = 'uz') -> str:
     return '\n'.join(lines)
 
 async def save_image(file_content: bytes, filename: str) -> Optional[str]:
-    """Save uploaded image and return path"""
+    """Save uploaded image to the blob store and return path"""
+    # Pillow is only needed by admin uploads, so it is not imported at startup
+    from PIL import Image
+    
     try:
-        # Create uploads directory if not exists
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        
         # Check file size
         if len(file_content) > MAX_FILE_SIZE:
             return None
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = os.path.splitext(filename)[1] or '.jpg'
-        new_filename = f"{timestamp}_{random.randint(1000, 9999)}{ext}"
-        filepath = os.path.join(UPLOAD_DIR, new_filename)
+        ext = os.path.splitext(filename)[1].lower() or '.jpg'
+        image_format = Image.registered_extensions().get(ext, 'JPEG')
         
         # Open and resize image
         image = Image.open(io.BytesIO(file_content))
@@ -278,10 +275,11 @@ async def save_image(file_content: bytes, filename: str) -> Optional[str]:
         if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
             image.thumbnail(max_size, Image.Resampling.LANCZOS)
         
-        # Save image
-        image.save(filepath, quality=85, optimize=True)
+        # Encode image and store by content hash (identical photos share one file)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=85, optimize=True)
         
-        return filepath
+        return get_blob_store().put_bytes(buffer.getvalue(), ext)
     
     except Exception as e:
         print(f"Error saving image: {e}")
@@ -364,6 +362,8 @@ def format_statistics(stats: Dict, language: str = 'uz') -> str:
 
 def is_valid_image(file_content: bytes) -> bool:
     """Check if file is a valid image"""
+    from PIL import Image
+    
     try:
         image = Image.open(io.BytesIO(file_content))
         image.verify()
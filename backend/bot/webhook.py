@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import secrets
+import time
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.types.update import UpdateTypeLookupError
+from fastapi import APIRouter, Request, Response
+
+import metrics
+from config import WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_QUEUE_SIZE, WEBHOOK_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def update_owner(update: Update) -> int:
+    """User (or chat) an update belongs to, used to keep its updates in order"""
+    try:
+        event = update.event
+    except UpdateTypeLookupError:
+        return update.update_id
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, 'chat', None)
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Bounded queue feeding webhook updates to the dispatcher
+    Updates are sharded by user over `concurrency` workers: one user's
+    updates are handled in order (FSM steps stay consistent), different users
+    concurrently. When a shard is full submit() refuses the update and the
+    webhook answers 503, so Telegram keeps it and redelivers later instead of
+    the process buffering without limit.
+    """
+
+    def __init__(self, bot: Bot, dispatcher: Dispatcher,
+                 maxsize: int = WEBHOOK_QUEUE_SIZE, concurrency: int = WEBHOOK_CONCURRENCY):
+        """Initialize queue with maxsize updates split over concurrency workers"""
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.concurrency = concurrency
+        shard_size = max(1, maxsize // concurrency)
+        self._shards: List[asyncio.Queue] = [asyncio.Queue(maxsize=shard_size) for _ in range(concurrency)]
+        self._workers: List[asyncio.Task] = []
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        metrics.track_queue('webhook_updates', self.pending)
+
+    def submit(self, update: Update) -> bool:
+        """Enqueue update, False if its shard is full"""
+        shard = self._shards[update_owner(update) % self.concurrency]
+        try:
+            shard.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    def pending(self) -> int:
+        """Number of updates waiting for a worker"""
+        return sum(shard.qsize() for shard in self._shards)
+
+    async def process(self, update: Update, enqueued_at: float):
+        """Run dispatcher on one update"""
+        await self.dispatcher.feed_update(self.bot, update)
+
+    async def _work(self, shard: asyncio.Queue):
+        """Worker loop handling updates of one shard"""
+        while True:
+            update, enqueued_at = await shard.get()
+            try:
+                await self.process(update, enqueued_at)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Webhook update {update.update_id} failed: {e}")
+            finally:
+                shard.task_done()
+
+    async def start(self):
+        """Start worker tasks"""
+        self._workers = [
+            asyncio.create_task(self._work(shard), name=f"webhook_worker_{i}")
+            for i, shard in enumerate(self._shards)
+        ]
+
+    async def join(self):
+        """Wait until all queued updates are handled"""
+        await asyncio.gather(*[shard.join() for shard in self._shards])
+
+    async def stop(self, timeout: Optional[float] = 10):
+        """Finish queued updates (up to timeout seconds) and stop workers"""
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.pending()} unprocessed webhook updates")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+def create_webhook_router(updates: UpdateQueue, path: str = WEBHOOK_PATH,
+                          secret_token: str = WEBHOOK_SECRET_TOKEN) -> APIRouter:
+    """Router receiving Telegram webhook updates on the secret path"""
+    router = APIRouter()
+
+    @router.post(path, include_in_schema=False)
+    async def telegram_webhook(request: Request):
+        """Validate and enqueue one update; answers before it is handled"""
+        received = request.headers.get(SECRET_TOKEN_HEADER, '').encode()
+        if not secrets.compare_digest(received, secret_token.encode()):
+            return Response(status_code=401)
+        
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': updates.bot})
+        except ValueError:
+            return Response(status_code=400)
+        
+        if not updates.submit(update):
+            return Response(status_code=503, headers={'Retry-After': '1'})
+        return Response(status_code=200)
+
+    return router
@@ -6,12 +6,74 @@ SUPER_ADMIN_ID = 5895427105
 DB_NAME = 'zarbdor_store.db'
 API_HOST = '0.0.0.0'
 API_PORT = 8000
-API_SECRET_KEY = secrets.token_urlsafe(32)
+# Set API_SECRET_KEY in the environment so every process (API workers, bot) signs tokens with the same key
+API_SECRET_KEY = os.getenv('API_SECRET_KEY') or secrets.token_urlsafe(32)
+API_WORKERS = int(os.getenv('API_WORKERS', '1'))
 JWT_EXPIRE_HOURS = 720
 CODE_EXPIRE_MINUTES = 5
 CODE_LENGTH = 4
 UPLOAD_DIR = 'uploads'
 MAX_FILE_SIZE = 10 * 1024 * 1024
 TIMEZONE_OFFSET = 5
-USERBOT_RECONNECT_INTERVAL = 60
+# Userbot pool (userbot/pool.py): per-account health checks, reconnect backoff and the longest
+# flood wait a verification code send waits out when every account is cooling down
+USERBOT_HEALTH_CHECK_INTERVAL = 60
+USERBOT_HEALTH_CHECK_TIMEOUT = 10
+USERBOT_RECONNECT_BACKOFF_MAX = 300
+USERBOT_MAX_FLOOD_WAIT = 10
+# Phones new to an account are imported as contacts in batches (userbot/peers.py): a batch
+# collects for USERBOT_CONTACT_IMPORT_DELAY seconds, up to USERBOT_CONTACT_IMPORT_BATCH phones
+USERBOT_CONTACT_IMPORT_DELAY = 0.05
+USERBOT_CONTACT_IMPORT_BATCH = 100
 BROADCAST_DELAY = 0.05
+UPLOAD_GC_INTERVAL = 6 * 60 * 60
+UPLOAD_GC_GRACE_SECONDS = 60 * 60
+CATALOG_CACHE_MAX_ENTRIES = 512
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+PRODUCTS_PAGE_DEFAULT_LIMIT = 20
+PRODUCTS_PAGE_MAX_LIMIT = 100
+EVENT_QUEUE_SIZE = 100
+CHAT_PAGE_DEFAULT_LIMIT = 50
+CHAT_PAGE_MAX_LIMIT = 200
+ORDER_EVENTS_MAX_WAIT = 30
+DB_BUSY_TIMEOUT = 10
+# Per-statement SQLite profiling (query_profiler.py): off unless DB_PROFILE_QUERIES=1
+DB_PROFILE_QUERIES = os.getenv('DB_PROFILE_QUERIES') == '1'
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '100'))
+DB_SLOW_QUERY_LOG = 'slow_queries.log'
+# Prometheus scrapes of /metrics send 'Authorization: Bearer <METRICS_TOKEN>'; unset, only loopback clients are served
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Logging (logging_setup.py): JSON lines in LOG_FILE, console as 'text' or 'json'
+LOG_FILE = 'zarbdor.log'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+LOG_ROTATE_INTERVAL = 24 * 60 * 60
+LOG_QUEUE_SIZE = 10000
+EVENT_RELAY_INTERVAL = 0.5
+SCHEDULER_LEASE_SECONDS = 60
+# Set by `main.py --mode api` for its uvicorn workers
+MULTIPROCESS = os.getenv('ZARBDOR_MULTIPROCESS') == '1'
+# Telegram updates: 'polling' or 'webhook' (needs WEBHOOK_BASE_URL, the public HTTPS origin of the API)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+WEBHOOK_PATH = '/telegram/webhook/' + (os.getenv('WEBHOOK_PATH_SECRET') or secrets.token_urlsafe(16))
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN') or secrets.token_urlsafe(32)
+WEBHOOK_PORT = 8081
+WEBHOOK_QUEUE_SIZE = 1000
+WEBHOOK_CONCURRENCY = 8
+WEBHOOK_MAX_CONNECTIONS = 40
+FSM_STATE_TTL = 24 * 60 * 60
+FSM_CACHE_MAX_ENTRIES = 10000
+FSM_FLUSH_INTERVAL = 1.0
+FSM_SWEEP_INTERVAL = 60 * 60
+STOCK_RESERVATION_TTL = 15 * 60
+STOCK_RESERVATION_SWEEP_INTERVAL = 60
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_PENDING_TTL = 60
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+IDEMPOTENCY_SWEEP_INTERVAL = 60 * 60
+POPULARITY_REFRESH_INTERVAL = 10 * 60
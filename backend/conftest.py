@@ -0,0 +1,29 @@
+"""
+Shared pytest fixtures
+"""
+import sys
+import os
+from collections import OrderedDict
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+import database as db
+from api.cache import response_cache
+from services.event_hub import event_hub
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """
+    Empty database in tmp_path, initialized with the current schema; tests seed their own rows
+    Cached catalog bodies and the event hub's published event ids describe
+    the previous database (ids restart with a new one), so both are dropped.
+    """
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / 'test.db'))
+    monkeypatch.setattr(event_hub, '_recent', OrderedDict())
+    db.init_db()
+    response_cache.clear()
+    return db.DB_NAME
@@ -1,20 +1,78 @@
 import sqlite3
 import json
+import time
+import functools
+import inspect
+import types
+import zlib
+from contextvars import ContextVar
+from threading import Lock
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any, Tuple
-from config import DB_NAME, TIMEZONE_OFFSET
+from config import DB_NAME, TIMEZONE_OFFSET, DB_BUSY_TIMEOUT, SUPER_ADMIN_ID
+import metrics
+from query_profiler import ProfiledConnection, get_query_profiler
+
+# database.py function currently running (statements are counted against it)
+_current_function: ContextVar[Optional[str]] = ContextVar('db_function', default=None)
+
+def _count_statement(statement: str):
+    function = _current_function.get()
+    if function is not None:
+        metrics.db_queries.inc(function)
 
 def get_connection():
     """Create and return database connection"""
-    conn = sqlite3.connect(DB_NAME)
+    factory = ProfiledConnection if get_query_profiler().enabled else sqlite3.Connection
+    conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT, factory=factory)
     conn.row_factory = sqlite3.Row
+    conn.set_trace_callback(_count_statement)
     return conn
 
+def _add_column_if_missing(cursor, table: str, column: str, definition: str) -> bool:
+    """Add column to an existing table (lightweight migration), True if it was added"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row['name'] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+    return False
+
+def _schema_version() -> int:
+    """
+    Fingerprint of the schema init_db creates: a checksum of its SQL and
+    column definitions, so any change to init_db yields a new version
+    """
+    constants = [const for const in init_db.__code__.co_consts if not isinstance(const, types.CodeType)]
+    return zlib.crc32(repr((constants, CATALOG_SYNC_TABLES)).encode()) & 0x7fffffff or 1
+
+def _seed_super_admin(cursor):
+    """Insert SUPER_ADMIN_ID from config as super admin (kept if it already exists)"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO admins (admin_id, role, is_active) 
+        VALUES (?, 'super_admin', 1)
+    ''', (SUPER_ADMIN_ID,))
+
 def init_db():
-    """Initialize database with all required tables"""
+    """
+    Initialize database with all required tables
+    A database already created by this version of init_db (PRAGMA user_version
+    holds its schema fingerprint) skips the DDL on restart; the super admin
+    from config is seeded either way.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
+    schema_version = _schema_version()
+    if cursor.execute('PRAGMA user_version').fetchone()[0] == schema_version:
+        _seed_super_admin(cursor)
+        conn.commit()
+        conn.close()
+        _close_monitor()
+        return
+    
+    # WAL lets the bot and API worker processes read while one of them writes
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -25,9 +83,13 @@ def init_db():
             phone TEXT UNIQUE,
             language TEXT DEFAULT 'uz',
             registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active INTEGER DEFAULT 1
+            is_active INTEGER DEFAULT 1,
+            favorites_version INTEGER DEFAULT 0,
+            favorites_updated_at TIMESTAMP
         )
     ''')
+    _add_column_if_missing(cursor, 'users', 'favorites_version', 'INTEGER DEFAULT 0')
+    _add_column_if_missing(cursor, 'users', 'favorites_updated_at', 'TIMESTAMP')
     
     # Categories table
     cursor.execute('''
@@ -38,7 +100,9 @@ def init_db():
             description_uz TEXT,
             description_ru TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active INTEGER DEFAULT 1
+            is_active INTEGER DEFAULT 1,
+            version INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
@@ -57,9 +121,46 @@ def init_db():
             image_path TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             is_active INTEGER DEFAULT 1,
+            effective_price REAL,
+            sold_count INTEGER DEFAULT 0,
+            reserved_quantity INTEGER DEFAULT 0,
+            version INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (category_id) REFERENCES categories(category_id)
         )
     ''')
+    _add_column_if_missing(cursor, 'products', 'effective_price', 'REAL')
+    # Sum of active stock_reservations holds; available stock = stock_quantity - reserved_quantity
+    _add_column_if_missing(cursor, 'products', 'reserved_quantity', 'INTEGER DEFAULT 0')
+    if _add_column_if_missing(cursor, 'products', 'sold_count', 'INTEGER DEFAULT 0'):
+        cursor.execute('''
+            UPDATE products SET sold_count = (
+                SELECT COALESCE(SUM(quantity), 0) FROM order_items
+                WHERE order_items.product_id = products.product_id
+            )
+        ''')
+    
+    # Stored effective price (discount price when set, same rule as the bot/cart totals)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_effective_price_insert
+        AFTER INSERT ON products
+        BEGIN
+            UPDATE products SET effective_price = COALESCE(NULLIF(NEW.discount_price, 0), NEW.price)
+            WHERE product_id = NEW.product_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_effective_price_update
+        AFTER UPDATE OF price, discount_price ON products
+        BEGIN
+            UPDATE products SET effective_price = COALESCE(NULLIF(NEW.discount_price, 0), NEW.price)
+            WHERE product_id = NEW.product_id;
+        END
+    ''')
+    cursor.execute('''
+        UPDATE products SET effective_price = COALESCE(NULLIF(discount_price, 0), price)
+        WHERE effective_price IS NULL
+    ''')
     
     # Cart items table
     cursor.execute('''
@@ -68,11 +169,29 @@ def init_db():
             user_id INTEGER NOT NULL,
             product_id INTEGER NOT NULL,
             quantity INTEGER DEFAULT 1,
+            added_price REAL,
             added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(user_id),
             FOREIGN KEY (product_id) REFERENCES products(product_id)
         )
     ''')
+    # Effective price when the line was added (NULL for older rows), for price-changed checks
+    _add_column_if_missing(cursor, 'cart_items', 'added_price', 'REAL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cart_items_user ON cart_items(user_id, product_id)')
+    
+    # Stock holds placed while a checkout is in progress
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            reservation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            UNIQUE (user_id, product_id),
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_reservations_expires ON stock_reservations(expires_at)')
     
     # Neighborhoods table
     cursor.execute('''
@@ -81,7 +200,9 @@ def init_db():
             name_uz TEXT NOT NULL,
             name_ru TEXT NOT NULL,
             delivery_price REAL DEFAULT 0,
-            is_active INTEGER DEFAULT 1
+            is_active INTEGER DEFAULT 1,
+            version INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
@@ -106,6 +227,20 @@ def init_db():
         )
     ''')
     
+    # Order status transitions (event log for push/long-poll subscribers)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            previous_status TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders(order_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_events_user ON order_events(user_id, event_id)')
+    
     # Order items table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS order_items (
@@ -152,9 +287,53 @@ def init_db():
             sender_type TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             is_read INTEGER DEFAULT 0,
+            file_path TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+    _add_column_if_missing(cursor, 'chat_messages', 'file_path', 'TEXT')
+    
+    # Chat conversation summary (one row per user, maintained by create_message)
+    # *_read_message_id are read watermarks: the last message id each side has seen
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_conversations'")
+    conversations_exist = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_conversations (
+            user_id INTEGER PRIMARY KEY,
+            last_message_id INTEGER NOT NULL,
+            last_message_text TEXT,
+            last_sender_type TEXT,
+            last_message_at TIMESTAMP,
+            admin_unread_count INTEGER DEFAULT 0,
+            user_unread_count INTEGER DEFAULT 0,
+            admin_read_message_id INTEGER DEFAULT 0,
+            user_read_message_id INTEGER DEFAULT 0,
             FOREIGN KEY (user_id) REFERENCES users(user_id)
         )
     ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_conversations_admin_unread
+        ON chat_conversations(last_message_id) WHERE admin_unread_count > 0
+    ''')
+    if not conversations_exist:
+        # Build summaries from existing history, watermarks from the legacy is_read flags
+        cursor.execute('''
+            INSERT INTO chat_conversations (
+                user_id, last_message_id, last_message_text, last_sender_type, last_message_at,
+                admin_unread_count, user_unread_count, admin_read_message_id, user_read_message_id
+            )
+            SELECT cm.user_id, cm.message_id, cm.message_text, cm.sender_type, cm.created_at,
+                (SELECT COUNT(*) FROM chat_messages m
+                 WHERE m.user_id = cm.user_id AND m.sender_type = 'user' AND m.is_read = 0),
+                (SELECT COUNT(*) FROM chat_messages m
+                 WHERE m.user_id = cm.user_id AND m.sender_type = 'admin' AND m.is_read = 0),
+                (SELECT COALESCE(MAX(message_id), 0) FROM chat_messages m
+                 WHERE m.user_id = cm.user_id AND m.sender_type = 'user' AND m.is_read = 1),
+                (SELECT COALESCE(MAX(message_id), 0) FROM chat_messages m
+                 WHERE m.user_id = cm.user_id AND m.sender_type = 'admin' AND m.is_read = 1)
+            FROM chat_messages cm
+            WHERE cm.message_id = (SELECT MAX(message_id) FROM chat_messages WHERE user_id = cm.user_id)
+        ''')
     
     # Userbot settings table
     cursor.execute('''
@@ -167,6 +346,21 @@ def init_db():
             is_active INTEGER DEFAULT 0
         )
     ''')
+    # One row per account of the userbot pool (older databases hold at most one row)
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_userbot_settings_phone ON userbot_settings(phone)')
+    
+    # Telegram peers resolved by each userbot account (access hashes are only valid for that account)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS userbot_peers (
+            account_id INTEGER NOT NULL,
+            phone TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            access_hash INTEGER NOT NULL,
+            resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, phone),
+            FOREIGN KEY (account_id) REFERENCES userbot_settings(id)
+        )
+    ''')
     
     # Favorites table
     cursor.execute('''
@@ -192,14 +386,229 @@ def init_db():
         )
     ''')
     
-    # Insert super admin
+    # Upload blobs table (content-addressed files under UPLOAD_DIR)
     cursor.execute('''
-        INSERT OR IGNORE INTO admins (admin_id, role, is_active) 
-        VALUES (?, 'super_admin', 1)
-    ''', (5895427105,))
+        CREATE TABLE IF NOT EXISTS upload_blobs (
+            path TEXT PRIMARY KEY,
+            blob_hash TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            ref_count INTEGER DEFAULT 0,
+            stored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
     
+    # Indexes used to count blob references
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_image_path ON products(image_path)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_file_path ON chat_messages(file_path)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_user ON chat_messages(user_id, message_id)')
+    
+    # Indexes for keyset-paginated product listings (newest first)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_active_created
+        ON products(is_active, created_at, product_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_category_created
+        ON products(category_id, is_active, created_at, product_id)
+    ''')
+    
+    # Indexes for price and popularity sorted listings
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_active_price
+        ON products(is_active, effective_price, product_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_category_price
+        ON products(category_id, is_active, effective_price, product_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_active_sold
+        ON products(is_active, sold_count, product_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_category_sold
+        ON products(category_id, is_active, sold_count, product_id)
+    ''')
+    
+    # Per-row catalog version and change time for delta sync (soft-deleted rows act as tombstones)
+    for table, _ in CATALOG_SYNC_TABLES:
+        _add_column_if_missing(cursor, table, 'version', 'INTEGER DEFAULT 0')
+        if _add_column_if_missing(cursor, table, 'updated_at', 'TIMESTAMP'):
+            cursor.execute(f'UPDATE {table} SET updated_at = CURRENT_TIMESTAMP')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_version ON {table}(version)')
+    
+    # Catalog version (single row, bumped on every category/product/neighborhood write)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)')
+    
+    # Bot FSM states (compact JSON data, expired by updated_at)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            storage_key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)')
+    
+    # Idempotency keys (hashed key -> stored response, NULL status while in flight)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key BLOB PRIMARY KEY,
+            fingerprint BLOB NOT NULL,
+            status INTEGER,
+            content_type TEXT,
+            body BLOB,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at)')
+    
+    # Scheduler leases (one process runs each periodic job)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    
+    _seed_super_admin(cursor)
+    
+    cursor.execute(f'PRAGMA user_version = {schema_version}')
     conn.commit()
     conn.close()
+    
+    # Reload catalog version from this database on next access
+    _close_monitor()
+
+# Cross-process change detection
+_monitor = {'conn': None, 'db_name': None}
+_monitor_lock = Lock()
+
+def _monitor_connection() -> sqlite3.Connection:
+    """Long-lived connection used to watch for commits (caller holds _monitor_lock)"""
+    if _monitor['conn'] is None or _monitor['db_name'] != DB_NAME:
+        if _monitor['conn'] is not None:
+            _monitor['conn'].close()
+        conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _monitor['conn'] = conn
+        _monitor['db_name'] = DB_NAME
+        # data_version values are only comparable on the same connection
+        _catalog_state['version'] = None
+    return _monitor['conn']
+
+def _close_monitor():
+    """Close monitor connection and forget cached catalog version"""
+    with _monitor_lock:
+        if _monitor['conn'] is not None:
+            _monitor['conn'].close()
+        _monitor['conn'] = None
+        _monitor['db_name'] = None
+        _catalog_state['version'] = None
+
+def get_data_version() -> int:
+    """
+    Get SQLite data_version as seen by this process
+    Changes whenever any other connection, in this or another process,
+    commits to the database.
+    """
+    with _monitor_lock:
+        return _monitor_connection().execute('PRAGMA data_version').fetchone()[0]
+
+# Catalog version functions
+_catalog_state = {'version': None, 'updated_at': None, 'data_version': None}
+
+# Catalog tables synced to clients: (table, primary key)
+CATALOG_SYNC_TABLES = (
+    ('categories', 'category_id'),
+    ('products', 'product_id'),
+    ('neighborhoods', 'neighborhood_id'),
+)
+
+def _bump_catalog_version(cursor) -> int:
+    """
+    Increment catalog version inside the caller's transaction
+    The in-memory version is only dropped, not set: the transaction may
+    still roll back, which leaves PRAGMA data_version unchanged. The next
+    get_catalog_version() re-reads whatever was committed.
+    """
+    cursor.execute('''
+        UPDATE catalog_version
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+    ''')
+    cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+    _catalog_state['version'] = None
+    return cursor.fetchone()['version']
+
+def _touch_catalog_row(cursor, table: str, key_column: str, key: int):
+    """Bump catalog version and stamp the changed row with it"""
+    version = _bump_catalog_version(cursor)
+    cursor.execute(
+        f'UPDATE {table} SET version = ?, updated_at = CURRENT_TIMESTAMP WHERE {key_column} = ?',
+        (version, key)
+    )
+
+def _touch_catalog_rows(cursor, table: str, key_column: str, keys: List[int]):
+    """Bump catalog version once and stamp all changed rows with it (no-op without keys)"""
+    if not keys:
+        return
+    version = _bump_catalog_version(cursor)
+    placeholders = ', '.join('?' * len(keys))
+    cursor.execute(
+        f'UPDATE {table} SET version = ?, updated_at = CURRENT_TIMESTAMP WHERE {key_column} IN ({placeholders})',
+        [version] + list(keys)
+    )
+
+def get_catalog_version() -> Tuple[int, str]:
+    """
+    Get catalog version and last change time
+    Served from memory; the row is only re-read after a commit by any
+    connection (e.g. an admin edit in another API worker or the bot process).
+    """
+    with _monitor_lock:
+        conn = _monitor_connection()
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if _catalog_state['version'] is None or _catalog_state['data_version'] != data_version:
+            row = conn.execute('SELECT version, updated_at FROM catalog_version WHERE id = 1').fetchone()
+            _catalog_state['version'] = row['version']
+            _catalog_state['updated_at'] = row['updated_at']
+            _catalog_state['data_version'] = data_version
+        return _catalog_state['version'], _catalog_state['updated_at']
+
+def get_catalog_changes(since: int = 0) -> Dict:
+    """
+    Get catalog rows changed after catalog version since
+    Active rows are returned in full, deactivated (soft deleted) rows as ids only.
+    since=0 (or a version newer than the database) returns the whole active catalog.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Read the version first so rows changed meanwhile are sent again next time, never skipped
+    cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+    version = cursor.fetchone()['version']
+    full = since <= 0 or since > version
+    
+    changes = {'version': version, 'full': full, 'deleted': {}}
+    for table, key_column in CATALOG_SYNC_TABLES:
+        if full:
+            cursor.execute(f'SELECT * FROM {table} WHERE is_active = 1 ORDER BY {key_column}')
+        else:
+            cursor.execute(f'SELECT * FROM {table} WHERE version > ? ORDER BY {key_column}', (since,))
+        rows = [dict(row) for row in cursor.fetchall()]
+        changes[table] = [row for row in rows if row['is_active']]
+        changes['deleted'][table] = [row[key_column] for row in rows if not row['is_active']]
+    conn.close()
+    return changes
 
 # User functions
 def create_user(user_id: int, username: str = None, first_name: str = None, 
@@ -268,8 +677,9 @@ def create_category(name_uz: str, name_ru: str, description_uz: str = None,
         INSERT INTO categories (name_uz, name_ru, description_uz, description_ru)
         VALUES (?, ?, ?, ?)
     ''', (name_uz, name_ru, description_uz, description_ru))
-    conn.commit()
     category_id = cursor.lastrowid
+    _touch_catalog_row(cursor, 'categories', 'category_id', category_id)
+    conn.commit()
     conn.close()
     return category_id
 
@@ -301,8 +711,10 @@ def update_category(category_id: int, **kwargs) -> bool:
     fields = ', '.join([f'{k} = ?' for k in kwargs.keys()])
     values = list(kwargs.values()) + [category_id]
     cursor.execute(f'UPDATE categories SET {fields} WHERE category_id = ?', values)
-    conn.commit()
     success = cursor.rowcount > 0
+    if success:
+        _touch_catalog_row(cursor, 'categories', 'category_id', category_id)
+    conn.commit()
     conn.close()
     return success
 
@@ -324,8 +736,9 @@ def create_product(category_id: int, name_uz: str, name_ru: str, price: float,
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (category_id, name_uz, name_ru, description_uz, description_ru, 
           price, discount_price, stock_quantity, image_path))
-    conn.commit()
     product_id = cursor.lastrowid
+    _touch_catalog_row(cursor, 'products', 'product_id', product_id)
+    conn.commit()
     conn.close()
     return product_id
 
@@ -338,6 +751,18 @@ def get_product(product_id: int) -> Optional[Dict]:
     conn.close()
     return dict(row) if row else None
 
+def get_products_by_ids(product_ids: List[int]) -> Dict[int, Dict]:
+    """Get products by ID in one query, keyed by product_id"""
+    if not product_ids:
+        return {}
+    conn = get_connection()
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(product_ids))
+    cursor.execute(f'SELECT * FROM products WHERE product_id IN ({placeholders})', list(product_ids))
+    rows = cursor.fetchall()
+    conn.close()
+    return {row['product_id']: dict(row) for row in rows}
+
 def get_products_by_category(category_id: int) -> List[Dict]:
     """Get all products in a category"""
     conn = get_connection()
@@ -363,6 +788,120 @@ def get_all_products(active_only: bool = True) -> List[Dict]:
     conn.close()
     return [dict(row) for row in rows]
 
+PRODUCT_COLUMNS = (
+    'product_id', 'category_id', 'name_uz', 'name_ru', 'description_uz', 'description_ru',
+    'price', 'discount_price', 'stock_quantity', 'image_path', 'created_at', 'is_active',
+    'effective_price', 'sold_count', 'version', 'updated_at'
+)
+
+class ProductQuery:
+    """
+    Composable product listing query
+    Filters are chained and compiled into one SELECT served by the products indexes:
+        ProductQuery().category(3).price_range(10000, 50000).in_stock().sort('price_asc').fetch(limit=20)
+    """
+    
+    # sort name -> (column, direction); product_id breaks ties in the same direction
+    SORTS = {
+        'newest': ('created_at', 'DESC'),
+        'price_asc': ('effective_price', 'ASC'),
+        'price_desc': ('effective_price', 'DESC'),
+        'popular': ('sold_count', 'DESC'),
+    }
+    
+    def __init__(self, active_only: bool = True):
+        self._conditions = ['is_active = 1'] if active_only else []
+        self._params = []
+        self._sort = 'newest'
+        self._after = None
+    
+    def _where(self, condition: str, *params) -> 'ProductQuery':
+        self._conditions.append(condition)
+        self._params.extend(params)
+        return self
+    
+    def category(self, category_id: Optional[int]) -> 'ProductQuery':
+        """Only products in category"""
+        return self._where('category_id = ?', category_id) if category_id else self
+    
+    def search(self, text: Optional[str], language: str = 'uz') -> 'ProductQuery':
+        """Name contains text (in the given language)"""
+        if not text:
+            return self
+        return self._where(f"name_{'ru' if language == 'ru' else 'uz'} LIKE ?", f'%{text}%')
+    
+    def price_range(self, min_price: float = None, max_price: float = None) -> 'ProductQuery':
+        """Effective price within [min_price, max_price]"""
+        if min_price is not None:
+            self._where('effective_price >= ?', min_price)
+        if max_price is not None:
+            self._where('effective_price <= ?', max_price)
+        return self
+    
+    def in_stock(self, enabled: bool = True) -> 'ProductQuery':
+        """Only products with stock left"""
+        return self._where('stock_quantity > 0') if enabled else self
+    
+    def on_sale(self, enabled: bool = True) -> 'ProductQuery':
+        """Only discounted products"""
+        return self._where('effective_price < price') if enabled else self
+    
+    def sort(self, sort: str) -> 'ProductQuery':
+        """Order by one of SORTS"""
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        self._sort = sort
+        return self
+    
+    def after(self, position: Optional[Tuple[Any, int]]) -> 'ProductQuery':
+        """Continue after (sort value, product_id) returned by a previous fetch"""
+        self._after = position
+        return self
+    
+    def fetch(self, columns: List[str] = None, limit: int = None
+              ) -> Tuple[List[Dict], Optional[Tuple[Any, int]]]:
+        """
+        Run the query selecting only the given columns
+        Returns rows and the position to continue from (None on the last page).
+        """
+        columns = list(columns or PRODUCT_COLUMNS)
+        unknown = set(columns) - set(PRODUCT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown product columns: {', '.join(sorted(unknown))}")
+        
+        sort_column, direction = self.SORTS[self._sort]
+        # Sort keys are always selected so the next position can be computed
+        selected = columns + [c for c in (sort_column, 'product_id') if c not in columns]
+        
+        conditions = list(self._conditions)
+        params = list(self._params)
+        if self._after:
+            operator = '<' if direction == 'DESC' else '>'
+            conditions.append(f'({sort_column}, product_id) {operator} (?, ?)')
+            params.extend(self._after)
+        
+        query = f'''
+            SELECT {', '.join(selected)} FROM products
+            WHERE {' AND '.join(conditions) or '1 = 1'}
+            ORDER BY {sort_column} {direction}, product_id {direction}
+        '''
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+        
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        next_after = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = (rows[-1][sort_column], rows[-1]['product_id'])
+        
+        return [{c: row[c] for c in columns} for row in rows], next_after
+
 def update_product(product_id: int, **kwargs) -> bool:
     """Update product"""
     conn = get_connection()
@@ -370,8 +909,10 @@ def update_product(product_id: int, **kwargs) -> bool:
     fields = ', '.join([f'{k} = ?' for k in kwargs.keys()])
     values = list(kwargs.values()) + [product_id]
     cursor.execute(f'UPDATE products SET {fields} WHERE product_id = ?', values)
-    conn.commit()
     success = cursor.rowcount > 0
+    if success:
+        _touch_catalog_row(cursor, 'products', 'product_id', product_id)
+    conn.commit()
     conn.close()
     return success
 
@@ -412,9 +953,9 @@ def add_to_cart(user_id: int, product_id: int, quantity: int = 1) -> bool:
         ''', (new_quantity, existing['cart_id']))
     else:
         cursor.execute('''
-            INSERT INTO cart_items (user_id, product_id, quantity)
-            VALUES (?, ?, ?)
-        ''', (user_id, product_id, quantity))
+            INSERT INTO cart_items (user_id, product_id, quantity, added_price)
+            VALUES (?, ?, ?, (SELECT effective_price FROM products WHERE product_id = ?))
+        ''', (user_id, product_id, quantity, product_id))
     
     conn.commit()
     conn.close()
@@ -434,6 +975,41 @@ def get_cart_items(user_id: int) -> List[Dict]:
     conn.close()
     return [dict(row) for row in rows]
 
+def validate_cart(user_id: int) -> List[Dict]:
+    """
+    Check every cart line against the catalog in one query
+    Each line has cart_id, product_id, quantity, names, stock_quantity,
+    effective_price (current unit price), added_price, available (active and
+    enough stock not held by other checkouts) and price_changed (effective price differs from the price
+    when the line was added). Lines of deleted/inactive products are included
+    as unavailable.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT c.cart_id, c.product_id, c.quantity, c.added_price,
+               p.name_uz, p.name_ru,
+               COALESCE(p.stock_quantity, 0) AS stock_quantity,
+               p.effective_price,
+               COALESCE(p.is_active = 1 AND
+                        p.stock_quantity - p.reserved_quantity + COALESCE(r.quantity, 0) >= c.quantity, 0) AS available,
+               COALESCE(c.added_price IS NOT NULL AND c.added_price != p.effective_price, 0) AS price_changed
+        FROM cart_items c
+        LEFT JOIN products p ON p.product_id = c.product_id
+        LEFT JOIN stock_reservations r ON r.user_id = c.user_id AND r.product_id = c.product_id
+        WHERE c.user_id = ?
+        ORDER BY c.added_at DESC
+    ''', (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    lines = []
+    for row in rows:
+        line = dict(row)
+        line['available'] = bool(line['available'])
+        line['price_changed'] = bool(line['price_changed'])
+        lines.append(line)
+    return lines
+
 def update_cart_quantity(cart_id: int, quantity: int) -> bool:
     """Update cart item quantity"""
     conn = get_connection()
@@ -466,6 +1042,138 @@ def clear_cart(user_id: int) -> bool:
     conn.close()
     return True
 
+# Stock reservation functions
+def _release_reservations(cursor, where: str, params: tuple) -> int:
+    """Delete holds matching where clause and give their quantity back (inside caller's transaction)"""
+    cursor.execute(f'''
+        UPDATE products SET reserved_quantity = reserved_quantity - (
+            SELECT COALESCE(SUM(quantity), 0) FROM stock_reservations
+            WHERE product_id = products.product_id AND {where}
+        )
+        WHERE product_id IN (SELECT product_id FROM stock_reservations WHERE {where})
+    ''', params + params)
+    cursor.execute(f'DELETE FROM stock_reservations WHERE {where}', params)
+    return cursor.rowcount
+
+def _merge_lines(lines: List[Tuple[int, int]]) -> Dict[int, int]:
+    """Sum quantities of (product_id, quantity) lines per product"""
+    merged = {}
+    for product_id, quantity in lines:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return merged
+
+def get_available_stock(product_id: int) -> Optional[int]:
+    """Get stock not held by checkouts (None for unknown/inactive product)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT stock_quantity - reserved_quantity AS available FROM products
+        WHERE product_id = ? AND is_active = 1
+    ''', (product_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row['available'] if row else None
+
+def reserve_stock(user_id: int, lines: List[Tuple[int, int]], ttl: float) -> bool:
+    """
+    Hold stock of (product_id, quantity) lines for user's checkout for ttl seconds
+    Replaces the user's previous holds. All or nothing: False (and no holds)
+    if any product is inactive or lacks unheld stock.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        _release_reservations(cursor, 'user_id = ?', (user_id,))
+        expires_at = time.time() + ttl
+        lines = _merge_lines(lines)
+        for product_id, quantity in lines.items():
+            cursor.execute('''
+                UPDATE products SET reserved_quantity = reserved_quantity + ?
+                WHERE product_id = ? AND is_active = 1 AND stock_quantity - reserved_quantity >= ?
+            ''', (quantity, product_id, quantity))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            cursor.execute('''
+                INSERT INTO stock_reservations (user_id, product_id, quantity, expires_at)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, product_id, quantity, expires_at))
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def release_stock(user_id: int) -> int:
+    """Release user's holds (checkout cancelled), returns number of holds released"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    released = _release_reservations(cursor, 'user_id = ?', (user_id,))
+    conn.commit()
+    conn.close()
+    return released
+
+def _take_stock(cursor, user_id: int, lines: List[Tuple[int, int]]) -> bool:
+    """
+    Take (product_id, quantity) lines out of stock inside the caller's transaction
+    False as soon as a line can't be covered: the caller must roll back.
+    Only this changes stock_quantity, so only this touches the catalog rows;
+    holds (reserved_quantity) are not part of cached catalog bodies.
+    """
+    lines = _merge_lines(lines)
+    for product_id, quantity in lines.items():
+        cursor.execute('''
+            SELECT quantity FROM stock_reservations WHERE user_id = ? AND product_id = ?
+        ''', (user_id, product_id))
+        row = cursor.fetchone()
+        held = min(row['quantity'], quantity) if row else 0
+        cursor.execute('''
+            UPDATE products
+            SET stock_quantity = stock_quantity - ?, reserved_quantity = reserved_quantity - ?
+            WHERE product_id = ? AND stock_quantity - reserved_quantity >= ?
+        ''', (quantity, held, product_id, quantity - held))
+        if cursor.rowcount == 0:
+            return False
+        if row:
+            cursor.execute('''
+                UPDATE products SET reserved_quantity = reserved_quantity - ?
+                WHERE product_id = ?
+            ''', (row['quantity'] - held, product_id))
+            cursor.execute('''
+                DELETE FROM stock_reservations WHERE user_id = ? AND product_id = ?
+            ''', (user_id, product_id))
+    _release_reservations(cursor, 'user_id = ?', (user_id,))
+    _touch_catalog_rows(cursor, 'products', 'product_id', list(lines))
+    return True
+
+def commit_stock(user_id: int, lines: List[Tuple[int, int]]) -> bool:
+    """
+    Take ordered (product_id, quantity) lines out of stock when an order is placed
+    Quantity covered by the user's holds is converted; the rest must be
+    unheld stock. All or nothing: False (stock unchanged) if any line can't
+    be covered. Remaining holds of the user are released.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        if not _take_stock(cursor, user_id, lines):
+            conn.rollback()
+            return False
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+def release_expired_reservations() -> int:
+    """Release holds past their expiry (abandoned checkouts), returns number released"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    released = _release_reservations(cursor, 'expires_at < ?', (time.time(),))
+    conn.commit()
+    conn.close()
+    return released
+
 # Neighborhood functions
 def create_neighborhood(name_uz: str, name_ru: str, delivery_price: float = 0) -> int:
     """Create new neighborhood"""
@@ -475,8 +1183,9 @@ def create_neighborhood(name_uz: str, name_ru: str, delivery_price: float = 0) -
         INSERT INTO neighborhoods (name_uz, name_ru, delivery_price)
         VALUES (?, ?, ?)
     ''', (name_uz, name_ru, delivery_price))
-    conn.commit()
     neighborhood_id = cursor.lastrowid
+    _touch_catalog_row(cursor, 'neighborhoods', 'neighborhood_id', neighborhood_id)
+    conn.commit()
     conn.close()
     return neighborhood_id
 
@@ -508,8 +1217,10 @@ def update_neighborhood(neighborhood_id: int, **kwargs) -> bool:
     fields = ', '.join([f'{k} = ?' for k in kwargs.keys()])
     values = list(kwargs.values()) + [neighborhood_id]
     cursor.execute(f'UPDATE neighborhoods SET {fields} WHERE neighborhood_id = ?', values)
-    conn.commit()
     success = cursor.rowcount > 0
+    if success:
+        _touch_catalog_row(cursor, 'neighborhoods', 'neighborhood_id', neighborhood_id)
+    conn.commit()
     conn.close()
     return success
 
@@ -532,18 +1243,54 @@ def create_order(user_id: int, full_name: str, phone: str, address: str,
     conn.close()
     return order_id
 
-def add_order_item(order_id: int, product_id: int, quantity: int, price: float) -> bool:
-    """Add item to order"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def _insert_order_item(cursor, order_id: int, product_id: int, quantity: int, price: float):
+    """Insert order line inside the caller's transaction"""
     cursor.execute('''
         INSERT INTO order_items (order_id, product_id, quantity, price)
         VALUES (?, ?, ?, ?)
     ''', (order_id, product_id, quantity, price))
+
+def add_order_item(order_id: int, product_id: int, quantity: int, price: float) -> bool:
+    """Add item to order"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    _insert_order_item(cursor, order_id, product_id, quantity, price)
     conn.commit()
     conn.close()
     return True
 
+def place_order(user_id: int, items: List[Tuple[int, int, float]], full_name: str, phone: str,
+                address: str, total_amount: float, neighborhood_id: int = None,
+                delivery_price: float = 0, payment_method: str = 'cash',
+                notes: str = None) -> Optional[int]:
+    """
+    Check out in one transaction: take (product_id, quantity, price) items out of
+    stock (see commit_stock), create the order with its items and clear the cart
+    Returns order ID, or None (nothing changed) if stock can't cover the items.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        if not _take_stock(cursor, user_id, [(product_id, quantity) for product_id, quantity, _ in items]):
+            conn.rollback()
+            return None
+        cursor.execute('''
+            INSERT INTO orders (user_id, neighborhood_id, full_name, phone, address,
+                              total_amount, delivery_price, payment_method, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, neighborhood_id, full_name, phone, address,
+              total_amount, delivery_price, payment_method, notes))
+        order_id = cursor.lastrowid
+        for product_id, quantity, price in items:
+            _insert_order_item(cursor, order_id, product_id, quantity, price)
+        cursor.execute('DELETE FROM cart_items WHERE user_id = ?', (user_id,))
+        conn.commit()
+        return order_id
+    finally:
+        # Closing without commit rolls back (e.g. after an exception)
+        conn.close()
+
 def get_order(order_id: int) -> Optional[Dict]:
     """Get order by ID"""
     conn = get_connection()
@@ -553,6 +1300,33 @@ def get_order(order_id: int) -> Optional[Dict]:
     conn.close()
     return dict(row) if row else None
 
+def refresh_product_popularity() -> int:
+    """
+    Recount products.sold_count (the 'popular' sort) from order_items, returns number of products changed
+    Run out of band by a periodic job rather than per order line, so checkouts
+    don't lock product rows; a recount that changes any count bumps the catalog
+    version once, as sold_count is part of cached product bodies and ordering.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE products SET sold_count = totals.sold
+        FROM (
+            SELECT p.product_id, COALESCE(SUM(oi.quantity), 0) AS sold
+            FROM products p
+            LEFT JOIN order_items oi ON oi.product_id = p.product_id
+            GROUP BY p.product_id
+        ) AS totals
+        WHERE products.product_id = totals.product_id
+          AND products.sold_count IS NOT totals.sold
+        RETURNING products.product_id
+    ''')
+    changed = [row[0] for row in cursor.fetchall()]
+    _touch_catalog_rows(cursor, 'products', 'product_id', changed)
+    conn.commit()
+    conn.close()
+    return len(changed)
+
 def get_order_items(order_id: int) -> List[Dict]:
     """Get all items in an order"""
     conn = get_connection()
@@ -594,17 +1368,72 @@ def get_all_orders(status: str = None) -> List[Dict]:
 
 def update_order_status(order_id: int, status: str) -> bool:
     """Update order status"""
+    return change_order_status(order_id, status) is not None
+
+def change_order_status(order_id: int, status: str) -> Optional[Dict]:
+    """Update order status and record the transition, returns the event (None if no order)"""
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute('SELECT user_id, status FROM orders WHERE order_id = ?', (order_id,))
+    order = cursor.fetchone()
+    if not order:
+        conn.close()
+        return None
+    
     cursor.execute('''
         UPDATE orders 
         SET status = ?, updated_at = CURRENT_TIMESTAMP 
         WHERE order_id = ?
     ''', (status, order_id))
+    cursor.execute('''
+        INSERT INTO order_events (order_id, user_id, status, previous_status)
+        VALUES (?, ?, ?, ?)
+    ''', (order_id, order['user_id'], status, order['status']))
+    cursor.execute('SELECT * FROM order_events WHERE event_id = ?', (cursor.lastrowid,))
+    event = dict(cursor.fetchone())
     conn.commit()
-    success = cursor.rowcount > 0
     conn.close()
-    return success
+    return event
+
+def get_order_events(user_id: int, after_id: int = 0, limit: int = 100) -> List[Dict]:
+    """Get user's order status events after event id (oldest first)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM order_events
+        WHERE user_id = ? AND event_id > ?
+        ORDER BY event_id
+        LIMIT ?
+    ''', (user_id, after_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def get_last_order_event_id(user_id: int = None) -> int:
+    """Get id of user's (or anyone's) latest order event (0 if none)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    if user_id is None:
+        cursor.execute('SELECT COALESCE(MAX(event_id), 0) AS last_id FROM order_events')
+    else:
+        cursor.execute('SELECT COALESCE(MAX(event_id), 0) AS last_id FROM order_events WHERE user_id = ?', (user_id,))
+    last_id = cursor.fetchone()['last_id']
+    conn.close()
+    return last_id
+
+def get_order_events_after(after_id: int, limit: int = 500) -> List[Dict]:
+    """Get order events of all users after event id (oldest first)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM order_events
+        WHERE event_id > ?
+        ORDER BY event_id
+        LIMIT ?
+    ''', (after_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
 
 # Admin functions
 def create_admin(admin_id: int, username: str = None, role: str = 'admin') -> bool:
@@ -700,19 +1529,86 @@ def verify_code(phone: str, code: str) -> bool:
 
 # Chat functions
 def create_message(user_id: int, message_text: str, sender_type: str, 
-                  admin_id: int = None) -> int:
+                  admin_id: int = None, file_path: str = None) -> int:
     """Create chat message"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO chat_messages (user_id, admin_id, message_text, sender_type)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, admin_id, message_text, sender_type))
-    conn.commit()
+        INSERT INTO chat_messages (user_id, admin_id, message_text, sender_type, file_path)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, admin_id, message_text, sender_type, file_path))
     message_id = cursor.lastrowid
+    
+    # Update conversation summary; the message is unread for the other side
+    admin_unread = 1 if sender_type == 'user' else 0
+    cursor.execute('''
+        INSERT INTO chat_conversations (
+            user_id, last_message_id, last_message_text, last_sender_type, last_message_at,
+            admin_unread_count, user_unread_count
+        )
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            last_message_id = excluded.last_message_id,
+            last_message_text = excluded.last_message_text,
+            last_sender_type = excluded.last_sender_type,
+            last_message_at = excluded.last_message_at,
+            admin_unread_count = admin_unread_count + excluded.admin_unread_count,
+            user_unread_count = user_unread_count + excluded.user_unread_count
+    ''', (user_id, message_id, message_text, sender_type, admin_unread, 1 - admin_unread))
+    conn.commit()
     conn.close()
     return message_id
 
+def get_message(message_id: int) -> Optional[Dict]:
+    """Get chat message by ID"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM chat_messages WHERE message_id = ?', (message_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_last_message_id() -> int:
+    """Get id of the latest chat message (0 if none)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(message_id), 0) AS last_id FROM chat_messages')
+    last_id = cursor.fetchone()['last_id']
+    conn.close()
+    return last_id
+
+def get_messages_after(after_id: int, sender_type: str, limit: int = 500) -> List[Dict]:
+    """Get chat messages of all users from sender type after message id (oldest first)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM chat_messages
+        WHERE message_id > ? AND sender_type = ?
+        ORDER BY message_id
+        LIMIT ?
+    ''', (after_id, sender_type, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def _apply_read_watermarks(cursor, user_id: int, rows: List[Dict]):
+    """
+    Set is_read of the user's message rows from the conversation watermarks
+    The per-row chat_messages.is_read flags are no longer maintained
+    (mark_messages_read only moves the watermarks).
+    """
+    cursor.execute('''
+        SELECT admin_read_message_id, user_read_message_id
+        FROM chat_conversations WHERE user_id = ?
+    ''', (user_id,))
+    watermarks = cursor.fetchone()
+    admin_read, user_read = (watermarks['admin_read_message_id'], watermarks['user_read_message_id']) if watermarks else (0, 0)
+    
+    # Read state comes from the other side's watermark
+    for row in rows:
+        read_up_to = admin_read if row['sender_type'] == 'user' else user_read
+        row['is_read'] = 1 if row['message_id'] <= read_up_to else 0
+
 def get_user_messages(user_id: int) -> List[Dict]:
     """Get all messages for a user"""
     conn = get_connection()
@@ -722,31 +1618,113 @@ def get_user_messages(user_id: int) -> List[Dict]:
         WHERE user_id = ? 
         ORDER BY created_at ASC
     ''', (user_id,))
-    rows = cursor.fetchall()
+    rows = [dict(row) for row in cursor.fetchall()]
+    _apply_read_watermarks(cursor, user_id, rows)
     conn.close()
-    return [dict(row) for row in rows]
+    return rows
 
-def mark_messages_read(user_id: int, admin_id: int = None) -> bool:
-    """Mark messages as read"""
+def get_user_messages_page(user_id: int, limit: int, before_id: int = None,
+                           after_id: int = None) -> Tuple[List[Dict], bool]:
+    """
+    Get one page of a user's messages (oldest first)
+    Without cursor the newest page is returned, before_id pages to older messages
+    and after_id fetches messages newer than the last one the client has.
+    Returns messages and whether more exist in the paging direction.
+    """
+    conditions = ['user_id = ?']
+    params = [user_id]
+    if before_id is not None:
+        conditions.append('message_id < ?')
+        params.append(before_id)
+    if after_id is not None:
+        conditions.append('message_id > ?')
+        params.append(after_id)
+    order = 'ASC' if after_id is not None and before_id is None else 'DESC'
+    
     conn = get_connection()
     cursor = conn.cursor()
-    if admin_id:
-        cursor.execute('''
-            UPDATE chat_messages 
-            SET is_read = 1 
-            WHERE user_id = ? AND admin_id = ?
-        ''', (user_id, admin_id))
-    else:
-        cursor.execute('''
-            UPDATE chat_messages 
-            SET is_read = 1 
+    cursor.execute(f'''
+        SELECT * FROM chat_messages
+        WHERE {' AND '.join(conditions)}
+        ORDER BY message_id {order}
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = [dict(row) for row in cursor.fetchall()]
+    _apply_read_watermarks(cursor, user_id, rows)
+    conn.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if order == 'DESC':
+        rows.reverse()
+    return rows, has_more
+
+def mark_messages_read(user_id: int, admin_id: int = None, up_to_id: int = None) -> bool:
+    """
+    Mark conversation read up to message up_to_id (latest message if None)
+    With admin_id the admin side reads the user's messages, otherwise the user
+    reads the admin replies. Only the conversation's watermark row is updated.
+    """
+    side, other = ('admin', 'user') if admin_id else ('user', 'admin')
+    conn = get_connection()
+    cursor = conn.cursor()
+    if up_to_id is None:
+        cursor.execute(f'''
+            UPDATE chat_conversations
+            SET {side}_read_message_id = last_message_id, {side}_unread_count = 0
             WHERE user_id = ?
         ''', (user_id,))
+    else:
+        # Messages after the watermark stay unread (usually none, counted via index)
+        cursor.execute(f'''
+            UPDATE chat_conversations
+            SET {side}_read_message_id = MAX({side}_read_message_id, ?),
+                {side}_unread_count = (
+                    SELECT COUNT(*) FROM chat_messages m
+                    WHERE m.user_id = chat_conversations.user_id AND m.sender_type = ?
+                    AND m.message_id > MAX(chat_conversations.{side}_read_message_id, ?)
+                )
+            WHERE user_id = ?
+        ''', (up_to_id, other, up_to_id, user_id))
+    success = cursor.rowcount > 0
     conn.commit()
     conn.close()
-    return True
+    return success
+
+def get_conversation(user_id: int) -> Optional[Dict]:
+    """Get chat conversation summary for user"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM chat_conversations WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_unread_conversations() -> List[Dict]:
+    """Get users with messages unread by admins (support inbox), latest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT u.*, c.admin_unread_count AS unread_count, c.last_message_id,
+               c.last_message_text, c.last_sender_type, c.last_message_at
+        FROM chat_conversations c
+        JOIN users u ON u.user_id = c.user_id
+        WHERE c.admin_unread_count > 0
+        ORDER BY c.last_message_id DESC
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
 
 # Favorites functions
+def _bump_favorites_version(cursor, user_id: int):
+    """Increment user's favorites version inside the caller's transaction"""
+    cursor.execute('''
+        UPDATE users
+        SET favorites_version = favorites_version + 1, favorites_updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = ?
+    ''', (user_id,))
+
 def add_to_favorites(user_id: int, product_id: int) -> bool:
     """Add product to favorites"""
     conn = get_connection()
@@ -756,6 +1734,7 @@ def add_to_favorites(user_id: int, product_id: int) -> bool:
             INSERT INTO favorites (user_id, product_id)
             VALUES (?, ?)
         ''', (user_id, product_id))
+        _bump_favorites_version(cursor, user_id)
         conn.commit()
         return True
     except sqlite3.IntegrityError:
@@ -771,8 +1750,10 @@ def remove_from_favorites(user_id: int, product_id: int) -> bool:
         DELETE FROM favorites 
         WHERE user_id = ? AND product_id = ?
     ''', (user_id, product_id))
-    conn.commit()
     success = cursor.rowcount > 0
+    if success:
+        _bump_favorites_version(cursor, user_id)
+    conn.commit()
     conn.close()
     return success
 
@@ -790,6 +1771,15 @@ def get_user_favorites(user_id: int) -> List[Dict]:
     conn.close()
     return [dict(row) for row in rows]
 
+def get_user_favorite_ids(user_id: int) -> set:
+    """Get IDs of user's favorite products"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT product_id FROM favorites WHERE user_id = ?', (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return {row['product_id'] for row in rows}
+
 def is_favorite(user_id: int, product_id: int) -> bool:
     """Check if product is in favorites"""
     conn = get_connection()
@@ -838,30 +1828,308 @@ def delete_session(session_id: str) -> bool:
     conn.close()
     return success
 
-# Userbot settings functions
+# Userbot settings functions (one row per Telegram account of the userbot pool)
 def save_userbot_settings(api_id: int, api_hash: str, phone: str, 
                          session_string: str = None) -> bool:
-    """Save or update userbot settings"""
+    """Add userbot account, or update and reactivate the account with this phone"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM userbot_settings')
     cursor.execute('''
         INSERT INTO userbot_settings (api_id, api_hash, phone, session_string, is_active)
         VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT(phone) DO UPDATE SET
+            api_id = excluded.api_id,
+            api_hash = excluded.api_hash,
+            session_string = excluded.session_string,
+            is_active = 1
     ''', (api_id, api_hash, phone, session_string))
     conn.commit()
     conn.close()
     return True
 
 def get_userbot_settings() -> Optional[Dict]:
-    """Get userbot settings"""
+    """Get settings of the first active userbot account"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM userbot_settings WHERE is_active = 1 LIMIT 1')
+    cursor.execute('SELECT * FROM userbot_settings WHERE is_active = 1 ORDER BY id LIMIT 1')
     row = cursor.fetchone()
     conn.close()
     return dict(row) if row else None
 
+def get_all_userbot_settings(include_inactive: bool = False) -> List[Dict]:
+    """Get settings of all (active) userbot accounts"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    if include_inactive:
+        cursor.execute('SELECT * FROM userbot_settings ORDER BY id')
+    else:
+        cursor.execute('SELECT * FROM userbot_settings WHERE is_active = 1 ORDER BY id')
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def deactivate_userbot_account(account_id: int) -> bool:
+    """Take userbot account out of the pool (settings are kept)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE userbot_settings SET is_active = 0 WHERE id = ? AND is_active = 1', (account_id,))
+    conn.commit()
+    success = cursor.rowcount > 0
+    conn.close()
+    return success
+
+# Userbot peer cache functions
+def get_userbot_peer(account_id: int, phone: str) -> Optional[Dict]:
+    """Get Telegram user id and access hash resolved for phone by userbot account"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT user_id, access_hash FROM userbot_peers WHERE account_id = ? AND phone = ?',
+        (account_id, phone)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def save_userbot_peers(account_id: int, peers: List[Tuple[str, int, int]]) -> bool:
+    """Cache (phone, user_id, access_hash) peers resolved by userbot account"""
+    if not peers:
+        return True
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT OR REPLACE INTO userbot_peers (account_id, phone, user_id, access_hash, resolved_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', [(account_id, phone, user_id, access_hash) for phone, user_id, access_hash in peers])
+    conn.commit()
+    conn.close()
+    return True
+
+def delete_userbot_peer(account_id: int, phone: str) -> bool:
+    """Drop a cached peer that Telegram no longer accepts"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM userbot_peers WHERE account_id = ? AND phone = ?', (account_id, phone))
+    conn.commit()
+    success = cursor.rowcount > 0
+    conn.close()
+    return success
+
+# Upload blob functions
+def register_blob(path: str, blob_hash: str, size_bytes: int) -> bool:
+    """Register stored blob, refreshing stored_at if it already exists"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO upload_blobs (path, blob_hash, size_bytes)
+        VALUES (?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET stored_at = CURRENT_TIMESTAMP
+    ''', (path, blob_hash, size_bytes))
+    conn.commit()
+    conn.close()
+    return True
+
+def get_blob(path: str) -> Optional[Dict]:
+    """Get blob by path"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM upload_blobs WHERE path = ?', (path,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def refresh_blob_refcounts() -> int:
+    """Recount blob references from active products and chat messages"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE upload_blobs SET ref_count = (
+            SELECT COUNT(*) FROM products p
+            WHERE p.image_path = upload_blobs.path AND p.is_active = 1
+        ) + (
+            SELECT COUNT(*) FROM chat_messages cm
+            WHERE cm.file_path = upload_blobs.path
+        )
+    ''')
+    conn.commit()
+    updated = cursor.rowcount
+    conn.close()
+    return updated
+
+def get_orphan_blobs(min_age_seconds: int = 0) -> List[Dict]:
+    """Get unreferenced blobs older than min_age_seconds"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM upload_blobs
+        WHERE ref_count = 0 AND stored_at <= datetime('now', ?)
+    ''', (f'-{int(min_age_seconds)} seconds',))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def delete_blob(path: str, min_age_seconds: int = 0) -> bool:
+    """Delete blob record if it is still unreferenced and not stored again in the last min_age_seconds"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        DELETE FROM upload_blobs
+        WHERE path = ?
+        AND stored_at <= datetime('now', ?)
+        AND NOT EXISTS (SELECT 1 FROM products WHERE image_path = ? AND is_active = 1)
+        AND NOT EXISTS (SELECT 1 FROM chat_messages WHERE file_path = ?)
+    ''', (path, f'-{int(min_age_seconds)} seconds', path, path))
+    conn.commit()
+    success = cursor.rowcount > 0
+    conn.close()
+    return success
+
+def get_referenced_upload_paths() -> set:
+    """Get all file paths referenced by active products and chat messages"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT image_path AS path FROM products
+        WHERE image_path IS NOT NULL AND is_active = 1
+        UNION
+        SELECT file_path AS path FROM chat_messages WHERE file_path IS NOT NULL
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+    return {row['path'] for row in rows}
+
+# FSM state functions
+def get_fsm_state(storage_key: str) -> Optional[Dict]:
+    """Get stored FSM state row (state, data, updated_at)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT state, data, updated_at FROM fsm_states WHERE storage_key = ?', (storage_key,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def save_fsm_states(upserts: List[Tuple[str, Optional[str], str, float]], deletes: List[str]):
+    """Write back batch of FSM states in one transaction; upserts are (key, state, data, updated_at)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO fsm_states (storage_key, state, data, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(storage_key) DO UPDATE SET
+            state = excluded.state,
+            data = excluded.data,
+            updated_at = excluded.updated_at
+    ''', upserts)
+    cursor.executemany('DELETE FROM fsm_states WHERE storage_key = ?', [(key,) for key in deletes])
+    conn.commit()
+    conn.close()
+
+def delete_expired_fsm_states(before: float) -> int:
+    """Delete FSM states not touched since timestamp, returns number deleted"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM fsm_states WHERE updated_at < ?', (before,))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+# Idempotency key functions
+def claim_idempotency_key(key: bytes, fingerprint: bytes, ttl: float) -> Optional[Dict]:
+    """Claim key for a request in flight, returns None if claimed or the existing row otherwise"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = time.time()
+    cursor.execute('''
+        INSERT INTO idempotency_keys (key, fingerprint, expires_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET
+            fingerprint = excluded.fingerprint,
+            status = NULL,
+            content_type = NULL,
+            body = NULL,
+            expires_at = excluded.expires_at
+        WHERE idempotency_keys.expires_at < ?
+    ''', (key, fingerprint, now + ttl, now))
+    if cursor.rowcount == 1:
+        conn.commit()
+        conn.close()
+        return None
+    cursor.execute('SELECT fingerprint, status, content_type, body FROM idempotency_keys WHERE key = ?', (key,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_idempotency_key(key: bytes) -> Optional[Dict]:
+    """Get unexpired idempotency key row"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT fingerprint, status, content_type, body FROM idempotency_keys
+        WHERE key = ? AND expires_at >= ?
+    ''', (key, time.time()))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def complete_idempotency_key(key: bytes, status: int, content_type: Optional[str], body: bytes, ttl: float):
+    """Store response of a claimed key"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE idempotency_keys SET status = ?, content_type = ?, body = ?, expires_at = ?
+        WHERE key = ?
+    ''', (status, content_type, body, time.time() + ttl, key))
+    conn.commit()
+    conn.close()
+
+def release_idempotency_key(key: bytes):
+    """Forget a claimed key so the request can be retried"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL', (key,))
+    conn.commit()
+    conn.close()
+
+def delete_expired_idempotency_keys() -> int:
+    """Delete expired idempotency keys, returns number deleted"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (time.time(),))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+# Scheduler lease functions
+def acquire_lease(name: str, owner: str, ttl: float) -> bool:
+    """Take or renew lease on a periodic job, False if another owner holds an unexpired lease"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = time.time()
+    cursor.execute('''
+        INSERT INTO scheduler_leases (name, owner, expires_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            owner = excluded.owner,
+            expires_at = excluded.expires_at
+        WHERE scheduler_leases.owner = excluded.owner OR scheduler_leases.expires_at < ?
+    ''', (name, owner, now + ttl, now))
+    acquired = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return acquired
+
+def release_lease(name: str, owner: str) -> bool:
+    """Give up lease on a periodic job"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM scheduler_leases WHERE name = ? AND owner = ?', (name, owner))
+    released = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return released
+
 # Statistics functions
 def get_statistics() -> Dict:
     """Get general statistics"""
@@ -892,3 +2160,25 @@ def get_statistics() -> Dict:
         'pending_orders': pending_orders,
         'total_revenue': total_revenue
     }
+
+# Metrics: time every public function (and ProductQuery.fetch) for /metrics
+def _instrumented(name: str, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_function.set(name)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.db_calls.observe(name, value=time.perf_counter() - start)
+            _current_function.reset(token)
+    return wrapper
+
+for _name, _func in list(globals().items()):
+    if inspect.isfunction(_func) and _func.__module__ == __name__ and not _name.startswith('_') \
+            and _name not in ('get_connection', 'init_db'):
+        globals()[_name] = _instrumented(_name, _func)
+ProductQuery.fetch = _instrumented('ProductQuery.fetch', ProductQuery.fetch)
+
+# Slow-query log entries name the function that ran the statement
+get_query_profiler().context = _current_function.get
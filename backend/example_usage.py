@@ -129,7 +129,8 @@ async def example_userbot_status():
     
     print(f"Userbot active: {userbot.is_active()}")
     print(f"Userbot running: {userbot.is_running}")
-    print(f"Phone: {userbot.phone}")
+    for account in userbot.stats():
+        print(f"Account {account['account_id']}: {account}")
 
 
 async def main():
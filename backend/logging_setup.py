@@ -0,0 +1,196 @@
+"""
+Non-blocking logging pipeline
+Every logger writes into a bounded in-memory queue (QueueHandler); one
+listener thread formats records and does the file and console I/O, so a
+log call on the event loop never waits on the disk. The log file is JSON,
+one object per line, and is rotated both by size and on a fixed schedule.
+Records carry the request id of the HTTP request or the update id of the
+Telegram update being handled when they were logged, so one request's or
+update's lines can be grepped together.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+import metrics
+from config import LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_INTERVAL
+from config import LOG_QUEUE_SIZE, MULTIPROCESS
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Correlation ids of the work the current task is doing
+request_id: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+update_id: ContextVar[Optional[int]] = ContextVar('update_id', default=None)
+
+dropped_records = metrics.registry.counter(
+    'zarbdor_log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+# LogRecord attributes that are not user `extra=` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+_traceback_formatter = logging.Formatter()
+
+# ?token=<JWT> of WebSocket URLs (older clients) in uvicorn's access lines
+_QUERY_TOKEN = re.compile(r'([?&]token=)[^&\s"]+')
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the current request/update id (runs in the caller, before queueing)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        record.update_id = update_id.get()
+        return True
+
+
+class RedactTokenFilter(logging.Filter):
+    """Mask token query parameters in the request paths uvicorn logs (runs in the caller, before queueing)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name.startswith('uvicorn') and isinstance(record.args, tuple):
+            record.args = tuple(
+                _QUERY_TOKEN.sub(r'\1***', arg) if isinstance(arg, str) and 'token=' in arg else arg
+                for arg in record.args
+            )
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, ids, extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render tracebacks now: the listener runs later, in another thread.
+        # The root handler runs last for a record, so it is changed in place, not copied.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that also rolls over every `interval` seconds
+    (aligned to local midnight, so 86400 rotates at midnight). Backups are
+    numbered zarbdor.log.1 (newest) .. zarbdor.log.<backupCount>.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: int, encoding: str = 'utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.interval = interval
+        started = os.stat(filename).st_mtime if os.path.exists(filename) else datetime.now().timestamp()
+        self.rollover_at = self._next_rollover(started)
+
+    def _next_rollover(self, now: float) -> float:
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        return midnight + ((now - midnight) // self.interval + 1) * self.interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval and record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = self._next_rollover(datetime.now().timestamp())
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(log_file: Optional[str] = LOG_FILE, level: str = LOG_LEVEL,
+                  console_format: str = LOG_FORMAT) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through the queue to the console and log_file
+    API worker processes (MULTIPROCESS) log to the console only: several
+    processes rotating one file would lose lines.
+    """
+    global _listener
+    shutdown_logging()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if console_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    handlers = [console]
+    if log_file and not MULTIPROCESS:
+        file_handler = SizedTimedRotatingFileHandler(log_file, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_INTERVAL)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    queue_handler.addFilter(RedactTokenFilter())
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, NonBlockingQueueHandler) and handler.queue is _listener.queue:
+                root.removeHandler(handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def add_log_file(logger_name: str, filename: str, fmt: str = TEXT_FORMAT):
+    """Also write one logger's records to a file of its own (through the listener thread)"""
+    if _listener is None:
+        raise RuntimeError("setup_logging() first")
+    handler = logging.FileHandler(filename, encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter(fmt))
+    handler.addFilter(logging.Filter(logger_name))
+    _listener.handlers = _listener.handlers + (handler,)
@@ -1,36 +1,55 @@
 """
 ZarbdorUn E-commerce Platform - Main Entry Point
-Runs both Telegram Bot and FastAPI server concurrently
+Runs both Telegram Bot and FastAPI server concurrently (--mode all, default),
+or one of them for the split deployment:
+    python main.py --mode bot
+    python main.py --mode api --workers 4
+Set BOT_MODE=webhook (and WEBHOOK_BASE_URL) to receive Telegram updates via
+webhook instead of long polling.
 """
 
+import argparse
 import asyncio
+import atexit
 import logging
 import os
 import signal
 import sys
 from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
 
-import uvicorn
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from fastapi import FastAPI
 
-from config import BOT_TOKEN, API_HOST, API_PORT, UPLOAD_DIR
-from database import init_db
+import config
+from config import BOT_TOKEN, API_HOST, API_PORT, API_WORKERS, UPLOAD_DIR, UPLOAD_GC_INTERVAL
+from config import STOCK_RESERVATION_SWEEP_INTERVAL, IDEMPOTENCY_SWEEP_INTERVAL, POPULARITY_REFRESH_INTERVAL
+from config import BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_PORT, WEBHOOK_MAX_CONNECTIONS
+from logging_setup import setup_logging, shutdown_logging, add_log_file
+from database import init_db, release_expired_reservations, delete_expired_idempotency_keys, refresh_product_popularity
 from bot.handlers import setup_handlers
+from bot.fsm_storage import SQLiteStorage
+from bot.metrics import setup_bot_metrics
+from bot.log_context import setup_update_logging
+from services.blob_store import run_upload_gc
+from services.scheduler import run_periodic
 
+# uvicorn, FastAPI and the webhook route are imported only by the modes that serve HTTP,
+# so a polling bot starts without them
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+    from bot.webhook import UpdateQueue
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('zarbdor.log')
-    ]
-)
+
+# Configure logging (queued: file and console I/O happen on the listener thread)
+setup_logging()
+atexit.register(shutdown_logging)
 logger = logging.getLogger(__name__)
 
+# Slow SQLite statements (DB_PROFILE_QUERIES=1) also get a file of their own
+if config.DB_PROFILE_QUERIES:
+    add_log_file('database.slow_queries', config.DB_SLOW_QUERY_LOG, '%(asctime)s - %(message)s')
+
 
 # Global variables for bot and API
 bot = None
@@ -53,13 +72,17 @@ async def init_bot():
         # Create bot instance
         bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
         
-        # Create dispatcher
-        dp = Dispatcher()
+        # Create dispatcher (FSM states survive restarts in the database)
+        dp = Dispatcher(storage=SQLiteStorage())
         
         # Setup all handlers
         main_router = setup_handlers()
         dp.include_router(main_router)
         
+        # Handler and Bot API latency for /metrics, update ids in log records
+        setup_bot_metrics(bot, dp)
+        setup_update_logging(dp)
+        
         logger.info("✅ Telegram bot initialized successfully")
         return bot, dp
         
@@ -91,26 +114,64 @@ async def run_bot():
             await bot.session.close()
 
 
-async def run_api():
+async def run_bot_webhook(updates: 'UpdateQueue'):
+    """Run Telegram bot on updates posted to the webhook route"""
+    global bot, dp
+    
+    try:
+        await updates.start()
+        await dp.emit_startup(bot=bot)
+        
+        url = WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH
+        await bot.set_webhook(
+            url,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        logger.info(f"🤖 Telegram bot receiving updates via webhook ({updates.concurrency} workers)")
+        
+        await shutdown_event.wait()
+        
+    except asyncio.CancelledError:
+        logger.info("🛑 Bot webhook stopped")
+    except Exception as e:
+        logger.error(f"❌ Bot error: {e}")
+        raise
+    finally:
+        # Webhook stays registered: Telegram keeps updates until we are back
+        await updates.stop()
+        await dp.emit_shutdown(bot=bot)
+        if bot:
+            await bot.session.close()
+
+
+async def run_api(host: str = API_HOST, port: int = API_PORT, app: 'FastAPI' = None):
     """Run FastAPI server with uvicorn"""
     global api_server
+    import uvicorn
     
     try:
         # Import FastAPI app
-        from api.main import app
+        if app is None:
+            from api.main import app
         
         # Configure uvicorn
         config = uvicorn.Config(
             app=app,
-            host=API_HOST,
-            port=API_PORT,
+            host=host,
+            port=port,
             log_level="info",
-            access_log=True
+            access_log=True,
+            # Keep uvicorn's loggers on the root (queued) handlers instead of its own
+            log_config=None,
+            # Push frames are small JSON; per-connection deflate state triples idle WebSocket memory
+            ws_per_message_deflate=False
         )
         
         api_server = uvicorn.Server(config)
         
-        logger.info(f"🌐 Starting FastAPI server on {API_HOST}:{API_PORT}...")
+        logger.info(f"🌐 Starting FastAPI server on {host}:{port}...")
         
         # Run server
         await api_server.serve()
@@ -127,7 +188,7 @@ async def shutdown():
     logger.info("🛑 Shutting down gracefully...")
     
     # Stop bot
-    if dp:
+    if dp and BOT_MODE == "polling":
         await dp.stop_polling()
     
     if bot:
@@ -147,8 +208,36 @@ def handle_signal(sig):
     asyncio.create_task(shutdown())
 
 
-async def main():
-    """Main entry point - runs both bot and API concurrently"""
+def run_api_workers(host: str, port: int, workers: int):
+    """
+    Run FastAPI app under multiple uvicorn worker processes
+    Workers share the SQLite database (WAL), sign tokens with one key and
+    relay chat/order push events committed by other processes.
+    """
+    import uvicorn
+    
+    logger.info("📦 Initializing database...")
+    init_db()
+    create_uploads_directory()
+    
+    # Inherited by the worker processes
+    os.environ['ZARBDOR_MULTIPROCESS'] = '1'
+    os.environ['API_SECRET_KEY'] = config.API_SECRET_KEY
+    
+    logger.info(f"🌐 Starting FastAPI server on {host}:{port} with {workers} workers...")
+    uvicorn.run(
+        "api.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        log_level="info",
+        log_config=None,
+        ws_per_message_deflate=False
+    )
+
+
+async def main(mode: str = "all", host: str = API_HOST, port: int = API_PORT):
+    """Main entry point - runs bot and/or API concurrently"""
     try:
         # Initialize database
         logger.info("📦 Initializing database...")
@@ -173,10 +262,46 @@ async def main():
         logger.info("🚀 Starting ZarbdorUn E-commerce Platform...")
         logger.info("=" * 60)
         
+        if BOT_MODE == "webhook":
+            if not WEBHOOK_BASE_URL:
+                raise RuntimeError("BOT_MODE=webhook requires WEBHOOK_BASE_URL")
+            # Mount webhook route on the API app (or on its own listener for --mode bot)
+            from bot.webhook import UpdateQueue, create_webhook_router
+            updates = UpdateQueue(bot, dp)
+            if mode == "all":
+                from api.main import app as webhook_app
+            else:
+                # Bot-only listener also serves the bot's /metrics
+                from fastapi import FastAPI
+                from api.metrics import router as metrics_router
+                webhook_app = FastAPI()
+                webhook_app.include_router(metrics_router)
+            webhook_app.include_router(create_webhook_router(updates))
+            bot_task = run_bot_webhook(updates)
+        else:
+            webhook_app = None
+            bot_task = run_bot()
+        
         tasks = [
-            asyncio.create_task(run_bot(), name="telegram_bot"),
-            asyncio.create_task(run_api(), name="fastapi_server")
+            asyncio.create_task(bot_task, name="telegram_bot"),
+            asyncio.create_task(run_upload_gc(UPLOAD_GC_INTERVAL), name="upload_gc"),
+            asyncio.create_task(
+                run_periodic('stock_reservations', STOCK_RESERVATION_SWEEP_INTERVAL, release_expired_reservations),
+                name="stock_reservation_sweeper"
+            ),
+            asyncio.create_task(
+                run_periodic('idempotency_keys', IDEMPOTENCY_SWEEP_INTERVAL, delete_expired_idempotency_keys),
+                name="idempotency_key_sweeper"
+            ),
+            asyncio.create_task(
+                run_periodic('product_popularity', POPULARITY_REFRESH_INTERVAL, refresh_product_popularity),
+                name="popularity_refresher"
+            )
         ]
+        if mode == "all":
+            tasks.append(asyncio.create_task(run_api(host, port), name="fastapi_server"))
+        elif webhook_app is not None:
+            tasks.append(asyncio.create_task(run_api(host, WEBHOOK_PORT, webhook_app), name="webhook_server"))
         
         # Wait for shutdown event
         await shutdown_event.wait()
@@ -199,8 +324,23 @@ async def main():
         logger.info("👋 Application terminated")
 
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="ZarbdorUn E-commerce Platform")
+    parser.add_argument('--mode', choices=['all', 'bot', 'api'], default='all',
+                        help="all: bot and API in one process; bot: bot and scheduled jobs; api: API workers only")
+    parser.add_argument('--workers', type=int, default=API_WORKERS, help="uvicorn workers (--mode api)")
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.mode == "api":
+        run_api_workers(args.host, args.port, args.workers)
+        sys.exit(0)
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.mode, args.host, args.port))
     except KeyboardInterrupt:
         logger.info("👋 Goodbye!")
@@ -0,0 +1,282 @@
+"""
+In-process metrics in the Prometheus text exposition format
+
+A small dependency-free registry of counters, gauges and histograms with
+labels. Instruments are module-level objects updated from the API, bot and
+database code; render() produces the /metrics payload. Values are per
+process: with several API workers each worker reports its own.
+"""
+import math
+import time
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds (sub-millisecond DB calls up to slow handlers)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = Lock()
+
+    def _key(self, labels: Tuple) -> Tuple:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        return labels
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is computed on scrape by a callback"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self.callback is not None:
+            try:
+                values.update(self.callback())
+            except Exception:
+                pass
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observed values per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, *labels, value: float):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labels) -> int:
+        series = self._values.get(labels)
+        return series[-1] if series else 0
+
+    def time(self, *labels) -> '_Timer':
+        """Context manager observing elapsed seconds"""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(*self.labels, value=time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = (),
+              callback: Optional[Callable[[], Dict[Tuple, float]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+# Global registry instance
+registry = MetricsRegistry()
+
+# HTTP API
+http_requests = registry.histogram(
+    'zarbdor_http_request_duration_seconds', 'HTTP request latency by route template',
+    ('method', 'route', 'status'))
+http_in_flight = registry.gauge('zarbdor_http_requests_in_flight', 'HTTP requests being handled')
+
+# Database
+db_calls = registry.histogram(
+    'zarbdor_db_call_duration_seconds', 'Duration of database.py function calls', ('function',))
+db_queries = registry.counter(
+    'zarbdor_db_queries_total', 'SQL statements executed by database.py functions', ('function',))
+
+# Bot
+bot_updates = registry.histogram(
+    'zarbdor_bot_handler_duration_seconds', 'Bot update processing latency by handler', ('handler',))
+bot_handler_errors = registry.counter(
+    'zarbdor_bot_handler_errors_total', 'Bot handlers that raised', ('handler', 'error'))
+telegram_requests = registry.histogram(
+    'zarbdor_telegram_request_duration_seconds', 'Telegram Bot API call latency by method', ('method',))
+telegram_errors = registry.counter(
+    'zarbdor_telegram_request_errors_total', 'Failed Telegram Bot API calls by method', ('method', 'error'))
+
+# Queues (depth callbacks are registered by the components that own them)
+_queue_depths: Dict[str, Callable[[], int]] = {}
+queue_depth = registry.gauge(
+    'zarbdor_queue_depth', 'Items waiting in in-process queues', ('queue',),
+    callback=lambda: {(name, ): depth() for name, depth in list(_queue_depths.items())})
+
+
+def track_queue(name: str, depth: Callable[[], int]):
+    """Report depth() as zarbdor_queue_depth{queue=name} on every scrape"""
+    _queue_depths[name] = depth
+
+
+# Userbot pool (per-account state is read from userbot.pool on every scrape)
+_userbot_accounts: List[Callable[[], Dict[str, Dict]]] = []
+
+
+def _userbot_gauge(field: str) -> Callable[[], Dict[Tuple, float]]:
+    def collect():
+        values = {}
+        for accounts in list(_userbot_accounts):
+            for account, state in accounts().items():
+                values[(account, )] = float(state[field])
+        return values
+    return collect
+
+
+userbot_sends = registry.counter(
+    'zarbdor_userbot_sends_total', 'Verification code sends by userbot account and result', ('account', 'result'))
+userbot_peer_lookups = registry.counter(
+    'zarbdor_userbot_peer_lookups_total', 'Phone to Telegram peer resolutions by userbot account and source',
+    ('account', 'source'))
+userbot_contact_imports = registry.histogram(
+    'zarbdor_userbot_contact_import_size', 'Phones per contact import request', buckets=(1, 2, 5, 10, 25, 50, 100))
+userbot_account_up = registry.gauge(
+    'zarbdor_userbot_account_up', 'Userbot account connected and passing health checks', ('account',),
+    callback=_userbot_gauge('healthy'))
+userbot_in_flight = registry.gauge(
+    'zarbdor_userbot_sends_in_flight', 'Verification code sends in progress by userbot account', ('account',),
+    callback=_userbot_gauge('in_flight'))
+userbot_flood_wait = registry.gauge(
+    'zarbdor_userbot_flood_wait_seconds', 'Seconds until a userbot account may send again', ('account',),
+    callback=_userbot_gauge('cooldown_seconds'))
+
+
+def track_userbot_accounts(accounts: Callable[[], Dict[str, Dict]]):
+    """Report accounts() (account label -> UserbotClient.stats()) in the zarbdor_userbot_* gauges"""
+    _userbot_accounts.append(accounts)
+
+
+def get_registry() -> MetricsRegistry:
+    """Get global metrics registry"""
+    return registry
@@ -0,0 +1,264 @@
+"""
+Per-statement profiling of the SQLite layer
+When enabled, database.get_connection() opens ProfiledConnection, whose
+cursors time every statement (execute plus fetching its rows) and count the
+rows it returned or changed. Statements are aggregated by fingerprint: the SQL
+with literals replaced by ? and IN/VALUES lists collapsed, so one query shape
+is one entry however its parameters vary. Statements slower than the
+threshold go to the 'database.slow_queries' logger with their EXPLAIN QUERY
+PLAN. Disabled, connections are plain sqlite3 connections and nothing is
+measured. Stats are per process.
+"""
+import logging
+import re
+import sqlite3
+import time
+import weakref
+from functools import lru_cache
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+from config import DB_PROFILE_QUERIES, DB_SLOW_QUERY_MS
+
+logger = logging.getLogger('database.slow_queries')
+
+# Distinct fingerprints kept; later new shapes are folded into one entry
+MAX_FINGERPRINTS = 1000
+OTHER = '(other statements)'
+SORT_KEYS = ('total', 'mean', 'max', 'calls', 'rows')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """Normalized statement text: literals -> ?, (?, ?, ...) -> (...), one line"""
+    text = _SPACE.sub(' ', sql).strip()
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('(...)', text)
+    return _VALUES_ROWS.sub(r'\1, ...', text)
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters) -> str:
+    """EXPLAIN QUERY PLAN of sql as an indented tree"""
+    try:
+        # A plain cursor, so explaining is not profiled itself
+        rows = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except (sqlite3.Error, ValueError) as e:
+        return f"(no plan: {e})"
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return '\n'.join(lines) or '(empty plan)'
+
+
+class QueryStats:
+    """Aggregated cost of one statement fingerprint"""
+    __slots__ = ('fingerprint', 'calls', 'total', 'max', 'rows', 'slow', 'plan', 'functions')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.plan: Optional[str] = None
+        self.functions = set()
+
+    def to_dict(self) -> Dict:
+        return {
+            'fingerprint': self.fingerprint,
+            'calls': self.calls,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total * 1000 / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+            'rows': self.rows,
+            'slow_calls': self.slow,
+            'functions': sorted(self.functions),
+            'plan': self.plan
+        }
+
+
+class QueryProfiler:
+    """Collects statement stats from ProfiledConnection cursors"""
+
+    def __init__(self, enabled: bool = DB_PROFILE_QUERIES, slow_ms: float = DB_SLOW_QUERY_MS):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        # Returns the database.py function running the statement (set by database.py)
+        self.context: Callable[[], Optional[str]] = lambda: None
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = Lock()
+
+    def configure(self, enabled: bool, slow_ms: Optional[float] = None):
+        """Switch profiling for connections opened from now on"""
+        self.enabled = enabled
+        if slow_ms is not None:
+            self.slow_seconds = slow_ms / 1000
+
+    def record(self, conn: sqlite3.Connection, sql: str, parameters, elapsed: float, rows: int):
+        """Add one finished statement, logging it if slow"""
+        key = fingerprint(sql)
+        function = self.context()
+        slow = elapsed >= self.slow_seconds
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= MAX_FINGERPRINTS:
+                    key = OTHER
+                    stats = self._stats.get(OTHER)
+                if stats is None:
+                    stats = self._stats[key] = QueryStats(key)
+            stats.calls += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            stats.rows += rows
+            if function is not None:
+                stats.functions.add(function)
+            if not slow:
+                return
+            stats.slow += 1
+            plan = stats.plan
+
+        if plan is None:
+            # Plans are captured once per fingerprint, on its first slow call
+            plan = stats.plan = explain(conn, sql, parameters)
+        logger.warning(f"Slow query {elapsed * 1000:.1f} ms, {rows} rows in {function or '?'}: {key}\n{plan}")
+
+    def top(self, limit: int = 20, sort: str = 'total') -> List[Dict]:
+        """Fingerprints ordered by sort (one of SORT_KEYS), most expensive first"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {SORT_KEYS}")
+        with self._lock:
+            entries = [stats.to_dict() for stats in self._stats.values()]
+        field = {'total': 'total_ms', 'mean': 'mean_ms', 'max': 'max_ms'}.get(sort, sort)
+        entries.sort(key=lambda entry: entry[field], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        """Forget all collected stats"""
+        with self._lock:
+            self._stats.clear()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor timing each statement from execute until its rows are consumed"""
+
+    _sql = None
+
+    def _begin(self, sql: str, parameters, elapsed: float):
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = elapsed
+        self._rows = 0
+        self.connection._active.add(self)
+
+    def _finish(self):
+        """Record the current statement (all rows read, next execute, close)"""
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        self.connection._active.discard(self)
+        rows = self._rows or max(self.rowcount, 0)
+        profiler.record(self.connection, sql, self._parameters, self._elapsed, rows)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        result = super().execute(sql, parameters)
+        self._begin(sql, parameters, time.perf_counter() - start)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        self._begin(sql, seq_of_parameters[0] if seq_of_parameters else (), time.perf_counter() - start)
+        return result
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - start
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - start
+            self._rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - start
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors (including execute() shortcuts) are profiled"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Cursors with a statement not recorded yet, finished on close()
+        self._active = weakref.WeakSet()
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or ProfiledCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        for cursor in list(self._active):
+            cursor._finish()
+        super().close()
+
+
+# Global profiler instance
+profiler = QueryProfiler()
+
+
+def get_query_profiler() -> QueryProfiler:
+    """Get global query profiler instance"""
+    return profiler
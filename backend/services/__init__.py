@@ -1,4 +1,16 @@
 # Services module
 from .notifications import NotificationService, notification_service, get_notification_service
+from .blob_store import BlobStore, blob_store, get_blob_store
+from .event_hub import EventHub, Subscription, event_hub, get_event_hub
+from .order_events import set_order_status, order_event_message
+from .event_relay import EventRelay, chat_message_event, run_event_relay
+from .scheduler import run_periodic, is_leader
 
-__all__ = ['NotificationService', 'notification_service', 'get_notification_service']
+__all__ = [
+    'NotificationService', 'notification_service', 'get_notification_service',
+    'BlobStore', 'blob_store', 'get_blob_store',
+    'EventHub', 'Subscription', 'event_hub', 'get_event_hub',
+    'set_order_status', 'order_event_message',
+    'EventRelay', 'chat_message_event', 'run_event_relay',
+    'run_periodic', 'is_leader'
+]
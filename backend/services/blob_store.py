@@ -0,0 +1,150 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import BinaryIO, Optional
+
+from config import UPLOAD_DIR, UPLOAD_GC_GRACE_SECONDS
+from database import (
+    register_blob, refresh_blob_refcounts, get_orphan_blobs, delete_blob,
+    get_referenced_upload_paths
+)
+from services.scheduler import run_periodic
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Product images saved before the blob store: product_<id>.<ext> (admin API) and
+# <YYYYmmdd>_<HHMMSS>_<rand>.<ext> (bot). Old chat attachments (chat_*) are never
+# swept: their messages do not record the file path.
+LEGACY_PRODUCT_IMAGE = re.compile(r'^(product_\d+|\d{8}_\d{6}_\d{4})\.\w+$')
+
+
+class BlobStore:
+    """Content-addressed file store for uploads (UPLOAD_DIR/blobs/<aa>/<sha256><ext>)"""
+    
+    def __init__(self, root: str = UPLOAD_DIR):
+        """Initialize store under the given upload directory"""
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+
+    def _blob_path(self, blob_hash: str, extension: str) -> str:
+        """Build sharded path for blob hash"""
+        return os.path.join(self.blob_dir, blob_hash[:2], f"{blob_hash}{extension}")
+
+    @staticmethod
+    def _normalize_extension(extension: Optional[str]) -> str:
+        """Normalize file extension to lowercase with leading dot"""
+        if not extension:
+            return ''
+        extension = extension.lower()
+        return extension if extension.startswith('.') else f".{extension}"
+
+    def put_file(self, fileobj: BinaryIO, extension: str = '') -> str:
+        """
+        Store file object contents and return blob path
+        Content is hashed while streaming to a temp file, so large uploads
+        are never held in memory
+        """
+        os.makedirs(self.blob_dir, exist_ok=True)
+        extension = self._normalize_extension(extension)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.upload_')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            path = self._blob_path(digest.hexdigest(), extension)
+            if os.path.exists(path):
+                # Duplicate upload - keep existing file
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        register_blob(path, digest.hexdigest(), size)
+        return path
+
+    def put_bytes(self, content: bytes, extension: str = '') -> str:
+        """Store bytes and return blob path"""
+        return self.put_file(io.BytesIO(content), extension)
+
+    def collect_garbage(self, grace_seconds: int = UPLOAD_GC_GRACE_SECONDS,
+                        include_legacy: bool = False) -> dict:
+        """
+        Remove unreferenced files and return statistics
+        Blobs younger than grace_seconds are kept so that a file stored just
+        before its referencing row is written is never collected. With
+        include_legacy, pre-blob-store product images directly under the
+        upload root (LEGACY_PRODUCT_IMAGE) are removed too when no active
+        product references them.
+        """
+        refresh_blob_refcounts()
+
+        removed = 0
+        bytes_reclaimed = 0
+
+        for blob in get_orphan_blobs(grace_seconds):
+            # Re-checks references inside the DELETE to avoid racing new uploads
+            if not delete_blob(blob['path'], grace_seconds):
+                continue
+            try:
+                os.remove(blob['path'])
+                bytes_reclaimed += blob['size_bytes']
+            except FileNotFoundError:
+                pass
+            removed += 1
+
+        legacy_removed = 0
+        if include_legacy and os.path.isdir(self.root):
+            referenced = {os.path.normpath(p) for p in get_referenced_upload_paths()}
+            cutoff = time.time() - grace_seconds
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if (not entry.is_file() or not LEGACY_PRODUCT_IMAGE.match(entry.name)
+                            or os.path.normpath(entry.path) in referenced):
+                        continue
+                    stat = entry.stat()
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(entry.path)
+                    legacy_removed += 1
+                    bytes_reclaimed += stat.st_size
+
+        result = {
+            'removed_blobs': removed,
+            'removed_legacy_files': legacy_removed,
+            'bytes_reclaimed': bytes_reclaimed
+        }
+        logger.info(f"Upload GC completed: {result}")
+        return result
+
+
+# Global blob store instance
+blob_store = BlobStore()
+
+
+def get_blob_store() -> BlobStore:
+    """Get blob store instance"""
+    return blob_store
+
+
+async def run_upload_gc(interval: int, grace_seconds: int = UPLOAD_GC_GRACE_SECONDS):
+    """Background loop collecting orphaned uploads every interval seconds (on one process only)"""
+    await run_periodic('upload_gc', interval, blob_store.collect_garbage, grace_seconds)
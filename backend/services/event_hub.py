@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, Optional, Set
+
+from config import EVENT_QUEUE_SIZE
+
+# Number of recently published event ids remembered for deduplication
+RECENT_EVENT_IDS = 4096
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Bounded event queue of one subscriber (one WebSocket / long-poll request)"""
+
+    def __init__(self, key: Hashable, maxsize: int = EVENT_QUEUE_SIZE):
+        """Initialize subscription for hub key"""
+        self.key = key
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._loop = asyncio.get_running_loop()
+        self.dropped = 0
+
+    def _put(self, event: dict):
+        """Enqueue event, dropping the oldest one if the subscriber is too slow"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    def deliver(self, event: dict):
+        """Deliver event (safe to call from any thread)"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._put(event)
+        else:
+            self._loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait for next event, None on timeout"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    """In-process publish/subscribe hub keyed by topic, e.g. ('chat', user_id)"""
+
+    def __init__(self, recent_size: int = RECENT_EVENT_IDS):
+        """Initialize empty hub"""
+        self._subscribers: Dict[Hashable, Set[Subscription]] = {}
+        self._recent: "OrderedDict[tuple, None]" = OrderedDict()
+        self._recent_size = recent_size
+        self._recent_lock = Lock()
+
+    def subscribe(self, key: Hashable, maxsize: int = EVENT_QUEUE_SIZE) -> Subscription:
+        """Register new subscriber for key (must be called inside the event loop)"""
+        subscription = Subscription(key, maxsize)
+        self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove subscriber"""
+        subscribers = self._subscribers.get(subscription.key)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.key]
+
+    def _remember(self, key: Hashable, event_id: Hashable) -> bool:
+        """Remember event id, True if it was already published for key"""
+        marker = (key, event_id)
+        with self._recent_lock:
+            if marker in self._recent:
+                return True
+            self._recent[marker] = None
+            while len(self._recent) > self._recent_size:
+                self._recent.popitem(last=False)
+        return False
+
+    def publish(self, key: Hashable, event: dict, event_id: Hashable = None) -> int:
+        """
+        Push event to all subscribers of key, returns number of subscribers
+        Pass event_id so publish_once can tell the event was already delivered.
+        """
+        if event_id is not None:
+            self._remember(key, event_id)
+        return self._deliver(key, event)
+
+    def publish_once(self, key: Hashable, event: dict, event_id: Hashable) -> int:
+        """Push event unless this process already published event_id for key (used by the event relay)"""
+        if self._remember(key, event_id):
+            return 0
+        return self._deliver(key, event)
+
+    def _deliver(self, key: Hashable, event: dict) -> int:
+        """Push event to current subscribers of key"""
+        subscribers = list(self._subscribers.get(key, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(event)
+            except RuntimeError as e:
+                # Subscriber's event loop is closed
+                logger.warning(f"Dropping event for {key}: {e}")
+        return len(subscribers)
+
+    def subscriber_count(self, key: Hashable = None) -> int:
+        """Number of subscribers for key (or in total)"""
+        if key is not None:
+            return len(self._subscribers.get(key, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+# Global event hub instance
+event_hub = EventHub()
+
+
+def get_event_hub() -> EventHub:
+    """Get global event hub instance"""
+    return event_hub
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+import database as db
+from config import EVENT_RELAY_INTERVAL
+from services.event_hub import event_hub
+from services.order_events import order_event_message
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per table and relay pass
+RELAY_BATCH_SIZE = 500
+
+
+def chat_message_event(message: Dict) -> Dict:
+    """Wire format of a chat message pushed to the user's chat connections"""
+    return {'type': 'chat_message', 'message': message}
+
+
+class EventRelay:
+    """
+    Republishes chat replies and order events committed by other processes
+    Every process has its own in-process event hub, so in the split
+    deployment (bot process + N API workers) a reply sent through one worker
+    or an order confirmed in the bot would never reach WebSockets held by
+    another worker. The relay tails chat_messages and order_events, only
+    querying after PRAGMA data_version reports a commit, and publishes new
+    rows locally, skipping events this process already published itself.
+    """
+
+    def __init__(self):
+        """Initialize relay at the current end of both tables"""
+        self.last_message_id = db.get_last_message_id()
+        self.last_event_id = db.get_last_order_event_id()
+        self.data_version = db.get_data_version()
+
+    def collect(self) -> List[Tuple[tuple, Dict, int]]:
+        """Fetch rows committed since the last call as (hub key, event, event id)"""
+        data_version = db.get_data_version()
+        if data_version == self.data_version:
+            return []
+        self.data_version = data_version
+        
+        collected = []
+        while True:
+            messages = db.get_messages_after(self.last_message_id, 'admin', RELAY_BATCH_SIZE)
+            for message in messages:
+                collected.append((('chat', message['user_id']), chat_message_event(message), message['message_id']))
+                self.last_message_id = message['message_id']
+            
+            events = db.get_order_events_after(self.last_event_id, RELAY_BATCH_SIZE)
+            for event in events:
+                collected.append((('orders', event['user_id']), order_event_message(event), event['event_id']))
+                self.last_event_id = event['event_id']
+            
+            if len(messages) < RELAY_BATCH_SIZE and len(events) < RELAY_BATCH_SIZE:
+                return collected
+
+    def poll(self) -> int:
+        """Publish rows committed since the last poll, returns number of events"""
+        collected = self.collect()
+        for key, event, event_id in collected:
+            event_hub.publish_once(key, event, event_id)
+        return len(collected)
+
+
+async def run_event_relay(interval: float = EVENT_RELAY_INTERVAL):
+    """Background loop relaying cross-process events every interval seconds"""
+    relay = await asyncio.to_thread(EventRelay)
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            # Query in a worker thread, publish on the loop owning the subscriptions
+            for key, event, event_id in await asyncio.to_thread(relay.collect):
+                event_hub.publish_once(key, event, event_id)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Event relay error: {e}")
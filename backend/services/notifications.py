@@ -6,12 +6,14 @@ from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
+import metrics
+from bot.metrics import setup_bot_metrics
 from config import BOT_TOKEN, SUPER_ADMIN_ID, BROADCAST_DELAY
 from database import (
     get_user, get_all_admins, get_all_users, get_order, get_order_items,
     get_product, get_userbot_settings
 )
-from userbot.client import get_userbot
+from userbot.pool import get_userbot
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +30,19 @@ class NotificationService:
         """Initialize notification service with bot instance"""
         self._bot = bot
         self._userbot = None
+        self.broadcast_pending = 0
+        metrics.track_queue('broadcast', lambda: self.broadcast_pending)
         
     @property
     def bot(self) -> Bot:
         """Get or create bot instance"""
         if self._bot is None:
             self._bot = Bot(token=BOT_TOKEN)
+            setup_bot_metrics(self._bot)
         return self._bot
     
     async def get_userbot_client(self):
-        """Get userbot client instance"""
+        """Get userbot account pool"""
         if self._userbot is None:
             self._userbot = await get_userbot()
         return self._userbot
@@ -260,26 +265,33 @@ class NotificationService:
             sent_count = 0
             failed_count = 0
             blocked_count = 0
-            
-            for user in users:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user['user_id'],
-                        text=message,
-                        parse_mode='HTML'
-                    )
-                    sent_count += 1
-                    
-                    # Small delay to avoid rate limits
-                    await asyncio.sleep(BROADCAST_DELAY)
-                    
-                except TelegramForbiddenError:
-                    blocked_count += 1
-                    if not exclude_blocked:
+            # Recipients still to go, reported as zarbdor_queue_depth{queue="broadcast"}
+            self.broadcast_pending += len(users)
+            sent_to = 0
+            try:
+                for sent_to, user in enumerate(users, 1):
+                    self.broadcast_pending -= 1
+                    try:
+                        await self.bot.send_message(
+                            chat_id=user['user_id'],
+                            text=message,
+                            parse_mode='HTML'
+                        )
+                        sent_count += 1
+                        
+                        # Small delay to avoid rate limits
+                        await asyncio.sleep(BROADCAST_DELAY)
+                        
+                    except TelegramForbiddenError:
+                        blocked_count += 1
+                        if not exclude_blocked:
+                            failed_count += 1
+                    except Exception as e:
+                        logger.error(f"Failed to send to user {user['user_id']}: {e}")
                         failed_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send to user {user['user_id']}: {e}")
-                    failed_count += 1
+            finally:
+                # Cancelled broadcasts leave no phantom recipients behind
+                self.broadcast_pending -= len(users) - sent_to
             
             result = {
                 'total': len(users),
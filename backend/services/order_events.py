@@ -0,0 +1,22 @@
+from typing import Dict
+
+from database import change_order_status
+from services.event_hub import event_hub
+
+
+def order_event_message(event: Dict) -> Dict:
+    """Wire format of an order status event (WebSocket frame / long-poll item)"""
+    return {'type': 'order_status', **event}
+
+
+def set_order_status(order_id: int, status: str) -> bool:
+    """
+    Change order status and push the transition to the customer
+    Use instead of database.update_order_status so open WebSocket and
+    long-poll subscribers of ('orders', user_id) are woken up.
+    """
+    event = change_order_status(order_id, status)
+    if event is None:
+        return False
+    event_hub.publish(('orders', event['user_id']), order_event_message(event), event['event_id'])
+    return True
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Callable
+
+import database as db
+from config import SCHEDULER_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Lease owner name of this process
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_leader(job: str, ttl: float) -> bool:
+    """Take or renew this process's lease on job"""
+    return db.acquire_lease(job, INSTANCE_ID, ttl)
+
+
+async def run_periodic(job: str, interval: float, func: Callable, *args):
+    """
+    Run blocking func(*args) every interval seconds on a single process
+    Any number of processes may start the loop; only the holder of the job's
+    lease runs it. The lease outlives one interval, so the leader keeps it
+    while alive and another process takes over once it expires.
+    """
+    ttl = interval + SCHEDULER_LEASE_SECONDS
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(is_leader, job, ttl):
+                continue
+            await asyncio.to_thread(func, *args)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Scheduled job {job} error: {e}")
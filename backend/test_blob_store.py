@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed upload store and its garbage collector
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+import database as db
+from services.blob_store import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path, scratch_db):
+    """Blob store and database in a scratch directory"""
+    return BlobStore(root=str(tmp_path / 'uploads'))
+
+
+def test_identical_uploads_share_one_blob(store):
+    first = store.put_bytes(b'same image', '.JPG')
+    second = store.put_bytes(b'same image', '.jpg')
+    other = store.put_bytes(b'other image', '.jpg')
+
+    assert first == second
+    assert first != other
+    assert first.endswith('.jpg')
+    assert os.path.basename(os.path.dirname(first)) == os.path.basename(first)[:2]
+    assert db.get_blob(first)['size_bytes'] == len(b'same image')
+
+
+def test_gc_removes_only_unreferenced_blobs(store):
+    category_id = db.create_category('Kat', 'Кат')
+    kept = store.put_bytes(b'product image', '.jpg')
+    replaced = store.put_bytes(b'old product image', '.jpg')
+    chat_file = store.put_bytes(b'chat attachment', '.pdf')
+    orphan = store.put_bytes(b'never referenced', '.jpg')
+
+    product_id = db.create_product(category_id, 'Mahsulot', 'Товар', 1000, image_path=replaced)
+    db.update_product(product_id, image_path=kept)
+    deleted_id = db.create_product(category_id, 'Eski', 'Старый', 1000, image_path=kept)
+    db.delete_product(deleted_id)
+    db.create_message(1, '[File: doc.pdf]', 'user', file_path=chat_file)
+
+    result = store.collect_garbage(grace_seconds=0)
+
+    assert result['removed_blobs'] == 2
+    assert result['bytes_reclaimed'] == len(b'old product image') + len(b'never referenced')
+    assert os.path.exists(kept) and os.path.exists(chat_file)
+    assert not os.path.exists(replaced) and not os.path.exists(orphan)
+    assert db.get_blob(kept)['ref_count'] == 1
+    assert db.get_blob(orphan) is None
+
+
+def test_gc_keeps_recent_blobs(store):
+    path = store.put_bytes(b'just uploaded', '.jpg')
+
+    result = store.collect_garbage(grace_seconds=3600)
+
+    assert result['removed_blobs'] == 0
+    assert os.path.exists(path)
+
+
+def test_gc_removes_unreferenced_legacy_product_images_on_request(store):
+    os.makedirs(store.root, exist_ok=True)
+    legacy_kept = os.path.join(store.root, 'product_1.jpg')
+    legacy_orphan = os.path.join(store.root, 'product_2.jpg')
+    legacy_bot_orphan = os.path.join(store.root, '20240101_120000_1234.jpg')
+    legacy_chat = os.path.join(store.root, 'chat_1_1700000000.0.jpg')
+    operator_file = os.path.join(store.root, 'logo.png')
+    for path in (legacy_kept, legacy_orphan, legacy_bot_orphan, legacy_chat, operator_file):
+        with open(path, 'wb') as f:
+            f.write(b'legacy')
+    category_id = db.create_category('Kat', 'Кат')
+    db.create_product(category_id, 'Mahsulot', 'Товар', 1000, image_path=legacy_kept)
+
+    assert store.collect_garbage(grace_seconds=0)['removed_legacy_files'] == 0
+    assert os.path.exists(legacy_orphan)
+
+    result = store.collect_garbage(grace_seconds=0, include_legacy=True)
+
+    assert result['removed_legacy_files'] == 2
+    assert not os.path.exists(legacy_orphan) and not os.path.exists(legacy_bot_orphan)
+    assert os.path.exists(legacy_kept) and os.path.exists(legacy_chat) and os.path.exists(operator_file)
+
+
+def test_blob_stored_again_during_gc_is_kept(store):
+    path = store.put_bytes(b'uploaded twice', '.jpg')
+    conn = db.get_connection()
+    conn.execute("UPDATE upload_blobs SET stored_at = datetime('now', '-2 hours') WHERE path = ?", (path,))
+    conn.commit()
+    conn.close()
+    db.refresh_blob_refcounts()
+    assert [blob['path'] for blob in db.get_orphan_blobs(3600)] == [path]
+
+    # A duplicate upload refreshes stored_at between the orphan scan and the delete
+    store.put_bytes(b'uploaded twice', '.jpg')
+
+    assert not db.delete_blob(path, 3600)
+    assert db.get_blob(path) is not None
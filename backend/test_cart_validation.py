@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for single-query cart validation at checkout
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from api.main import app
+from api.routes import create_access_token
+
+USER_ID = 1001
+ORDER = {'full_name': 'Ali Valiyev', 'phone': '+998901234567', 'address': 'Toshkent, Chilonzor 1'}
+
+
+@pytest.fixture
+def products(scratch_db):
+    """Scratch database with a user and three products in the cart"""
+    db.create_user(USER_ID, phone='+998901234567')
+    category_id = db.create_category('Mevalar', 'Фрукты')
+    product_ids = [
+        db.create_product(category_id, 'Olma', 'Яблоко', price=10000, stock_quantity=10),
+        db.create_product(category_id, 'Nok', 'Груша', price=20000, discount_price=15000, stock_quantity=1),
+        db.create_product(category_id, 'Uzum', 'Виноград', price=30000, stock_quantity=5),
+    ]
+    for product_id in product_ids:
+        db.add_to_cart(USER_ID, product_id, 2)
+    return product_ids
+
+
+@pytest.fixture
+def client(products):
+    return TestClient(app, headers={'Authorization': f'Bearer {create_access_token(USER_ID)}'})
+
+
+def test_validate_cart_flags_lines(products, monkeypatch):
+    apple, pear, grape = products
+    db.update_product(grape, discount_price=25000)
+
+    calls = []
+    get_connection = db.get_connection
+    monkeypatch.setattr(db, 'get_connection', lambda: calls.append(1) or get_connection())
+    lines = {line['product_id']: line for line in db.validate_cart(USER_ID)}
+
+    assert len(calls) == 1
+    assert lines[apple]['available'] and not lines[apple]['price_changed']
+    assert not lines[pear]['available']
+    assert lines[pear]['effective_price'] == 15000
+    assert lines[grape]['price_changed']
+    assert lines[grape]['effective_price'] == 25000
+    assert lines[grape]['added_price'] == 30000
+
+
+def test_inactive_product_is_unavailable(products):
+    db.delete_product(products[0])
+    line = next(line for line in db.validate_cart(USER_ID) if line['product_id'] == products[0])
+    assert not line['available']
+
+
+def test_create_order_rejects_unavailable_items(client, products):
+    response = client.post('/api/orders/create', json=ORDER)
+    assert response.status_code == 409
+    assert response.json()['detail']['product_ids'] == [products[1]]
+    assert len(db.validate_cart(USER_ID)) == 3
+
+
+def test_create_order_uses_current_prices(client, products):
+    apple, pear, grape = products
+    db.update_product(pear, stock_quantity=5)
+    db.update_product(grape, discount_price=25000)
+
+    response = client.post('/api/orders/create', json={**ORDER, 'accept_price_changes': False})
+    assert response.status_code == 409
+    assert response.json()['detail']['product_ids'] == [grape]
+
+    response = client.post('/api/orders/create', json=ORDER)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body['price_changed'] == [grape]
+    assert body['order']['total_amount'] == 2 * 10000 + 2 * 15000 + 2 * 25000
+    assert db.validate_cart(USER_ID) == []
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for conditional HTTP caching of catalog endpoints
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from config import SUPER_ADMIN_ID
+from api.main import app
+from api.routes import create_access_token
+from api.admin_routes import create_admin_access_token
+from services.blob_store import blob_store
+
+USER_ID = 1001
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, scratch_db):
+    """Test client backed by a scratch database with a small catalog"""
+    monkeypatch.setattr(blob_store, 'root', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(blob_store, 'blob_dir', str(tmp_path / 'uploads' / 'blobs'))
+
+    category_id = db.create_category('Ichimliklar', 'Напитки')
+    db.create_product(category_id, 'Choy', 'Чай', 12000, stock_quantity=5)
+    db.create_neighborhood('Markaz', 'Центр', 10000)
+    db.create_user(USER_ID, phone='+998901234567')
+
+    return TestClient(app)
+
+
+def user_headers():
+    return {'Authorization': f'Bearer {create_access_token(USER_ID)}'}
+
+
+def admin_headers():
+    return {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+
+
+def test_not_modified_without_database_work(client, monkeypatch):
+    first = client.get('/api/categories')
+    assert first.status_code == 200
+    assert first.headers['etag'].startswith('W/"c')
+    assert 'last-modified' in first.headers
+
+    def fail(*args, **kwargs):
+        raise AssertionError('database accessed')
+    monkeypatch.setattr(db, 'get_connection', fail)
+
+    second = client.get('/api/categories', headers={'If-None-Match': first.headers['etag']})
+    assert second.status_code == 304
+    assert second.content == b''
+    assert second.headers['etag'] == first.headers['etag']
+
+    third = client.get('/api/categories', headers={'If-Modified-Since': first.headers['last-modified']})
+    assert third.status_code == 304
+
+
+def test_cached_body_reused_until_catalog_changes(client, monkeypatch):
+    first = client.get('/api/neighborhoods')
+
+    calls = []
+    original = db.get_all_neighborhoods
+    monkeypatch.setattr(db, 'get_all_neighborhoods', lambda **kw: calls.append(1) or original(**kw))
+
+    second = client.get('/api/neighborhoods')
+    assert second.content == first.content
+    assert calls == []
+
+    db.create_neighborhood('Chekka', 'Окраина', 20000)
+    third = client.get('/api/neighborhoods')
+    assert calls == [1]
+    assert third.headers['etag'] != first.headers['etag']
+    assert len(third.json()['neighborhoods']) == 2
+
+
+def test_etag_varies_by_params_and_language(client):
+    uz = client.get('/api/categories', params={'language': 'uz'})
+    ru = client.get('/api/categories', params={'language': 'ru'})
+    assert uz.headers['etag'] != ru.headers['etag']
+
+
+def test_favorites_change_invalidates_products(client):
+    first = client.get('/api/products', headers=user_headers())
+    assert first.headers['cache-control'] == 'private, no-cache'
+    assert first.json()['products'][0]['is_favorite'] is False
+
+    db.add_to_favorites(USER_ID, first.json()['products'][0]['product_id'])
+
+    second = client.get('/api/products', headers={**user_headers(), 'If-None-Match': first.headers['etag']})
+    assert second.status_code == 200
+    assert second.json()['products'][0]['is_favorite'] is True
+
+
+ADMIN_WRITES = [
+    ('post', '/api/admin/categories', {'name_uz': 'Yangi', 'name_ru': 'Новая'}, '/api/categories'),
+    ('put', '/api/admin/categories/1', {'name_uz': 'Ichimlik'}, '/api/categories'),
+    ('delete', '/api/admin/categories/1', None, '/api/categories'),
+    ('post', '/api/admin/products', {'category_id': 1, 'name_uz': 'Qahva', 'name_ru': 'Кофе', 'price': 20000}, '/api/products'),
+    ('put', '/api/admin/products/1', {'price': 15000}, '/api/products/1'),
+    ('delete', '/api/admin/products/1', None, '/api/products'),
+    ('upload', '/api/admin/products/1/upload-image', None, '/api/products/1'),
+    ('post', '/api/admin/neighborhoods', {'name_uz': 'Chekka', 'name_ru': 'Окраина'}, '/api/neighborhoods'),
+    ('put', '/api/admin/neighborhoods/1', {'delivery_price': 5000}, '/api/neighborhoods'),
+    ('delete', '/api/admin/neighborhoods/1', None, '/api/neighborhoods'),
+]
+
+
+@pytest.mark.parametrize('method,path,payload,endpoint', ADMIN_WRITES)
+def test_admin_write_invalidates_catalog(client, method, path, payload, endpoint):
+    before = client.get(endpoint, headers=user_headers())
+    assert before.status_code == 200
+    etag = before.headers['etag']
+    assert client.get(endpoint, headers={**user_headers(), 'If-None-Match': etag}).status_code == 304
+
+    if method == 'upload':
+        response = client.post(path, headers=admin_headers(),
+                               files={'file': ('photo.jpg', b'image bytes', 'image/jpeg')})
+    else:
+        response = client.request(method.upper(), path, headers=admin_headers(), json=payload)
+    assert response.status_code == 200, response.text
+
+    after = client.get(endpoint, headers={**user_headers(), 'If-None-Match': etag})
+    assert after.status_code in (200, 404)
+    assert after.headers.get('etag') != etag
+    if after.status_code == 200:
+        assert after.content != before.content
+
+
+def test_rolled_back_touch_does_not_skip_a_version(client):
+    product_id = db.create_product(1, 'Kam', 'Мало', 100, stock_quantity=1)
+    first = client.get(f'/api/products/{product_id}', headers=user_headers())
+    assert first.json()['product']['price'] == 100
+
+    # The first line is taken (and its row touched) before the second fails: rolled back
+    assert not db.commit_stock(USER_ID, [(1, 1), (product_id, 2)])
+    assert db.get_product(1)['stock_quantity'] == 5
+    stale = client.get(f'/api/products/{product_id}', headers=user_headers())
+    assert stale.headers['etag'] == first.headers['etag']
+
+    db.update_product(product_id, price=200)
+    fresh = client.get(f'/api/products/{product_id}', headers=user_headers())
+    assert fresh.json()['product']['price'] == 200
+    assert fresh.headers['etag'] != first.headers['etag']
+
+
+def test_checkout_holds_keep_cached_products(client):
+    first = client.get('/api/products/1', headers=user_headers())
+    assert 'reserved_quantity' not in first.json()['product']
+
+    assert db.reserve_stock(USER_ID, [(1, 2)], ttl=60)
+    again = client.get('/api/products/1', headers={**user_headers(), 'If-None-Match': first.headers['etag']})
+    assert again.status_code == 304
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the catalog delta-sync endpoint
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from api.main import app
+from api.routes import create_access_token
+
+USER_ID = 1001
+
+
+@pytest.fixture
+def client(scratch_db):
+    """Test client backed by a scratch database with a small catalog"""
+
+    category_id = db.create_category('Ichimliklar', 'Напитки')
+    db.create_product(category_id, 'Choy', 'Чай', 12000, stock_quantity=5)
+    db.create_product(category_id, 'Qahva', 'Кофе', 20000, stock_quantity=5)
+    db.create_neighborhood('Markaz', 'Центр', 10000)
+    db.create_user(USER_ID, phone='+998901234567')
+
+    client = TestClient(app)
+    client.headers['Authorization'] = f'Bearer {create_access_token(USER_ID)}'
+    return client
+
+
+def sync(client, since):
+    response = client.get('/api/sync/catalog', params={'since': since})
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_full_then_empty_delta(client):
+    full = sync(client, 0).json()
+    assert full['full'] is True
+    assert len(full['categories']) == 1 and len(full['products']) == 2
+    assert len(full['neighborhoods']) == 1
+
+    unchanged = sync(client, full['version'])
+    assert unchanged.json()['full'] is False
+    assert unchanged.json()['products'] == []
+    assert len(unchanged.content) < 200
+
+
+def test_delta_contains_only_changed_and_deleted_rows(client):
+    version = sync(client, 0).json()['version']
+
+    db.update_product(1, price=13000)
+    db.delete_product(2)
+    delta = sync(client, version).json()
+
+    assert [p['product_id'] for p in delta['products']] == [1]
+    assert delta['products'][0]['price'] == 13000
+    assert delta['products'][0]['version'] == delta['version'] - 1
+    assert delta['deleted'] == {'categories': [], 'products': [2], 'neighborhoods': []}
+    assert delta['categories'] == [] and delta['neighborhoods'] == []
+
+
+def test_unknown_version_forces_full_sync(client):
+    version = sync(client, 0).json()['version']
+    data = sync(client, version + 100).json()
+    assert data['full'] is True
+    assert len(data['products']) == 2
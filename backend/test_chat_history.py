@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for paginated chat history
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from config import SUPER_ADMIN_ID
+from api.main import app
+from api.routes import create_access_token
+from api.admin_routes import create_admin_access_token
+
+USER_ID = 1001
+
+
+@pytest.fixture
+def client(scratch_db):
+    """Test client backed by a scratch database with a 120 message conversation"""
+    db.create_user(USER_ID, phone='+998901234567')
+    db.create_user(1002, phone='+998901234568')
+    for i in range(120):
+        db.create_message(USER_ID, f'message {i}', 'user' if i % 2 else 'admin')
+        db.create_message(1002, f'other {i}', 'user')
+    return TestClient(app)
+
+
+def user_headers():
+    return {'Authorization': f'Bearer {create_access_token(USER_ID)}'}
+
+
+def texts(response):
+    return [message['message_text'] for message in response.json()['messages']]
+
+
+def test_newest_page_by_default(client):
+    response = client.get('/api/chat/messages', headers=user_headers())
+    assert texts(response) == [f'message {i}' for i in range(70, 120)]
+    assert response.json()['has_more'] is True
+
+
+def test_before_id_walks_back_to_first_message(client):
+    seen = []
+    params = {'limit': 40}
+    while True:
+        data = client.get('/api/chat/messages', headers=user_headers(), params=params).json()
+        seen = [m['message_text'] for m in data['messages']] + seen
+        if not data['has_more']:
+            break
+        params['before_id'] = data['messages'][0]['message_id']
+    assert seen == [f'message {i}' for i in range(120)]
+
+
+def test_after_id_returns_only_new_messages(client):
+    last_id = client.get('/api/chat/messages', headers=user_headers()).json()['messages'][-1]['message_id']
+    db.create_message(USER_ID, 'new reply', 'admin')
+
+    response = client.get('/api/chat/messages', headers=user_headers(), params={'after_id': last_id})
+    assert texts(response) == ['new reply']
+    assert response.json()['has_more'] is False
+
+
+def test_admin_chat_history_is_paginated(client):
+    headers = {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+    response = client.get(f'/api/admin/chats/{USER_ID}', headers=headers, params={'limit': 10})
+    assert texts(response) == [f'message {i}' for i in range(110, 120)]
+
+
+def test_page_query_uses_user_message_index(client):
+    conn = db.get_connection()
+    plan = conn.execute('''
+        EXPLAIN QUERY PLAN SELECT * FROM chat_messages
+        WHERE user_id = ? AND message_id < ? ORDER BY message_id DESC LIMIT 51
+    ''', (USER_ID, 100)).fetchall()
+    conn.close()
+    assert 'idx_chat_messages_user' in plan[0]['detail']
+
+
+def admin_headers():
+    return {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+
+
+def test_inbox_uses_maintained_unread_counters(client):
+    chats = client.get('/api/admin/chats', headers=admin_headers()).json()['chats']
+    assert [(c['user_id'], c['unread_count']) for c in chats] == [(1002, 120), (USER_ID, 60)]
+    assert chats[0]['last_message_text'] == 'other 119'
+
+    client.get('/api/admin/chats/1002', headers=admin_headers())
+    db.create_message(USER_ID, 'one more', 'user')
+
+    chats = client.get('/api/admin/chats', headers=admin_headers()).json()['chats']
+    assert [(c['user_id'], c['unread_count']) for c in chats] == [(USER_ID, 61)]
+    assert chats[0]['last_message_text'] == 'one more'
+
+
+def test_read_watermark_sets_is_read(client):
+    first = client.get('/api/chat/messages', headers=user_headers(), params={'limit': 2}).json()
+    assert [m['is_read'] for m in first['messages'] if m['sender_type'] == 'admin'] == [0]
+    assert db.get_conversation(USER_ID)['user_unread_count'] == 0
+
+    db.create_message(USER_ID, 'new reply', 'admin')
+    assert db.get_conversation(USER_ID)['user_unread_count'] == 1
+
+    again = client.get('/api/chat/messages', headers=user_headers(), params={'limit': 3}).json()
+    assert [m['is_read'] for m in again['messages'] if m['sender_type'] == 'admin'] == [1, 0]
+
+    # The full history reports the same read state
+    # The full history derives is_read from the same watermarks
+    latest = db.create_message(USER_ID, 'unread reply', 'admin')
+    read = {m['message_id']: m['is_read'] for m in db.get_user_messages(USER_ID) if m['sender_type'] == 'admin'}
+    assert read[latest] == 0
+    assert {is_read for message_id, is_read in read.items() if message_id != latest} == {1}
+
+    db.mark_messages_read(USER_ID, 1, up_to_id=10)
+    read = {m['message_id']: m['is_read'] for m in db.get_user_messages(USER_ID) if m['sender_type'] == 'user'}
+    assert {is_read for message_id, is_read in read.items() if message_id <= 10} == {1}
+    assert {is_read for message_id, is_read in read.items() if message_id > 10} == {0}
+
+
+def test_summaries_backfilled_from_legacy_flags(client):
+    conn = db.get_connection()
+    conn.execute("UPDATE chat_messages SET is_read = 1 WHERE user_id = 1002 AND message_id <= 100")
+    conn.execute('DROP TABLE chat_conversations')
+    conn.execute('PRAGMA user_version = 0')  # databases from before the summaries predate schema versions
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+
+    summary = db.get_conversation(1002)
+    assert summary['last_message_text'] == 'other 119'
+    assert summary['admin_unread_count'] == 70
+    assert summary['admin_read_message_id'] == 100
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for WebSocket chat push
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import database as db
+from config import SUPER_ADMIN_ID
+from api.main import app
+from api.routes import create_access_token
+from api.admin_routes import create_admin_access_token
+from services.event_hub import event_hub
+
+USER_ID = 1001
+OTHER_USER_ID = 1002
+
+
+@pytest.fixture
+def client(scratch_db):
+    """Test client backed by a scratch database with two users"""
+    db.create_user(USER_ID, phone='+998901234567')
+    db.create_user(OTHER_USER_ID, phone='+998901234568')
+    return TestClient(app)
+
+
+def reply(client, user_id, text):
+    headers = {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+    response = client.post(f'/api/admin/chats/{user_id}/reply', headers=headers, json={'message': text})
+    assert response.status_code == 200, response.text
+
+
+def test_admin_reply_is_pushed_to_user(client):
+    with client.websocket_connect(f'/ws/chat?token={create_access_token(USER_ID)}') as ws:
+        ws.send_json({'type': 'ping'})
+        assert ws.receive_json() == {'type': 'pong'}
+
+        reply(client, OTHER_USER_ID, 'not for you')
+        reply(client, USER_ID, 'Salom!')
+
+        event = ws.receive_json()
+        assert event['type'] == 'chat_message'
+        assert event['message']['user_id'] == USER_ID
+        assert event['message']['message_text'] == 'Salom!'
+        assert event['message']['sender_type'] == 'admin'
+
+    assert event_hub.subscriber_count(('chat', USER_ID)) == 0
+
+
+def test_token_accepted_as_subprotocol(client):
+    with client.websocket_connect('/ws/chat', subprotocols=['bearer', create_access_token(USER_ID)]) as ws:
+        assert ws.accepted_subprotocol == 'bearer'
+        reply(client, USER_ID, 'Salom!')
+        assert ws.receive_json()['message']['message_text'] == 'Salom!'
+
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect('/ws/chat', subprotocols=['bearer']) as ws:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+
+def test_invalid_token_is_rejected(client):
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect('/ws/chat?token=bad') as ws:
+            ws.receive_json()
+    assert exc.value.code == 1008
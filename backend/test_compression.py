@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for Brotli/GZip response compression
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from api.compression import CompressionMiddleware
+
+BODY = b'{"products": []}' * 256
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware)
+
+
+@app.get('/json')
+async def json_body():
+    return Response(BODY, media_type='application/json', headers={'ETag': '"v1"'})
+
+
+@app.get('/photo.jpg')
+async def image_body():
+    return Response(BODY, media_type='image/jpeg', headers={'ETag': '"v1"'})
+
+
+def test_compressed_response_gets_weak_etag():
+    client = TestClient(app)
+    response = client.get('/json', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['etag'] == 'W/"v1"'
+    assert response.content == BODY
+
+    identity = client.get('/json', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in identity.headers
+    assert identity.headers['etag'] == '"v1"'
+
+
+def test_images_are_not_compressed_again():
+    response = TestClient(app).get('/photo.jpg', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.headers['etag'] == '"v1"'
+    assert response.headers['content-length'] == str(len(BODY))
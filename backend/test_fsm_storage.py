@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for SQLite-backed FSM storage
+"""
+import sys
+import os
+import asyncio
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import database as db
+from bot.fsm_storage import SQLiteStorage
+from bot.states import OrderStates
+
+KEY = StorageKey(bot_id=1, chat_id=1001, user_id=1001)
+
+
+pytestmark = pytest.mark.usefixtures('scratch_db')
+
+
+def test_state_survives_restart():
+    async def scenario():
+        storage = SQLiteStorage(flush_interval=60)
+        await storage.set_state(KEY, OrderStates.waiting_for_address)
+        await storage.update_data(KEY, {'cart_items': [[5, 2, 12000]], 'full_name': 'Ali Valiyev'})
+
+        # Write-back: nothing hits the table before a flush
+        assert db.get_fsm_state(storage._key(KEY)) is None
+        await storage.close()
+
+        row = db.get_fsm_state(storage._key(KEY))
+        assert row['data'] == '{"cart_items":[[5,2,12000]],"full_name":"Ali Valiyev"}'
+
+        restarted = SQLiteStorage()
+        assert await restarted.get_state(KEY) == OrderStates.waiting_for_address.state
+        assert (await restarted.get_data(KEY))['cart_items'] == [[5, 2, 12000]]
+
+        # Clearing the state deletes the row
+        await restarted.set_state(KEY, None)
+        await restarted.set_data(KEY, {})
+        await restarted.close()
+        assert db.get_fsm_state(storage._key(KEY)) is None
+
+    asyncio.run(scenario())
+
+
+def test_background_flush_batches_changes():
+    async def scenario():
+        storage = SQLiteStorage(flush_interval=0.05)
+        for user_id in range(1, 21):
+            key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+            await storage.set_state(key, OrderStates.waiting_for_full_name)
+        await asyncio.sleep(0.2)
+
+        conn = db.get_connection()
+        assert conn.execute('SELECT COUNT(*) FROM fsm_states').fetchone()[0] == 20
+        conn.close()
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_state_expires():
+    async def scenario():
+        storage = SQLiteStorage(ttl=0.1)
+        await storage.set_state(KEY, OrderStates.waiting_for_notes)
+        await storage.update_data(KEY, {'notes': 'eshik oldida'})
+        await storage.close()
+        time.sleep(0.15)
+
+        restarted = SQLiteStorage(ttl=0.1)
+        assert await restarted.get_state(KEY) is None
+        assert await restarted.get_data(KEY) == {}
+        assert await restarted.sweep() == 1
+        assert db.get_fsm_state(storage._key(KEY)) is None
+
+    asyncio.run(scenario())
+
+
+def test_cache_is_bounded_without_losing_changes():
+    async def scenario():
+        storage = SQLiteStorage(max_entries=5, flush_interval=60)
+        keys = [StorageKey(bot_id=1, chat_id=user_id, user_id=user_id) for user_id in range(1, 11)]
+        for key in keys:
+            await storage.set_data(key, {'step': key.user_id})
+        # Unflushed entries are never evicted
+        assert len(storage._cache) == 10
+
+        await storage.flush()
+        await storage.get_data(keys[0])
+        assert len(storage._cache) == 5
+        for key in keys:
+            assert await storage.get_data(key) == {'step': key.user_id}
+        await storage.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for Idempotency-Key handling on order and cart POSTs
+"""
+import sys
+import os
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from api.main import app
+from api.routes import create_access_token
+
+USER_ID = 1001
+AUTH = {'Authorization': f'Bearer {create_access_token(USER_ID)}'}
+ORDER = {'full_name': 'Ali Valiyev', 'phone': '+998901234567', 'address': 'Toshkent, Chilonzor 1'}
+
+
+@pytest.fixture
+def product_id(scratch_db):
+    """Scratch database with a user and one product"""
+    db.create_user(USER_ID, phone='+998901234567')
+    category_id = db.create_category('Mevalar', 'Фрукты')
+    return db.create_product(category_id, 'Olma', 'Яблоко', price=10000, stock_quantity=10)
+
+
+@pytest.fixture
+def client(product_id):
+    return TestClient(app, headers=AUTH)
+
+
+def test_retried_order_is_created_once(client, product_id):
+    db.add_to_cart(USER_ID, product_id, 2)
+    headers = {'Idempotency-Key': 'order-1'}
+
+    first = client.post('/api/orders/create', json=ORDER, headers=headers)
+    assert first.status_code == 200, first.text
+    retry = client.post('/api/orders/create', json=ORDER, headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers['idempotent-replayed'] == 'true'
+    assert retry.json() == first.json()
+
+    assert len(db.get_user_orders(USER_ID)) == 1
+    assert db.get_product(product_id)['stock_quantity'] == 8
+
+
+def test_key_reused_with_different_body(client, product_id):
+    headers = {'Idempotency-Key': 'cart-1'}
+    assert client.post('/api/cart/add', json={'product_id': product_id, 'quantity': 1}, headers=headers).status_code == 200
+
+    response = client.post('/api/cart/add', json={'product_id': product_id, 'quantity': 3}, headers=headers)
+    assert response.status_code == 422
+    assert db.get_cart_items(USER_ID)[0]['quantity'] == 1
+
+
+def test_failed_request_releases_key(client, product_id):
+    headers = {'Idempotency-Key': 'order-2'}
+    assert client.post('/api/orders/create', json=ORDER, headers=headers).status_code == 400
+
+    db.add_to_cart(USER_ID, product_id, 1)
+    response = client.post('/api/orders/create', json=ORDER, headers=headers)
+    assert response.status_code == 200, response.text
+    assert 'idempotent-replayed' not in response.headers
+
+
+def test_concurrent_duplicates_are_coalesced(product_id):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test', headers=AUTH) as client:
+            responses = await asyncio.gather(*[
+                client.post('/api/cart/add', json={'product_id': product_id, 'quantity': 2},
+                            headers={'Idempotency-Key': 'cart-2'})
+                for _ in range(5)
+            ])
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [200] * 5
+    assert sum('idempotent-replayed' in response.headers for response in responses) == 4
+    assert db.get_cart_items(USER_ID)[0]['quantity'] == 2
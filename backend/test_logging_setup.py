@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the queued JSON logging pipeline and correlation ids
+"""
+import sys
+import os
+import asyncio
+import json
+import logging
+import queue
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import logging_setup
+from logging_setup import (
+    NonBlockingQueueHandler, SizedTimedRotatingFileHandler, setup_logging, shutdown_logging,
+    request_id, update_id
+)
+from api.request_id import RequestIdMiddleware
+from benchmarks.fake_telegram import FakeSession, message_update
+from bot.log_context import setup_update_logging
+
+logger = logging.getLogger('test_logging_setup')
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / 'zarbdor.log'
+    setup_logging(str(path), 'INFO', 'text')
+    yield path
+    shutdown_logging()
+
+
+def read_entries(path) -> list:
+    shutdown_logging()  # drain the queue
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_records_written_as_json_with_correlation_ids(log_file):
+    token = request_id.set('req-1')
+    try:
+        logger.info("Order %s confirmed", 7, extra={'order_id': 7})
+    finally:
+        request_id.reset(token)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Sending failed")
+
+    first, second = read_entries(log_file)
+    assert first['message'] == 'Order 7 confirmed'
+    assert first['level'] == 'INFO'
+    assert first['logger'] == 'test_logging_setup'
+    assert first['request_id'] == 'req-1'
+    assert first['order_id'] == 7
+    assert 'update_id' not in first
+    assert 'request_id' not in second
+    assert 'ValueError: boom' in second['exc']
+
+
+def test_websocket_token_redacted_from_uvicorn_lines(log_file):
+    logging.getLogger('uvicorn.error').info('%s - "WebSocket %s" [accepted]', '127.0.0.1:5000',
+                                            '/ws/orders?token=eyJhbGciOi.e30.c2ln&since=3')
+
+    entry, = read_entries(log_file)
+    assert entry['message'] == '127.0.0.1:5000 - "WebSocket /ws/orders?token=***&since=3" [accepted]'
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    test_logger = logging.getLogger('test_logging_setup.full')
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+    dropped = logging_setup.dropped_records.value()
+    try:
+        start = time.perf_counter()
+        for i in range(3):
+            test_logger.warning("line %d", i)
+        assert time.perf_counter() - start < 1
+    finally:
+        test_logger.removeHandler(handler)
+        test_logger.propagate = True
+    assert handler.queue.get_nowait().msg == 'line 0'
+    assert logging_setup.dropped_records.value() == dropped + 2
+
+
+def test_rotation_by_size_and_time(tmp_path):
+    path = tmp_path / 'rotating.log'
+    handler = SizedTimedRotatingFileHandler(str(path), max_bytes=200, backup_count=3, interval=3600)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    record = logging.makeLogRecord({'msg': 'x' * 80})
+    for _ in range(3):
+        handler.handle(record)
+    assert (tmp_path / 'rotating.log.1').exists()  # third line would have passed 200 bytes
+
+    assert handler.rollover_at > time.time()
+    assert handler.rollover_at - time.time() <= 3600
+    handler.rollover_at = time.time() - 1
+    handler.handle(logging.makeLogRecord({'msg': 'after the hour'}))
+    handler.close()
+    assert path.read_text() == 'after the hour\n'
+    assert (tmp_path / 'rotating.log.2').exists()
+
+
+def test_request_id_bound_and_echoed():
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get('/whoami')
+    async def whoami():
+        return {'request_id': request_id.get()}
+
+    client = TestClient(app)
+    response = client.get('/whoami', headers={'X-Request-ID': 'client-id-1'})
+    assert response.json() == {'request_id': 'client-id-1'}
+    assert response.headers['x-request-id'] == 'client-id-1'
+
+    generated = client.get('/whoami', headers={'X-Request-ID': 'bad id\n'})
+    assert generated.json()['request_id'] == generated.headers['x-request-id'] != 'bad id\n'
+    assert request_id.get() is None
+
+
+def test_update_id_bound_for_handlers():
+    router = Router()
+    seen = []
+
+    @router.message()
+    async def record(message: Message):
+        seen.append(update_id.get())
+
+    async def scenario():
+        bot = Bot('123456:TEST', session=FakeSession(latency=0))
+        dp = Dispatcher()
+        dp.include_router(router)
+        setup_update_logging(dp)
+        await dp.feed_raw_update(bot, message_update(41, 7, 'salom'))
+        await dp.feed_raw_update(bot, message_update(42, 7, 'salom'))
+
+    asyncio.run(scenario())
+    assert seen == [41, 42]
+    assert update_id.get() is None
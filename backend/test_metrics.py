@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus /metrics endpoint
+"""
+import sys
+import os
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from fastapi.testclient import TestClient
+
+import database as db
+import metrics
+from api import metrics as api_metrics
+from api.main import app
+from api.routes import create_access_token
+from benchmarks.fake_telegram import FakeSession, message_update
+from bot.metrics import setup_bot_metrics
+
+
+@pytest.fixture
+def product_id(scratch_db):
+    """Scratch database with one product"""
+    db.create_user(1001)
+    category_id = db.create_category('Mevalar', 'Фрукты')
+    return db.create_product(category_id, 'Olma', 'Яблоко', price=10000, stock_quantity=10)
+
+
+def test_http_requests_labelled_by_route_template(product_id, monkeypatch):
+    monkeypatch.setattr(api_metrics, 'METRICS_TOKEN', 'scrape-token')
+    client = TestClient(app, headers={'Authorization': f'Bearer {create_access_token(1001)}'})
+    before = metrics.http_requests.count('GET', '/api/products/{product_id}', '200')
+    assert client.get(f'/api/products/{product_id}').status_code == 200
+    assert client.get('/no/such/route').status_code == 404
+
+    assert metrics.http_requests.count('GET', '/api/products/{product_id}', '200') == before + 1
+    assert metrics.http_requests.count('GET', 'unmatched', '404') >= 1
+
+    assert client.get('/metrics').status_code == 401  # a user token is not the metrics token
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    body = response.text
+    assert '# TYPE zarbdor_http_request_duration_seconds histogram' in body
+    assert 'route="/api/products/{product_id}",status="200",le="+Inf"' in body
+    assert f'/api/products/{product_id}"' not in body
+    assert 'zarbdor_http_requests_in_flight 1' in body  # the scrape itself
+
+
+def test_metrics_local_only_without_token(monkeypatch):
+    monkeypatch.setattr(api_metrics, 'METRICS_TOKEN', '')
+    # TestClient connects as host 'testclient', i.e. not from loopback
+    assert TestClient(app).get('/metrics').status_code == 403
+
+
+def test_database_calls_and_queries(product_id):
+    calls = metrics.db_calls.count('get_product')
+    queries = metrics.db_queries.value('get_product')
+
+    db.get_product(product_id)
+
+    assert metrics.db_calls.count('get_product') == calls + 1
+    assert metrics.db_queries.value('get_product') >= queries + 1
+    assert 'zarbdor_db_queries_total{function="get_product"}' in metrics.get_registry().render()
+
+
+def test_bot_handler_and_api_metrics():
+    router = Router()
+
+    @router.message(lambda message: message.text == 'hi')
+    async def greet(message: Message):
+        await message.answer('salom')
+
+    @router.message()
+    async def broken(message: Message):
+        raise RuntimeError('boom')
+
+    async def scenario():
+        bot = Bot('123456:TEST', session=FakeSession(latency=0))
+        dp = Dispatcher()
+        dp.include_router(router)
+        setup_bot_metrics(bot, dp)
+
+        await dp.feed_raw_update(bot, message_update(1, 42, 'hi'))
+        with pytest.raises(RuntimeError):
+            await dp.feed_raw_update(bot, message_update(2, 42, 'other'))
+
+    greeted = metrics.bot_updates.count('test_metrics.greet')
+    sent = metrics.telegram_requests.count('SendMessage')
+    asyncio.run(scenario())
+
+    assert metrics.bot_updates.count('test_metrics.greet') == greeted + 1
+    assert metrics.telegram_requests.count('SendMessage') == sent + 1
+    assert metrics.bot_handler_errors.value('test_metrics.broken', 'RuntimeError') >= 1
+
+
+def test_queue_depth_reported_on_scrape():
+    depth = [3]
+    metrics.track_queue('test_queue', lambda: depth[0])
+    assert 'zarbdor_queue_depth{queue="test_queue"} 3' in metrics.get_registry().render()
+    depth[0] = 0
+    assert 'zarbdor_queue_depth{queue="test_queue"} 0' in metrics.get_registry().render()
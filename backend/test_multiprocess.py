@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for shared state in the split bot/API-workers deployment
+"""
+import sys
+import os
+import asyncio
+import subprocess
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+import database as db
+from services.event_hub import event_hub
+from services.event_relay import EventRelay
+
+USER_ID = 1001
+
+# Runs a database call in a separate process, like another API worker or the bot
+OTHER_PROCESS = '''
+import sys
+import database
+database.DB_NAME = sys.argv[1]
+exec(sys.argv[2])
+'''
+
+
+@pytest.fixture
+def order(scratch_db):
+    """One user with one pending order"""
+    db.create_user(USER_ID, phone='+998901234567')
+    db.create_order(USER_ID, 'Ali Valiyev', '+998901234567', 'Toshkent', 50000)
+
+
+def in_other_process(code: str):
+    subprocess.run([sys.executable, '-c', OTHER_PROCESS, db.DB_NAME, code],
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def test_catalog_version_follows_other_process(scratch_db):
+    version, _ = db.get_catalog_version()
+
+    in_other_process("database.create_category('Ichimliklar', 'Напитки')")
+
+    assert db.get_catalog_version()[0] == version + 1
+
+
+def test_lease_has_single_owner(scratch_db):
+    assert db.acquire_lease('upload_gc', 'worker-a', 60)
+    assert not db.acquire_lease('upload_gc', 'worker-b', 60)
+    # Owner renews
+    assert db.acquire_lease('upload_gc', 'worker-a', 60)
+
+    assert db.release_lease('upload_gc', 'worker-a')
+    assert db.acquire_lease('upload_gc', 'worker-b', 0.05)
+
+    # Expired lease is taken over
+    time.sleep(0.1)
+    assert db.acquire_lease('upload_gc', 'worker-a', 60)
+
+
+def test_relay_publishes_other_process_events(order):
+    async def scenario():
+        relay = EventRelay()
+        chat = event_hub.subscribe(('chat', USER_ID))
+        orders = event_hub.subscribe(('orders', USER_ID))
+        try:
+            assert relay.poll() == 0
+
+            in_other_process(
+                f"database.create_message({USER_ID}, 'Salom!', 'admin', 1)\n"
+                f"database.create_message({USER_ID}, 'Savol', 'user')\n"
+                f"database.change_order_status(1, 'confirmed')"
+            )
+            assert relay.poll() == 2
+
+            message = await chat.get(1)
+            assert message['type'] == 'chat_message'
+            assert message['message']['message_text'] == 'Salom!'
+            event = await orders.get(1)
+            assert event['type'] == 'order_status'
+            assert event['status'] == 'confirmed'
+
+            # Events published in this process are not relayed twice
+            event = db.change_order_status(1, 'processing')
+            event_hub.publish(('orders', USER_ID), {'type': 'order_status', **event}, event['event_id'])
+            assert (await orders.get(1))['status'] == 'processing'
+            relay.poll()
+            assert await orders.get(0.1) is None
+        finally:
+            event_hub.unsubscribe(chat)
+            event_hub.unsubscribe(orders)
+
+    asyncio.run(scenario())
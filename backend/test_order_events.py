@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for order status push (WebSocket and long-poll)
+"""
+import sys
+import os
+import threading
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from config import SUPER_ADMIN_ID
+from api.main import app
+from api.routes import create_access_token
+from api.admin_routes import create_admin_access_token
+from services.order_events import set_order_status
+
+USER_ID = 1001
+
+
+@pytest.fixture
+def client(scratch_db):
+    """Test client backed by a scratch database with one pending order"""
+    db.create_user(USER_ID, phone='+998901234567')
+    db.create_order(USER_ID, 'Ali Valiyev', '+998901234567', 'Toshkent', 50000)
+    return TestClient(app)
+
+
+def user_headers():
+    return {'Authorization': f'Bearer {create_access_token(USER_ID)}'}
+
+
+def test_long_poll_returns_missed_events_immediately(client):
+    set_order_status(1, 'confirmed')
+    set_order_status(1, 'delivering')
+
+    data = client.get('/api/orders/events', headers=user_headers(), params={'since': 0}).json()
+    assert [(e['previous_status'], e['status']) for e in data['events']] == [
+        ('pending', 'confirmed'), ('confirmed', 'delivering')
+    ]
+    assert data['last_event_id'] == data['events'][-1]['event_id']
+
+
+def test_long_poll_waits_for_change(client):
+    threading.Timer(0.3, set_order_status, (1, 'confirmed')).start()
+
+    start = time.monotonic()
+    data = client.get('/api/orders/events', headers=user_headers(), params={'timeout': 10}).json()
+
+    assert time.monotonic() - start < 5
+    assert [e['status'] for e in data['events']] == ['confirmed']
+
+
+def test_long_poll_times_out_without_change(client):
+    data = client.get('/api/orders/events', headers=user_headers(), params={'since': 0, 'timeout': 1}).json()
+    assert data['events'] == []
+    assert data['last_event_id'] == 0
+
+
+def test_websocket_replays_and_pushes_admin_changes(client):
+    set_order_status(1, 'confirmed')
+    admin = {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+
+    with client.websocket_connect(f'/ws/orders?token={create_access_token(USER_ID)}&since=0') as ws:
+        assert ws.receive_json()['status'] == 'confirmed'
+
+        response = client.put('/api/admin/orders/1/status', headers=admin, json={'status': 'delivered'})
+        assert response.status_code == 200, response.text
+
+        event = ws.receive_json()
+        assert event['type'] == 'order_status'
+        assert (event['order_id'], event['previous_status'], event['status']) == (1, 'confirmed', 'delivered')
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for paginated and projected product listings
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from api.main import app
+from api.routes import create_access_token
+
+USER_ID = 1001
+
+
+@pytest.fixture
+def client(scratch_db):
+    """Test client backed by a scratch database with 25 products"""
+
+    category_id = db.create_category('Ichimliklar', 'Напитки')
+    for i in range(25):
+        db.create_product(category_id, f'Mahsulot {i}', f'Товар {i}', 1000 + i,
+                          description_uz='Tavsif', description_ru='Описание')
+    db.create_user(USER_ID, phone='+998901234567')
+
+    client = TestClient(app)
+    client.headers['Authorization'] = f'Bearer {create_access_token(USER_ID)}'
+    return client
+
+
+def test_default_shape_unchanged(client):
+    data = client.get('/api/products').json()
+    assert 'next_cursor' not in data
+    assert len(data['products']) == 25
+    assert {'name_uz', 'name_ru', 'description_uz', 'description_ru'} <= set(data['products'][0])
+
+
+def test_language_alone_selects_search_language(client):
+    data = client.get('/api/products', params={'search': 'Товар 1', 'language': 'ru'}).json()
+    assert 'next_cursor' not in data
+    assert {'name_uz', 'name_ru'} <= set(data['products'][0])
+    assert {product['name_ru'] for product in data['products']} >= {'Товар 1', 'Товар 10'}
+    assert client.get('/api/products', params={'search': 'Товар 1'}).json()['products'] == []
+
+
+def test_cursor_walks_all_products_once(client):
+    seen = []
+    cursor = None
+    while True:
+        params = {'limit': 10, **({'cursor': cursor} if cursor else {})}
+        data = client.get('/api/products', params=params).json()
+        seen.extend(product['product_id'] for product in data['products'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == 25
+    assert sorted(seen, reverse=True) == seen
+
+
+def test_fields_and_language_projection(client):
+    data = client.get('/api/products', params={'fields': 'name,price,image_path', 'language': 'ru', 'limit': 5}).json()
+    assert set(data['products'][0]) == {'product_id', 'name_ru', 'price', 'image_path', 'is_favorite'}
+
+    data = client.get('/api/products', params={'language': 'uz', 'limit': 5}).json()
+    product = data['products'][0]
+    assert 'name_uz' in product and 'description_uz' in product
+    assert 'name_ru' not in product and 'description_ru' not in product
+
+
+def test_invalid_fields_and_cursor_rejected(client):
+    assert client.get('/api/products', params={'fields': 'name,password'}).status_code == 400
+    assert client.get('/api/products', params={'cursor': 'not-a-cursor'}).status_code == 400
+    assert client.get('/api/products', params={'limit': 1000}).status_code == 422
+
+
+def test_effective_price_follows_discount(client):
+    product_id = db.create_product(1, 'Qahva', 'Кофе', 20000, discount_price=15000)
+    assert db.get_product(product_id)['effective_price'] == 15000
+
+    db.update_product(product_id, discount_price=None)
+    assert db.get_product(product_id)['effective_price'] == 20000
+
+
+def test_filters_and_price_sort(client):
+    db.create_product(1, 'Arzon', 'Дешевый', 500, discount_price=100, stock_quantity=3)
+    db.create_product(1, 'Qimmat', 'Дорогой', 90000, stock_quantity=0)
+
+    data = client.get('/api/products', params={'on_sale': True}).json()
+    assert [p['name_uz'] for p in data['products']] == ['Arzon']
+
+    data = client.get('/api/products', params={'in_stock': True, 'max_price': 1000}).json()
+    assert [p['name_uz'] for p in data['products']] == ['Arzon']
+
+    prices = []
+    cursor = None
+    while True:
+        params = {'sort': 'price_desc', 'limit': 7, 'fields': 'effective_price', **({'cursor': cursor} if cursor else {})}
+        data = client.get('/api/products', params=params).json()
+        prices.extend(p['effective_price'] for p in data['products'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert len(prices) == 27
+    assert prices == sorted(prices, reverse=True)
+
+
+def test_popular_sort_uses_sold_count(client):
+    product_id = db.create_product(1, 'Xit', 'Хит', 5000)
+    order_id = db.create_order(USER_ID, 'Ali', '+998901234567', 'Toshkent', 5000)
+    version = db.get_catalog_version()[0]
+    cached = client.get(f'/api/products/{product_id}')
+    db.add_order_item(order_id, product_id, 4, 5000)
+    assert db.get_catalog_version()[0] == version
+
+    assert db.refresh_product_popularity() == 1
+    refreshed = client.get(f'/api/products/{product_id}', headers={'If-None-Match': cached.headers['etag']})
+    assert refreshed.status_code == 200
+    assert refreshed.json()['product']['sold_count'] == 4
+    assert db.get_catalog_version()[0] == version + 1
+    assert db.get_product(product_id)['version'] == version + 1
+    assert db.refresh_product_popularity() == 0
+    assert db.get_catalog_version()[0] == version + 1
+    data = client.get('/api/products', params={'sort': 'popular', 'limit': 1}).json()
+    assert data['products'][0]['product_id'] == product_id
+
+    newest_cursor = client.get('/api/products', params={'limit': 1}).json()['next_cursor']
+    assert client.get('/api/products', params={'sort': 'popular', 'cursor': newest_cursor}).status_code == 400
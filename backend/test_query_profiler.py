@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for per-statement SQLite profiling and the slow-query log
+"""
+import sys
+import os
+import sqlite3
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database as db
+from api.main import app
+from api.admin_routes import create_admin_access_token
+from config import SUPER_ADMIN_ID
+from query_profiler import ProfiledConnection, fingerprint, get_query_profiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    """Scratch database with a small catalog, profiling on from then on"""
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / 'test.db'))
+    db.init_db()
+    category_id = db.create_category('Mevalar', 'Фрукты')
+    for i in range(5):
+        db.create_product(category_id, f'Olma {i}', f'Яблоко {i}', price=10000, stock_quantity=10)
+
+    profiler = get_query_profiler()
+    monkeypatch.setattr(profiler, 'enabled', True)
+    monkeypatch.setattr(profiler, 'slow_seconds', 60.0)
+    profiler.reset()
+    yield profiler
+    profiler.reset()
+
+
+def test_fingerprint_normalizes_literals_and_lists():
+    assert fingerprint("SELECT *\n  FROM t WHERE id IN (?, ?, ?) AND name = 'it''s' AND n > 12") == \
+        "SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?"
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (?,?,?,?)")
+    assert fingerprint("INSERT INTO t VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t VALUES (...), ..."
+    assert fingerprint("SELECT t1.c2 FROM t1") == "SELECT t1.c2 FROM t1"
+
+
+def test_disabled_profiling_uses_plain_connections(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, 'enabled', False)
+    conn = db.get_connection()
+    assert type(conn) is sqlite3.Connection
+    conn.close()
+
+    db.get_all_products()
+    assert profiler.top() == []
+
+
+def test_statements_aggregated_by_fingerprint(profiler):
+    conn = db.get_connection()
+    assert isinstance(conn, ProfiledConnection)
+    conn.close()
+
+    for product_id in (1, 2, 3):
+        db.get_product(product_id)
+    db.get_all_products()
+
+    queries = {entry['fingerprint']: entry for entry in profiler.top(limit=50)}
+    by_id = queries['SELECT * FROM products WHERE product_id = ? AND is_active = ?']
+    assert by_id['calls'] == 3
+    assert by_id['rows'] == 3
+    assert by_id['functions'] == ['get_product']
+    assert by_id['total_ms'] > 0
+    assert by_id['plan'] is None
+    listing = next(entry for fp, entry in queries.items() if fp.startswith('SELECT * FROM products WHERE is_active'))
+    assert listing['rows'] == 5
+
+    totals = [entry['total_ms'] for entry in profiler.top(sort='total')]
+    assert totals == sorted(totals, reverse=True)
+    with pytest.raises(ValueError):
+        profiler.top(sort='nonsense')
+
+
+def test_slow_query_logged_with_plan(profiler, monkeypatch, caplog):
+    monkeypatch.setattr(profiler, 'slow_seconds', 0.0)
+    with caplog.at_level('WARNING', logger='database.slow_queries'):
+        db.get_product(1)
+
+    record = next(r for r in caplog.records if 'product_id = ?' in r.getMessage())
+    assert 'in get_product' in record.getMessage()
+    assert 'SEARCH products USING INTEGER PRIMARY KEY' in record.getMessage()
+    entry = next(e for e in profiler.top(limit=50) if 'product_id = ?' in e['fingerprint'])
+    assert entry['slow_calls'] == 1
+    assert 'INTEGER PRIMARY KEY' in entry['plan']
+
+
+def test_admin_top_queries_endpoint(profiler):
+    client = TestClient(app)
+    db.get_product(1)
+
+    headers = {'Authorization': f'Bearer {create_admin_access_token(SUPER_ADMIN_ID)}'}
+    response = client.get('/api/admin/db/queries?sort=calls&limit=5', headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data['enabled'] is True
+    assert 0 < len(data['queries']) <= 5
+    calls = [entry['calls'] for entry in data['queries']]
+    assert calls == sorted(calls, reverse=True)
+
+    assert client.get('/api/admin/db/queries?sort=bogus', headers=headers).status_code == 422
+    assert client.delete('/api/admin/db/queries', headers=headers).status_code == 200
+    # Only the statements of the DELETE request's own auth check remain
+    assert all('admins' in entry['fingerprint'] for entry in profiler.top(limit=50))
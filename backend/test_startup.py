@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for fast startup: schema check in init_db and lazily imported dependencies
+"""
+import sys
+import os
+import subprocess
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database as db
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+
+
+def index_exists(name: str) -> bool:
+    conn = db.get_connection()
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+def test_init_db_skips_ddl_for_current_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / 'test.db'))
+    db.init_db()
+    conn = db.get_connection()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == db._schema_version()
+    conn.execute('DROP INDEX idx_cart_items_user')
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    assert not index_exists('idx_cart_items_user')
+
+    # A database from another schema version (here: unversioned) is migrated again
+    conn = db.get_connection()
+    conn.execute('PRAGMA user_version = 0')
+    conn.close()
+    db.init_db()
+    assert index_exists('idx_cart_items_user')
+
+
+def test_bot_process_imports_no_optional_heavy_modules(tmp_path):
+    code = ("import sys, main; "
+            "print('loaded:' + ','.join(m for m in ('telethon', 'fastapi', 'uvicorn', 'PIL') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=BACKEND, LOG_LEVEL='WARNING'), timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'loaded:'
+
+
+def test_init_db_seeds_configured_super_admin_on_current_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / 'test.db'))
+    db.init_db()
+
+    # SUPER_ADMIN_ID changed in config: the fast path must still seed it
+    monkeypatch.setattr(db, 'SUPER_ADMIN_ID', 1234567)
+    db.init_db()
+    assert db.is_super_admin(1234567)
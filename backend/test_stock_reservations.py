@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for checkout stock reservations
+"""
+import sys
+import os
+import threading
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+import database as db
+
+ALICE = 1001
+BOB = 1002
+
+
+@pytest.fixture
+def product_id(scratch_db):
+    """Scratch database with one product of 5 units"""
+    category_id = db.create_category('Mevalar', 'Фрукты')
+    return db.create_product(category_id, 'Olma', 'Яблоко', price=10000, stock_quantity=5)
+
+
+def stock(product_id):
+    product = db.get_product(product_id)
+    return product['stock_quantity'], product['reserved_quantity']
+
+
+def test_hold_blocks_other_checkouts(product_id):
+    assert db.reserve_stock(ALICE, [(product_id, 3)], ttl=60)
+    assert db.get_available_stock(product_id) == 2
+    assert not db.reserve_stock(BOB, [(product_id, 3)], ttl=60)
+
+    # Re-entering checkout replaces the previous hold
+    assert db.reserve_stock(ALICE, [(product_id, 4)], ttl=60)
+    assert stock(product_id) == (5, 4)
+
+    assert db.release_stock(ALICE) == 1
+    assert stock(product_id) == (5, 0)
+    assert db.reserve_stock(BOB, [(product_id, 3)], ttl=60)
+
+
+def test_reservation_is_all_or_nothing(product_id):
+    category_id = db.create_category('Sabzavotlar', 'Овощи')
+    other_id = db.create_product(category_id, 'Sabzi', 'Морковь', price=5000, stock_quantity=1)
+
+    assert not db.reserve_stock(ALICE, [(product_id, 2), (other_id, 2)], ttl=60)
+    assert stock(product_id) == (5, 0)
+    assert stock(other_id) == (1, 0)
+
+
+def test_commit_converts_hold(product_id):
+    assert db.reserve_stock(ALICE, [(product_id, 3)], ttl=60)
+    assert db.reserve_stock(BOB, [(product_id, 2)], ttl=60)
+
+    assert db.commit_stock(ALICE, [(product_id, 3)])
+    assert stock(product_id) == (2, 2)
+
+    # Without a hold only unheld stock can be ordered
+    assert not db.commit_stock(ALICE, [(product_id, 1)])
+    assert db.commit_stock(BOB, [(product_id, 2)])
+    assert stock(product_id) == (0, 0)
+
+
+def test_expired_holds_are_released(product_id):
+    assert db.reserve_stock(ALICE, [(product_id, 5)], ttl=0.05)
+    assert db.reserve_stock(BOB, [(product_id, 1)], ttl=60) is False
+    time.sleep(0.1)
+
+    assert db.release_expired_reservations() == 1
+    assert db.get_available_stock(product_id) == 5
+
+    # Order placed after its hold expired still succeeds while stock lasts
+    assert db.commit_stock(ALICE, [(product_id, 5)])
+    assert stock(product_id) == (0, 0)
+
+
+def test_concurrent_orders_do_not_oversell(product_id):
+    results = []
+    threads = [
+        threading.Thread(target=lambda user_id=user_id: results.append(db.commit_stock(user_id, [(product_id, 2)])))
+        for user_id in range(1, 9)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 2
+    assert stock(product_id) == (1, 0)
+
+
+def test_place_order_is_one_transaction(product_id, monkeypatch):
+    db.create_user(ALICE)
+    db.add_to_cart(ALICE, product_id, 2)
+    assert db.reserve_stock(ALICE, [(product_id, 2)], ttl=60)
+
+    def fail(*args):
+        raise RuntimeError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db, '_insert_order_item', fail)
+        with pytest.raises(RuntimeError):
+            db.place_order(ALICE, [(product_id, 2, 10000)], 'Alice', '+998901234567', 'Toshkent', 20000)
+    # Nothing was taken out of stock and the cart is intact
+    assert stock(product_id) == (5, 2)
+    assert db.get_user_orders(ALICE) == []
+    assert len(db.get_cart_items(ALICE)) == 1
+
+    assert db.place_order(ALICE, [(product_id, 6, 10000)], 'Alice', '+998901234567', 'Toshkent', 60000) is None
+    order_id = db.place_order(ALICE, [(product_id, 2, 10000)], 'Alice', '+998901234567', 'Toshkent', 20000)
+    assert stock(product_id) == (3, 0)
+    assert [item['quantity'] for item in db.get_order_items(order_id)] == [2]
+    assert db.get_cart_items(ALICE) == []
+
+
+def test_only_taken_stock_changes_catalog_version(product_id):
+    version, _ = db.get_catalog_version()
+    assert db.reserve_stock(ALICE, [(product_id, 3)], ttl=60)
+    assert db.release_stock(ALICE) == 1
+    assert db.reserve_stock(ALICE, [(product_id, 3)], ttl=-1)
+    assert db.release_expired_reservations() == 1
+    # Holds leave the cached catalog alone
+    assert db.get_catalog_version()[0] == version
+
+    assert db.reserve_stock(ALICE, [(product_id, 2)], ttl=60)
+    assert db.commit_stock(ALICE, [(product_id, 2)])
+    taken_version, _ = db.get_catalog_version()
+    assert taken_version == version + 1
+    assert db.get_product(product_id)['version'] == taken_version
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Tests for the userbot account pool: selection, flood-wait cooldowns, health checks,
+cached phone to peer resolution
+"""
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from telethon.errors import FloodWaitError, PeerIdInvalidError
+
+import database as db
+import metrics
+from userbot import pool as pool_module
+from userbot.client import UserbotClient
+from userbot.pool import UserbotPool
+
+
+class FakeTelethon:
+    """
+    The parts of TelegramClient the userbot uses, answered in memory
+    Every phone has a Telegram account (user id = its digits) unless it ends in 0000
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.connects = 0
+        self.sent = []
+        self.flood_wait = 0
+        self.hold = None
+        self.ping_ok = True
+        self.access_hash = 1
+        self.imports = []
+        self.session = type('Session', (), {'save': lambda session: 'saved-session'})()
+        self._disconnected = None
+
+    async def connect(self):
+        self.connected = True
+        self.connects += 1
+        self._disconnected = asyncio.get_running_loop().create_future()
+
+    async def disconnect(self):
+        self.drop()
+
+    def drop(self):
+        self.connected = False
+        if self._disconnected and not self._disconnected.done():
+            self._disconnected.set_result(None)
+
+    def is_connected(self):
+        return self.connected
+
+    @property
+    def disconnected(self):
+        return asyncio.shield(self._disconnected)
+
+    async def is_user_authorized(self):
+        return True
+
+    async def get_me(self):
+        return object() if self.ping_ok else None
+
+    async def __call__(self, request):
+        self.imports.append([contact.phone for contact in request.contacts])
+        known = [contact for contact in request.contacts if not contact.phone.endswith('0000')]
+        return SimpleNamespace(
+            imported=[SimpleNamespace(client_id=contact.client_id, user_id=int(contact.phone)) for contact in known],
+            users=[SimpleNamespace(id=int(contact.phone), access_hash=self.access_hash) for contact in known],
+            retry_contacts=[]
+        )
+
+    async def send_message(self, peer, message):
+        if self.hold:
+            await self.hold.wait()
+        if peer.access_hash != self.access_hash:
+            raise PeerIdInvalidError(request=None)
+        if self.flood_wait:
+            raise FloodWaitError(request=None, capture=self.flood_wait)
+        self.sent.append(f'+{peer.user_id}')
+
+
+class FakeUserbotClient(UserbotClient):
+    def _create_client(self, session_string):
+        return FakeTelethon()
+
+
+@pytest.fixture
+def accounts(scratch_db):
+    for phone in ('+998900000001', '+998900000002'):
+        db.save_userbot_settings(1000, 'hash', phone, 'session-' + phone)
+    return [row['id'] for row in db.get_all_userbot_settings()]
+
+
+def test_settings_upserted_by_phone(accounts):
+    first, second = accounts
+    db.save_userbot_settings(2000, 'new-hash', '+998900000001', 'new-session')
+    rows = db.get_all_userbot_settings()
+    assert [row['id'] for row in rows] == [first, second]
+    assert rows[0]['api_id'] == 2000 and rows[0]['session_string'] == 'new-session'
+
+    assert db.deactivate_userbot_account(first)
+    assert not db.deactivate_userbot_account(first)
+    assert db.get_userbot_settings()['id'] == second
+    assert len(db.get_all_userbot_settings(include_inactive=True)) == 2
+
+    db.save_userbot_settings(2000, 'new-hash', '+998900000001', 'new-session')
+    assert db.get_all_userbot_settings()[0]['id'] == first
+
+
+def test_least_loaded_account_chosen(accounts):
+    first, second = accounts
+
+    async def scenario():
+        pool = UserbotPool(FakeUserbotClient)
+        assert await pool.initialize()
+        busy = pool.accounts[first].client
+        busy.hold = asyncio.Event()
+        slow = asyncio.create_task(pool.send_verification_code('+998901111111', '1234'))
+        await asyncio.sleep(0)
+        assert pool.accounts[first].in_flight == 1
+
+        # The first account is busy, the next two codes go out via the idle one
+        assert await pool.send_verification_code('+998902222222', '1234')
+        assert await pool.send_verification_code('998903333333', '1234')
+        busy.hold.set()
+        assert await slow
+        sent = (busy.sent, pool.accounts[second].client.sent)
+        await pool.disconnect()
+        return sent
+
+    busy_sent, idle_sent = asyncio.run(scenario())
+    assert busy_sent == ['+998901111111']
+    assert idle_sent == ['+998902222222', '+998903333333']
+
+
+def test_flood_wait_moves_to_next_account(accounts, monkeypatch):
+    first, second = accounts
+    monkeypatch.setattr(pool_module, 'USERBOT_MAX_FLOOD_WAIT', 10)
+    flood_waits = metrics.userbot_sends.value(str(first), 'flood_wait')
+
+    async def scenario():
+        pool = UserbotPool(FakeUserbotClient)
+        await pool.initialize()
+        pool.accounts[first].last_used = -1  # picked first
+        pool.accounts[first].client.flood_wait = 300
+        assert await pool.send_verification_code('+998901111111', '1234')
+        assert pool.accounts[first].cooling_down()
+        assert pool.accounts[second].client.sent == ['+998901111111']
+
+        # Both accounts limited: a long wait is not waited out, a short one is
+        pool.accounts[second].client.flood_wait = 300
+        assert not await pool.send_verification_code('+998902222222', '1234')
+        pool.accounts[second].client.flood_wait = 0
+        pool.accounts[second].cooldown_until = pool.accounts[second].cooldown_until - 300 + 0.05
+        assert await pool.send_verification_code('+998902222222', '1234')
+        states = {state['account_id']: state for state in pool.stats()}
+        await pool.disconnect()
+        return states
+
+    states = asyncio.run(scenario())
+    assert states[first]['cooldown_seconds'] > 250
+    assert states[second]['sent'] == 2
+    assert metrics.userbot_sends.value(str(first), 'flood_wait') == flood_waits + 1
+
+
+def test_watcher_reconnects_on_drop_and_failed_health_check(accounts, monkeypatch):
+    first, second = accounts
+    monkeypatch.setattr(pool_module, 'USERBOT_HEALTH_CHECK_INTERVAL', 0.05)
+
+    async def scenario():
+        pool = UserbotPool(FakeUserbotClient)
+        await pool.initialize()
+        dropped, stale = pool.accounts[first], pool.accounts[second]
+
+        dropped.client.drop()
+        stale.client.ping_ok = False
+        assert not pool.accounts[first].is_available()
+        await asyncio.sleep(0.2)
+        result = (dropped.client.connects, dropped.is_available(), stale.client.connects)
+        await pool.disconnect()
+        return result
+
+    dropped_connects, available, stale_connects = asyncio.run(scenario())
+    assert dropped_connects == 2
+    assert available
+    assert stale_connects >= 2
+
+
+def test_account_failing_to_connect_is_kept_and_retried(accounts, monkeypatch):
+    first, second = accounts
+    monkeypatch.setattr(pool_module, 'USERBOT_RECONNECT_BACKOFF_MAX', 0.05)
+    failures = {'left': 2}
+
+    class FlakyTelethon(FakeTelethon):
+        async def connect(self):
+            if failures['left']:
+                failures['left'] -= 1
+                raise ConnectionError('network unreachable')
+            await super().connect()
+
+    class FlakyUserbotClient(FakeUserbotClient):
+        def _create_client(self, session_string):
+            return FlakyTelethon() if self.account_id == first else FakeTelethon()
+
+    async def scenario():
+        pool = UserbotPool(FlakyUserbotClient)
+        assert await pool.reload() == 1
+        flaky = pool.accounts[first]
+        down = (flaky.is_available(), [state['account_id'] for state in pool.stats()])
+        await asyncio.sleep(0.3)
+        up = (flaky.is_available(), flaky.client.connects)
+        assert await pool.send_verification_code('+998901111111', '1234')
+        await pool.disconnect()
+        return down, up
+
+    (available, listed), (recovered, connects) = asyncio.run(scenario())
+    assert not available and sorted(listed) == [first, second]
+    assert recovered and connects == 1
+    assert failures['left'] == 0
+
+
+def test_reload_follows_settings_and_metrics(accounts):
+    first, second = accounts
+
+    async def scenario():
+        pool = UserbotPool(FakeUserbotClient)
+        await pool.initialize()
+        db.deactivate_userbot_account(first)
+        db.save_userbot_settings(1000, 'hash', '+998900000003', 'session-3')
+        assert await pool.reload() == 2
+        ids = sorted(pool.accounts)
+        await pool.disconnect()
+        return ids
+
+    ids = asyncio.run(scenario())
+    assert ids[0] == second and first not in ids
+
+    rendered = metrics.get_registry().render()
+    assert 'zarbdor_userbot_account_up' in rendered
+    assert 'zarbdor_userbot_sends_total' in rendered
+
+
+def test_peers_imported_in_batches_and_cached(accounts):
+    first, _ = accounts
+    settings = db.get_all_userbot_settings()[0]
+    phones = ['+998901111111', '998 90 222-22-22', '+998901230000']
+
+    async def scenario():
+        account = FakeUserbotClient(settings)
+        await account.initialize(settings)
+        results = await asyncio.gather(*[account.send_verification_code(phone, '1234') for phone in phones])
+        first_run = (results, account.client.imports, account.client.sent)
+        await account.disconnect()
+
+        # After a restart the cached peers are used without importing again
+        account = FakeUserbotClient(settings)
+        await account.initialize(settings)
+        assert await account.send_verification_code('+998901111111', '1234')
+        imports = list(account.client.imports)
+
+        # A peer Telegram no longer accepts is resolved again
+        account.client.access_hash = 2
+        assert await account.send_verification_code('+998902222222', '1234')
+        await account.disconnect()
+        return first_run, imports, account.client.imports
+
+    (results, first_imports, sent), restart_imports, stale_imports = asyncio.run(scenario())
+    assert results == [True, True, False]
+    assert first_imports == [['+998901111111', '+998902222222', '+998901230000']]
+    assert sorted(sent) == ['+998901111111', '+998902222222']
+    assert restart_imports == []
+    assert stale_imports == [['+998902222222']]
+    assert db.get_userbot_peer(first, '+998902222222') == {'user_id': 998902222222, 'access_hash': 2}
+    assert db.get_userbot_peer(first, '+998901230000') is None
+    assert metrics.userbot_sends.value(str(first), 'not_on_telegram') >= 1
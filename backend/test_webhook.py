@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for Telegram webhook mode
+"""
+import sys
+import os
+import asyncio
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from fastapi import FastAPI
+
+from bot.webhook import UpdateQueue, create_webhook_router, SECRET_TOKEN_HEADER
+
+PATH = '/telegram/webhook/test-path'
+TOKEN = 'test-secret'
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Ali'},
+            'text': text
+        }
+    }
+
+
+def make_queue(handled: list, maxsize: int = 100, concurrency: int = 4, delay: float = 0) -> UpdateQueue:
+    router = Router()
+
+    @router.message()
+    async def record(message: Message):
+        await asyncio.sleep(delay)
+        handled.append((message.from_user.id, message.text))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return UpdateQueue(Bot('123456:TEST'), dp, maxsize=maxsize, concurrency=concurrency)
+
+
+def webhook_client(updates: UpdateQueue) -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(create_webhook_router(updates, PATH, TOKEN))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test')
+
+
+def test_secret_token_is_required():
+    async def scenario():
+        handled = []
+        updates = make_queue(handled)
+        async with webhook_client(updates) as client:
+            response = await client.post(PATH, json=message_update(1, 10, 'hi'))
+            assert response.status_code == 401
+            response = await client.post(PATH, json=message_update(1, 10, 'hi'),
+                                         headers={SECRET_TOKEN_HEADER: 'wrong'})
+            assert response.status_code == 401
+            response = await client.post('/telegram/webhook/other', json=message_update(1, 10, 'hi'),
+                                         headers={SECRET_TOKEN_HEADER: TOKEN})
+            assert response.status_code == 404
+        assert updates.pending() == 0
+
+    asyncio.run(scenario())
+
+
+def test_updates_are_dispatched_in_order_per_user():
+    async def scenario():
+        handled = []
+        updates = make_queue(handled, delay=0.01)
+        await updates.start()
+        async with webhook_client(updates) as client:
+            for i in range(10):
+                user_id = 10 + i % 2
+                response = await client.post(PATH, json=message_update(i + 1, user_id, f'msg {i}'),
+                                             headers={SECRET_TOKEN_HEADER: TOKEN})
+                assert response.status_code == 200
+        await updates.stop()
+
+        assert updates.processed == 10
+        assert [text for user_id, text in handled if user_id == 10] == [f'msg {i}' for i in range(0, 10, 2)]
+        assert [text for user_id, text in handled if user_id == 11] == [f'msg {i}' for i in range(1, 10, 2)]
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_applies_backpressure():
+    async def scenario():
+        handled = []
+        updates = make_queue(handled, maxsize=2, concurrency=1)
+        async with webhook_client(updates) as client:
+            statuses = [
+                (await client.post(PATH, json=message_update(i + 1, 10, 'hi'),
+                                   headers={SECRET_TOKEN_HEADER: TOKEN})).status_code
+                for i in range(3)
+            ]
+            assert statuses == [200, 200, 503]
+
+            # Invalid payloads are refused
+            response = await client.post(PATH, content=b'not json', headers={SECRET_TOKEN_HEADER: TOKEN})
+            assert response.status_code == 400
+
+        await updates.start()
+        await updates.stop()
+        assert updates.processed == 2
+        assert updates.rejected == 1
+
+    asyncio.run(scenario())
@@ -1,4 +1,5 @@
 # Userbot module
-from .client import UserbotClient, userbot, get_userbot
+from .client import UserbotClient
+from .pool import UserbotPool, userbot_pool, get_userbot_pool, get_userbot
 
-__all__ = ['UserbotClient', 'userbot', 'get_userbot']
+__all__ = ['UserbotClient', 'UserbotPool', 'userbot_pool', 'get_userbot_pool', 'get_userbot']
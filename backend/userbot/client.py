@@ -1,70 +1,88 @@
 import asyncio
 import logging
-from typing import Optional
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-from telethon.errors import (
-    SessionPasswordNeededError, 
-    PhoneCodeInvalidError,
-    PhoneNumberInvalidError,
-    FloodWaitError
-)
+import time
+from typing import Dict, Optional, TYPE_CHECKING
+
+import metrics
 from database import get_userbot_settings, save_userbot_settings
-from config import USERBOT_RECONNECT_INTERVAL
+from userbot.peers import PeerResolver, normalize_phone
+
+# Telethon is imported on first use: it costs ~0.2 s at startup and most processes never log in
+if TYPE_CHECKING:
+    from telethon import TelegramClient
 
 logger = logging.getLogger(__name__)
 
 
 class UserbotClient:
-    """Telethon userbot client for sending verification codes"""
+    """Telethon client of one userbot account, used by UserbotPool to send verification codes"""
     
-    def __init__(self):
-        self.client: Optional[TelegramClient] = None
+    def __init__(self, settings: Optional[Dict] = None):
+        self.client: Optional['TelegramClient'] = None
+        self.account_id: Optional[int] = None
         self.api_id: Optional[int] = None
         self.api_hash: Optional[str] = None
         self.phone: Optional[str] = None
         self.session_string: Optional[str] = None
         self.is_running = False
-        self._reconnect_task = None
-        
-    async def initialize(self) -> bool:
-        """Initialize userbot from database settings"""
+        # Load and health state read by the pool
+        self.healthy = False
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.last_used = 0.0
+        self.cooldown_until = 0.0
+        self.peers = PeerResolver(self)
+        if settings:
+            self._apply_settings(settings)
+    
+    def _apply_settings(self, settings: Dict):
+        self.account_id = settings.get('id')
+        self.api_id = settings['api_id']
+        self.api_hash = settings['api_hash']
+        self.phone = settings['phone']
+        self.session_string = settings.get('session_string')
+    
+    @property
+    def label(self) -> str:
+        """Account name used in metrics and logs (settings row id, never the phone)"""
+        return str(self.account_id) if self.account_id is not None else 'pending'
+    
+    def _create_client(self, session_string: Optional[str]) -> 'TelegramClient':
+        from telethon import TelegramClient
+        from telethon.sessions import StringSession
+        return TelegramClient(
+            StringSession(session_string),
+            self.api_id,
+            self.api_hash,
+            connection_retries=5,
+            retry_delay=1,
+            auto_reconnect=True
+        )
+    
+    async def initialize(self, settings: Optional[Dict] = None) -> bool:
+        """Connect account from settings (default: first active account in database)"""
         try:
-            settings = get_userbot_settings()
+            settings = settings or get_userbot_settings()
             
             if not settings:
                 logger.warning("No userbot settings found in database")
                 return False
-                
-            self.api_id = settings['api_id']
-            self.api_hash = settings['api_hash']
-            self.phone = settings['phone']
-            self.session_string = settings.get('session_string')
+            
+            self._apply_settings(settings)
             
             if not self.api_id or not self.api_hash or not self.phone:
-                logger.error("Incomplete userbot settings")
+                logger.error(f"Incomplete settings for userbot account {self.label}")
                 return False
             
             # Create client with session string if available
-            if self.session_string:
-                session = StringSession(self.session_string)
-            else:
-                session = StringSession()
-            
-            self.client = TelegramClient(
-                session,
-                self.api_id,
-                self.api_hash,
-                connection_retries=5,
-                retry_delay=1,
-                auto_reconnect=True
-            )
+            self.client = self._create_client(self.session_string)
             
             await self.client.connect()
             
             # Check if authorized
             if not await self.client.is_user_authorized():
-                logger.warning("Userbot not authorized, requires login")
+                logger.warning(f"Userbot account {self.label} not authorized, requires login")
                 return False
             
             # Save session string if not already saved
@@ -76,18 +94,16 @@ class UserbotClient:
                     self.phone, 
                     self.session_string
                 )
-                logger.info("Userbot session saved to database")
+                logger.info(f"Userbot account {self.label} session saved to database")
             
             self.is_running = True
-            logger.info(f"Userbot initialized successfully for {self.phone}")
-            
-            # Start auto-reconnect monitoring
-            self._reconnect_task = asyncio.create_task(self._monitor_connection())
+            self.healthy = True
+            logger.info(f"Userbot account {self.label} initialized successfully")
             
             return True
-            
+        
         except Exception as e:
-            logger.error(f"Failed to initialize userbot: {e}")
+            logger.error(f"Failed to initialize userbot account {self.label}: {e}")
             return False
     
     async def login(self, api_id: int, api_hash: str, phone: str, 
@@ -96,15 +112,21 @@ class UserbotClient:
         Login userbot with phone number
         Returns dict with status and message
         """
+        from telethon.errors import (
+            SessionPasswordNeededError,
+            PhoneCodeInvalidError,
+            PhoneNumberInvalidError,
+            FloodWaitError
+        )
+        
         try:
-            self.api_id = api_id
-            self.api_hash = api_hash
-            self.phone = phone
-            
-            session = StringSession()
-            self.client = TelegramClient(session, api_id, api_hash)
-            
-            await self.client.connect()
+            # The code must be entered on the client that requested it
+            if not code or self.client is None:
+                self.api_id = api_id
+                self.api_hash = api_hash
+                self.phone = phone
+                self.client = self._create_client(None)
+                await self.client.connect()
             
             # Send code if not provided
             if not code:
@@ -123,16 +145,14 @@ class UserbotClient:
                 save_userbot_settings(api_id, api_hash, phone, self.session_string)
                 
                 self.is_running = True
+                self.healthy = True
                 logger.info("Userbot logged in successfully")
                 
-                # Start auto-reconnect monitoring
-                self._reconnect_task = asyncio.create_task(self._monitor_connection())
-                
                 return {
                     'status': 'success',
                     'message': 'Userbot logged in successfully'
                 }
-                
+            
             except SessionPasswordNeededError:
                 # 2FA enabled
                 if password:
@@ -143,11 +163,9 @@ class UserbotClient:
                     save_userbot_settings(api_id, api_hash, phone, self.session_string)
                     
                     self.is_running = True
+                    self.healthy = True
                     logger.info("Userbot logged in successfully with 2FA")
                     
-                    # Start auto-reconnect monitoring
-                    self._reconnect_task = asyncio.create_task(self._monitor_connection())
-                    
                     return {
                         'status': 'success',
                         'message': 'Userbot logged in successfully'
@@ -157,7 +175,7 @@ class UserbotClient:
                         'status': 'password_required',
                         'message': '2FA password required'
                     }
-                    
+        
         except PhoneCodeInvalidError:
             return {
                 'status': 'error',
@@ -181,15 +199,25 @@ class UserbotClient:
             }
     
     async def send_verification_code(self, phone: str, code: str, language: str = 'ru') -> bool:
-        """Send verification code via Telegram"""
+        """
+        Send verification code via Telegram
+        A flood wait puts the account on cooldown (see cooling_down) and returns False
+        """
         if not self.client or not self.is_running:
-            logger.error("Userbot not initialized or not running")
+            logger.error(f"Userbot account {self.label} not initialized or not running")
             return False
         
+        from telethon.errors import (
+            FloodWaitError,
+            PeerIdInvalidError,
+            UserIdInvalidError
+        )
+        
+        self.in_flight += 1
+        self.last_used = time.monotonic()
         try:
             # Format phone number
-            if not phone.startswith('+'):
-                phone = '+' + phone
+            phone = normalize_phone(phone)
             
             # Create message in specified language
             messages = {
@@ -202,58 +230,101 @@ class UserbotClient:
             }
             message = messages.get(language, messages['ru'])
             
-            # Send message
-            await self.client.send_message(phone, message)
-            logger.info(f"Verification code sent to {phone}")
-            return True
+            # Send message to the cached peer, resolving the phone only when it is new
+            peer = await self.peers.resolve(phone)
+            if peer is not None:
+                try:
+                    await self.client.send_message(peer, message)
+                except (PeerIdInvalidError, UserIdInvalidError):
+                    # Access hash no longer accepted: resolve the phone again
+                    logger.info(f"Cached peer of {phone} is stale on userbot account {self.label}")
+                    self.peers.forget(phone)
+                    peer = await self.peers.resolve(phone)
+                    if peer is not None:
+                        await self.client.send_message(peer, message)
+            if peer is None:
+                self.failed += 1
+                metrics.userbot_sends.inc(self.label, 'not_on_telegram')
+                logger.warning(f"No Telegram account for {phone}, verification code not sent")
+                return False
             
+            self.sent += 1
+            metrics.userbot_sends.inc(self.label, 'sent')
+            logger.info(f"Verification code sent to {phone} via userbot account {self.label}")
+            return True
+        
         except FloodWaitError as e:
-            logger.error(f"Flood wait error: need to wait {e.seconds} seconds")
+            self.failed += 1
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + e.seconds)
+            metrics.userbot_sends.inc(self.label, 'flood_wait')
+            logger.warning(f"Userbot account {self.label} flood wait: cooling down for {e.seconds} seconds")
             return False
         except Exception as e:
-            logger.error(f"Failed to send verification code: {e}")
+            self.failed += 1
+            metrics.userbot_sends.inc(self.label, 'error')
+            logger.error(f"Failed to send verification code via userbot account {self.label}: {e}")
             return False
+        finally:
+            self.in_flight -= 1
     
-    async def _monitor_connection(self):
-        """Monitor connection and auto-reconnect if needed"""
-        while self.is_running:
-            try:
-                await asyncio.sleep(USERBOT_RECONNECT_INTERVAL)
-                
-                if self.client and not self.client.is_connected():
-                    logger.warning("Userbot disconnected, attempting to reconnect...")
-                    try:
-                        await self.client.connect()
-                        logger.info("Userbot reconnected successfully")
-                    except Exception as e:
-                        logger.error(f"Reconnection failed: {e}")
-                        
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Connection monitor error: {e}")
+    def cooldown_remaining(self) -> float:
+        """Seconds until Telegram lets this account send again"""
+        return max(0.0, self.cooldown_until - time.monotonic())
+    
+    def cooling_down(self) -> bool:
+        return self.cooldown_remaining() > 0
+    
+    async def ping(self, timeout: float) -> bool:
+        """Health check: a get_me() round trip within timeout seconds"""
+        try:
+            self.healthy = await asyncio.wait_for(self.client.get_me(), timeout) is not None
+        except Exception as e:
+            logger.warning(f"Userbot account {self.label} health check failed: {e!r}")
+            self.healthy = False
+        return self.healthy
+    
+    async def wait_disconnected(self):
+        """Wait until the connection to Telegram ends, for whatever reason"""
+        try:
+            await self.client.disconnected
+        except Exception as e:
+            logger.warning(f"Userbot account {self.label} connection lost: {e!r}")
+    
+    async def reconnect(self) -> bool:
+        """Drop and re-open the connection, True when the account is usable again"""
+        self.healthy = False
+        try:
+            if self.client is None:
+                # initialize() failed before a client existed
+                self.client = self._create_client(self.session_string)
+            if self.client.is_connected():
+                await self.client.disconnect()
+            await self.client.connect()
+            self.healthy = await self.client.is_user_authorized()
+            if not self.healthy:
+                logger.warning(f"Userbot account {self.label} not authorized, requires login")
+        except Exception as e:
+            logger.error(f"Userbot account {self.label} reconnection failed: {e}")
+        if self.healthy:
+            self.is_running = True
+            logger.info(f"Userbot account {self.label} reconnected successfully")
+        return self.healthy
     
     async def disconnect(self):
         """Disconnect userbot"""
         try:
             self.is_running = False
-            
-            # Cancel reconnect task
-            if self._reconnect_task:
-                self._reconnect_task.cancel()
-                try:
-                    await self._reconnect_task
-                except asyncio.CancelledError:
-                    pass
+            self.healthy = False
+            self.peers.close()
             
             # Disconnect client
             if self.client:
                 await self.client.disconnect()
             
-            logger.info("Userbot disconnected")
-            
+            logger.info(f"Userbot account {self.label} disconnected")
+        
         except Exception as e:
-            logger.error(f"Error disconnecting userbot: {e}")
+            logger.error(f"Error disconnecting userbot account {self.label}: {e}")
     
     def is_active(self) -> bool:
         """Check if userbot is active and connected"""
@@ -262,14 +333,18 @@ class UserbotClient:
             self.client is not None and 
             self.client.is_connected()
         )
-
-
-# Global userbot instance
-userbot = UserbotClient()
-
-
-async def get_userbot() -> UserbotClient:
-    """Get or initialize global userbot instance"""
-    if not userbot.is_active():
-        await userbot.initialize()
-    return userbot
+    
+    def is_available(self) -> bool:
+        """Connected, passing health checks and not in a flood wait"""
+        return self.is_active() and self.healthy and not self.cooling_down()
+    
+    def stats(self) -> dict:
+        return {
+            'account_id': self.account_id,
+            'connected': self.is_active(),
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'sent': self.sent,
+            'failed': self.failed,
+            'cooldown_seconds': round(self.cooldown_remaining(), 1)
+        }
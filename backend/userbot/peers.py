@@ -0,0 +1,130 @@
+"""
+Phone number to Telegram peer resolution for userbot sends
+
+Sending to a raw phone string makes Telethon look the number up in the
+account's contacts on every send, an extra request that counts toward the
+account's flood limits. PeerResolver keeps the user id and access hash
+Telegram returned for each phone in the userbot_peers table, so later sends
+(also after a restart) go straight to an InputPeerUser. Phones not cached yet
+are imported as contacts in batches: concurrent resolves for one account
+share a single ImportContactsRequest. A cached peer that Telegram rejects is
+dropped and resolved afresh (see UserbotClient.send_verification_code).
+"""
+import asyncio
+import logging
+from typing import Dict, Optional, TYPE_CHECKING
+
+import metrics
+from config import USERBOT_CONTACT_IMPORT_DELAY, USERBOT_CONTACT_IMPORT_BATCH
+from database import get_userbot_peer, save_userbot_peers, delete_userbot_peer
+
+if TYPE_CHECKING:
+    from telethon.tl.types import InputPeerUser
+    from userbot.client import UserbotClient
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_phone(phone: str) -> str:
+    """Cache key of a phone number: '+' and digits only ('998 90 123-45-67' -> '+998901234567')"""
+    return '+' + ''.join(filter(str.isdigit, phone))
+
+
+class PeerResolver:
+    """Cached, batched phone to InputPeerUser resolution for one userbot account"""
+
+    def __init__(self, account: 'UserbotClient'):
+        self.account = account
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def resolve(self, phone: str) -> Optional['InputPeerUser']:
+        """
+        Peer of phone, None when the number has no Telegram account
+        Errors of the contact import (e.g. FloodWaitError) are raised
+        """
+        from telethon.tl.types import InputPeerUser
+
+        phone = normalize_phone(phone)
+        cached = get_userbot_peer(self.account.account_id, phone)
+        if cached:
+            metrics.userbot_peer_lookups.inc(self.account.label, 'cache')
+            return InputPeerUser(cached['user_id'], cached['access_hash'])
+
+        future = self._pending.get(phone)
+        if future is None:
+            future = self._pending[phone] = asyncio.get_running_loop().create_future()
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush())
+        # Shared with other resolves of the same phone: a cancelled caller must not cancel it
+        return await asyncio.shield(future)
+
+    def forget(self, phone: str):
+        """Drop the cached peer of phone, the next resolve imports it again"""
+        if delete_userbot_peer(self.account.account_id, normalize_phone(phone)):
+            metrics.userbot_peer_lookups.inc(self.account.label, 'stale')
+
+    async def _flush(self):
+        """Import pending phones, USERBOT_CONTACT_IMPORT_BATCH per request, until none are left"""
+        batch = {}
+        try:
+            await asyncio.sleep(USERBOT_CONTACT_IMPORT_DELAY)
+            while self._pending:
+                phones = list(self._pending)[:USERBOT_CONTACT_IMPORT_BATCH]
+                batch = {phone: self._pending.pop(phone) for phone in phones}
+                try:
+                    peers = await self._import(phones)
+                except Exception as e:
+                    # Most likely a flood wait: fail everything queued on this account, callers move on
+                    self._fail({**batch, **self._pending}, e)
+                    self._pending = {}
+                    continue
+                for phone, future in batch.items():
+                    if not future.done():
+                        future.set_result(peers.get(phone))
+        except asyncio.CancelledError:
+            self._fail({**batch, **self._pending}, ConnectionError("Userbot account disconnected"))
+            self._pending = {}
+            raise
+        finally:
+            self._flush_task = None
+
+    @staticmethod
+    def _fail(futures: Dict[str, asyncio.Future], error: Exception):
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(error)
+                future.exception()  # retrieved here, the callers may be gone
+
+    def close(self):
+        """Stop importing, pending resolves raise ConnectionError"""
+        if self._flush_task:
+            self._flush_task.cancel()
+
+    async def _import(self, phones: list) -> Dict[str, 'InputPeerUser']:
+        from telethon.tl.functions.contacts import ImportContactsRequest
+        from telethon.tl.types import InputPeerUser, InputPhoneContact
+
+        label = self.account.label
+        metrics.userbot_contact_imports.observe(value=len(phones))
+        result = await self.account.client(ImportContactsRequest([
+            InputPhoneContact(client_id=index, phone=phone, first_name=phone, last_name='')
+            for index, phone in enumerate(phones)
+        ]))
+
+        users = {user.id: user for user in result.users}
+        peers, rows = {}, []
+        for contact in result.imported:
+            user = users.get(contact.user_id)
+            if user is None or user.access_hash is None:
+                continue
+            phone = phones[contact.client_id]
+            peers[phone] = InputPeerUser(user.id, user.access_hash)
+            rows.append((phone, user.id, user.access_hash))
+        save_userbot_peers(self.account.account_id, rows)
+
+        if result.retry_contacts:
+            logger.warning(f"Userbot account {label}: Telegram deferred import of {len(result.retry_contacts)} contacts")
+        metrics.userbot_peer_lookups.inc(label, 'import', amount=len(peers))
+        metrics.userbot_peer_lookups.inc(label, 'not_found', amount=len(phones) - len(peers))
+        return peers
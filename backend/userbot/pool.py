@@ -0,0 +1,212 @@
+"""
+Pool of userbot accounts sending verification codes
+
+Every active row of userbot_settings is one Telethon account. A send goes to
+the least loaded account that is connected, healthy and not in a flood wait;
+a FloodWaitError puts only that account on cooldown and the code is retried
+on the next one. When every account is cooling down the send waits for the
+first to come back if that is at most USERBOT_MAX_FLOOD_WAIT seconds away.
+
+Each account has a watcher task that waits on Telethon's disconnected future
+and runs a get_me() health check every USERBOT_HEALTH_CHECK_INTERVAL seconds;
+a dropped connection or failed check is reconnected with exponential backoff.
+An account that fails to connect at (re)load stays in the pool as unhealthy
+and its watcher keeps retrying it the same way.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from config import (
+    USERBOT_HEALTH_CHECK_INTERVAL, USERBOT_HEALTH_CHECK_TIMEOUT, USERBOT_RECONNECT_BACKOFF_MAX,
+    USERBOT_MAX_FLOOD_WAIT
+)
+from database import get_all_userbot_settings
+from userbot.client import UserbotClient
+
+logger = logging.getLogger(__name__)
+
+# Settings that need a new Telethon client when they change
+_CONNECTION_FIELDS = ('api_id', 'api_hash', 'session_string')
+
+
+class UserbotPool:
+    """Userbot accounts with least-loaded selection, flood-wait cooldowns and health checks"""
+
+    def __init__(self, client_factory: Callable[[Dict], UserbotClient] = UserbotClient):
+        self.client_factory = client_factory
+        self.accounts: Dict[int, UserbotClient] = {}
+        self.is_running = False
+        self._watchers: Dict[int, asyncio.Task] = {}
+        self._logins: Dict[str, UserbotClient] = {}
+        self._reload_lock: Optional[asyncio.Lock] = None
+
+    async def initialize(self) -> bool:
+        """Connect all active accounts, True when at least one is usable"""
+        return await self.reload() > 0
+
+    async def reload(self) -> int:
+        """
+        Bring the pool in line with userbot_settings: connect new accounts,
+        drop deactivated ones, reconnect those whose credentials changed
+        New accounts that fail to connect are kept and retried by their watcher
+        Returns number of connected accounts
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            self.is_running = True
+            settings = {row['id']: row for row in get_all_userbot_settings()}
+
+            for account_id, account in list(self.accounts.items()):
+                row = settings.get(account_id)
+                if row is None or any(row[field] != getattr(account, field) for field in _CONNECTION_FIELDS):
+                    await self._remove(account_id)
+
+            new = [self.client_factory(row) for account_id, row in settings.items() if account_id not in self.accounts]
+            await asyncio.gather(*[account.initialize(settings[account.account_id]) for account in new])
+            for account in new:
+                self._add(account)
+
+            connected = sum(1 for account in self.accounts.values() if account.is_active())
+            logger.info(f"Userbot pool: {connected} of {len(settings)} accounts connected")
+            return connected
+
+    def _add(self, account: UserbotClient):
+        self.accounts[account.account_id] = account
+        self._watchers[account.account_id] = asyncio.create_task(self._watch(account))
+
+    async def _remove(self, account_id: int):
+        account = self.accounts.pop(account_id)
+        watcher = self._watchers.pop(account_id, None)
+        if watcher:
+            watcher.cancel()
+            try:
+                await watcher
+            except asyncio.CancelledError:
+                pass
+        await account.disconnect()
+
+    async def _watch(self, account: UserbotClient):
+        """Reconnect account when its connection drops, a health check fails or it never connected"""
+        backoff = min(1, USERBOT_RECONNECT_BACKOFF_MAX)
+        if not account.healthy:
+            # initialize() just failed, give it a moment before the first retry
+            await asyncio.sleep(backoff)
+        while self.is_running:
+            try:
+                if account.is_active() and account.healthy:
+                    try:
+                        await asyncio.wait_for(account.wait_disconnected(), USERBOT_HEALTH_CHECK_INTERVAL)
+                        logger.warning(f"Userbot account {account.label} disconnected, reconnecting...")
+                    except asyncio.TimeoutError:
+                        if await account.ping(USERBOT_HEALTH_CHECK_TIMEOUT):
+                            continue
+                    if not self.is_running:
+                        break
+
+                if await account.reconnect():
+                    backoff = 1
+                    continue
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, USERBOT_RECONNECT_BACKOFF_MAX)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Userbot account {account.label} watcher error: {e}")
+                await asyncio.sleep(backoff)
+
+    def _pick(self, exclude: set) -> Optional[UserbotClient]:
+        """Least loaded available account: fewest sends in flight, then longest unused"""
+        candidates = [
+            account for account_id, account in self.accounts.items()
+            if account_id not in exclude and account.is_available()
+        ]
+        return min(candidates, key=lambda account: (account.in_flight, account.last_used), default=None)
+
+    def _next_available_in(self) -> Optional[float]:
+        """Seconds until the first connected account leaves its flood wait"""
+        waits = [account.cooldown_remaining() for account in self.accounts.values()
+                 if account.is_active() and account.healthy]
+        return min(waits, default=None)
+
+    async def send_verification_code(self, phone: str, code: str, language: str = 'ru') -> bool:
+        """Send verification code via the least loaded account, moving on to the next on flood wait"""
+        tried = set()
+        waited = False
+        while True:
+            account = self._pick(tried)
+            if account is None:
+                delay = self._next_available_in()
+                if waited or delay is None or delay > USERBOT_MAX_FLOOD_WAIT:
+                    logger.error(f"No userbot account available to send verification code to {phone}")
+                    return False
+                logger.info(f"All userbot accounts in flood wait, retrying in {delay:.1f} seconds")
+                await asyncio.sleep(delay)
+                waited = True
+                tried.clear()
+                continue
+
+            tried.add(account.account_id)
+            if await account.send_verification_code(phone, code, language):
+                return True
+            if not account.cooling_down():
+                # Not an account limit (e.g. unknown phone): other accounts would fail the same way
+                return False
+
+    async def login(self, api_id: int, api_hash: str, phone: str,
+                   code: str = None, password: str = None) -> dict:
+        """
+        Log in a new account (first call sends the code, second signs in with it)
+        The account joins the pool once logged in
+        """
+        account = self._logins.get(phone)
+        if account is None or not code:
+            if account is not None:
+                await account.disconnect()
+            account = self._logins[phone] = self.client_factory(None)
+
+        result = await account.login(api_id, api_hash, phone, code, password)
+        if result['status'] == 'success':
+            del self._logins[phone]
+            # The pool connects its own client for the saved session
+            await account.disconnect()
+            await self.reload()
+        return result
+
+    def is_active(self) -> bool:
+        """Check if at least one account is connected"""
+        return any(account.is_active() for account in self.accounts.values())
+
+    def stats(self) -> List[dict]:
+        """Live state of every account, including those waiting to reconnect"""
+        return [account.stats() for account in self.accounts.values()]
+
+    async def disconnect(self):
+        """Disconnect all accounts"""
+        self.is_running = False
+        for account_id in list(self.accounts):
+            await self._remove(account_id)
+        for account in self._logins.values():
+            await account.disconnect()
+        self._logins.clear()
+        logger.info("Userbot pool disconnected")
+
+
+# Global userbot pool instance
+userbot_pool = UserbotPool()
+metrics.track_userbot_accounts(lambda: {account.label: account.stats() for account in userbot_pool.accounts.values()})
+
+
+def get_userbot_pool() -> UserbotPool:
+    """Get global userbot pool"""
+    return userbot_pool
+
+
+async def get_userbot() -> UserbotPool:
+    """Get global userbot pool, connecting its accounts if none is active"""
+    if not userbot_pool.is_active():
+        await userbot_pool.initialize()
+    return userbot_pool
@@ -138,4 +138,12 @@ class ApiService {
     final response = await _dio.get('/neighborhoods');
     return response.data;
   }
+
+  // Catalog sync (pass the version returned by the previous sync, 0 for a full snapshot)
+  Future<Map<String, dynamic>> syncCatalog({int since = 0}) async {
+    final response = await _dio.get('/sync/catalog', queryParameters: {
+      'since': since,
+    });
+    return response.data;
+  }
 }